@@ -18,10 +18,142 @@ MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "kathagptv2")
 # Gemini API configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# LLM backend: "gemini", or "fake" for the deterministic offline stand-in
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "lognormal:800,0.5")
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", 0))
+
+# Gemini call governor: calls in flight at once, requests:tokens per minute per
+# model ("*" for the rest, 0 for unlimited) and the longest a call waits for its
+# turn in seconds (backfill scripts wait as long as it takes)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_RATE_LIMITS = os.getenv(
+    "LLM_RATE_LIMITS",
+    "gemini-2.0-flash=2000:4000000,gemini-1.5-flash=2000:4000000,*=1000:4000000"
+)
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 60))
+
+# Hedged Gemini calls (opt-in): a call from one of these call-sites still
+# running at the HEDGE_PERCENTILE latency of recent calls is sent again and the
+# first answer wins; at most HEDGE_BUDGET extra calls per call (0.05 = 5%)
+LLM_HEDGING = os.getenv("LLM_HEDGING", "False").lower() in ["true", "1", "t"]
+HEDGE_CALL_SITES = [site.strip() for site in os.getenv(
+    "HEDGE_CALL_SITES", "extract_image,extract_pdf,chat_answer,global_chat_answer"
+).split(",") if site.strip()]
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 95))
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", 0.05))
+
+# Upstream calls: time budget in seconds for a chat answer and for extracting
+# one document, the longest single Gemini / web search call, retries after
+# retryable errors, and consecutive failures that open an upstream's circuit
+# breaker for BREAKER_RESET seconds
+CHAT_DEADLINE = float(os.getenv("CHAT_DEADLINE", 60))
+INGEST_DEADLINE = float(os.getenv("INGEST_DEADLINE", 180))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", 90))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", 8))
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", 2))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", 5))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", 30))
+
+# Documents whose extraction failed or was deferred (Gemini circuit open) are
+# retried every N seconds, up to EXTRACTION_MAX_ATTEMPTS times (0 disables)
+EXTRACTION_RETRY_INTERVAL = int(os.getenv("EXTRACTION_RETRY_INTERVAL", 300))
+EXTRACTION_MAX_ATTEMPTS = int(os.getenv("EXTRACTION_MAX_ATTEMPTS", 5))
+
+# Progressive uploads (?stream=true) write the text streamed so far to the
+# document at most every N seconds while Gemini is still generating
+PROGRESS_WRITE_INTERVAL = float(os.getenv("PROGRESS_WRITE_INTERVAL", 0.5))
+
+# Chat memory: the newest turns of a conversation are sent verbatim while they
+# fit in CHAT_HISTORY_TOKENS estimated tokens (at most CHAT_HISTORY_TURNS turns);
+# older turns reach the prompt through the conversation's rolling summary
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", 1500))
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", 20))
+# Turns that left that window are folded into the summary once there are this
+# many (one Gemini call for all of them) and stay in the prompt verbatim until then
+CHAT_SUMMARY_MIN_TURNS = int(os.getenv("CHAT_SUMMARY_MIN_TURNS", 6))
+
+# Chat retention: messages beyond the newest CHAT_HOT_MESSAGES of a conversation
+# or older than CHAT_RETENTION_DAYS (0 disables either) are folded into the
+# conversation's rolling summary (at most CHAT_SUMMARY_MAX_CHARS, included in
+# prompts) and moved to chats_archive every CHAT_RETENTION_INTERVAL seconds
+# (0 disables). Archived messages expire after CHAT_ARCHIVE_TTL_DAYS (0 keeps them).
+CHAT_HOT_MESSAGES = int(os.getenv("CHAT_HOT_MESSAGES", 200))
+CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", 180))
+CHAT_SUMMARY_MAX_CHARS = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", 1500))
+CHAT_RETENTION_INTERVAL = int(os.getenv("CHAT_RETENTION_INTERVAL", 6 * 60 * 60))
+CHAT_ARCHIVE_TTL_DAYS = int(os.getenv("CHAT_ARCHIVE_TTL_DAYS", 0))
+
+# Web search endpoint (DuckDuckGo HTML results page)
+SEARCH_URL = os.getenv("SEARCH_URL", "https://html.duckduckgo.com/html/")
+
+# Deep search (opt-in): fetch the top DEEP_SEARCH_PAGES result pages at once (at
+# most DEEP_SEARCH_PER_HOST per host), reading at most DEEP_SEARCH_MAX_BYTES of
+# each, and give up on pages not in within DEEP_SEARCH_DEADLINE seconds. Up to
+# DEEP_SEARCH_PASSAGE_CHARS of the passages matching the query are added per
+# page; page text is cached for DEEP_SEARCH_CACHE_TTL seconds.
+DEEP_SEARCH = os.getenv("DEEP_SEARCH", "False").lower() in ["true", "1", "t"]
+DEEP_SEARCH_PAGES = int(os.getenv("DEEP_SEARCH_PAGES", 3))
+DEEP_SEARCH_PER_HOST = int(os.getenv("DEEP_SEARCH_PER_HOST", 2))
+DEEP_SEARCH_MAX_BYTES = int(os.getenv("DEEP_SEARCH_MAX_BYTES", 1024 * 1024))
+DEEP_SEARCH_DEADLINE = float(os.getenv("DEEP_SEARCH_DEADLINE", 4))
+DEEP_SEARCH_PASSAGE_CHARS = int(os.getenv("DEEP_SEARCH_PASSAGE_CHARS", 800))
+DEEP_SEARCH_CACHE_TTL = int(os.getenv("DEEP_SEARCH_CACHE_TTL", 600))
+DEEP_SEARCH_CACHE_SIZE = int(os.getenv("DEEP_SEARCH_CACHE_SIZE", 256))
+
+# Response compression (bodies smaller than this are sent as-is)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))
+
+# Stored extracted text and chat tool results larger than this many bytes are
+# zstd-compressed (0 disables; python -m app.scripts.compress_storage for old records)
+STORAGE_COMPRESSION_MIN_SIZE = int(os.getenv("STORAGE_COMPRESSION_MIN_SIZE", 4096))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 3))
+
 # File uploads
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
 MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
 ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "pdf"}  # Add pdf here
 
-# Create upload directory if it doesn't exist
-os.makedirs(UPLOAD_DIR, exist_ok=True)
\ No newline at end of file
+# Zip imports: archive size cap, members per archive, and documents processed in parallel
+MAX_IMPORT_SIZE = int(os.getenv("MAX_IMPORT_SIZE", 500 * 1024 * 1024))
+MAX_IMPORT_FILES = int(os.getenv("MAX_IMPORT_FILES", 2000))
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", 4))
+
+# Multi-image uploads: extract each photo on its own, this many at a time, and
+# merge the pages in order (off by default: one Gemini call on the combined PDF).
+# On, a batch of N photos takes N Gemini requests and governor slots
+BATCH_PAGE_EXTRACTION = os.getenv("BATCH_PAGE_EXTRACTION", "False").lower() in ["true", "1", "t"]
+PAGE_EXTRACTION_CONCURRENCY = int(os.getenv("PAGE_EXTRACTION_CONCURRENCY", 4))
+
+# Exports are streamed from the database this many records at a time
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 500))
+
+# Image preprocessing before extraction: crop to the page, deskew, grayscale
+# low-chroma pages and downscale so a text line is about this many pixels tall.
+# Only the copy sent to Gemini is preprocessed; the stored image stays whole
+IMAGE_PREPROCESSING = os.getenv("IMAGE_PREPROCESSING", "True").lower() in ["true", "1", "t"]
+IMAGE_TEXT_LINE_HEIGHT = int(os.getenv("IMAGE_TEXT_LINE_HEIGHT", 24))
+
+# Near-duplicate uploads: perceptual hashes within this many bits (of 256) are
+# flagged (0 disables); optionally reuse the earlier document's extraction
+NEAR_DUPLICATE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_DISTANCE", 12))
+REUSE_DUPLICATE_EXTRACTION = os.getenv("REUSE_DUPLICATE_EXTRACTION", "False").lower() in ["true", "1", "t"]
+
+# Document type from a local TF-IDF classifier (python -m app.scripts.train_doc_classifier)
+# when it is at least this confident, else from Gemini; above 1 always asks Gemini.
+# Titles are built from the vendor and date unless TEMPLATE_TITLES is off.
+DOC_TYPE_CONFIDENCE = float(os.getenv("DOC_TYPE_CONFIDENCE", 0.8))
+TEMPLATE_TITLES = os.getenv("TEMPLATE_TITLES", "True").lower() in ["true", "1", "t"]
+
+# Thumbnails (longest side in pixels, WebP quality)
+THUMBNAIL_SIZES = [int(size) for size in os.getenv("THUMBNAIL_SIZES", "160,480").split(",")]
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", 70))
+
+# Analytics rollups are reconciled against the documents every N seconds (0 disables)
+ROLLUP_RECONCILE_INTERVAL = int(os.getenv("ROLLUP_RECONCILE_INTERVAL", 6 * 60 * 60))
+
+# Import the heavy client libraries and connect to MongoDB during startup instead
+# of on the first request (trades a slower boot for a fast first request)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "False").lower() in ["true", "1", "t"]
\ No newline at end of file
@@ -1,6 +1,75 @@
+import threading
 from pymongo import MongoClient
 from app.config import MONGODB_URI, MONGODB_DB_NAME
+from app.utils.metrics import MongoCommandMetrics
 
-# MongoDB connection
-client = MongoClient(MONGODB_URI)
-db = client[MONGODB_DB_NAME]
\ No newline at end of file
+# MongoDB connection, created on first use so importing the app stays cheap
+# (every command is timed into /metrics)
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The shared MongoClient, connecting on first call"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(MONGODB_URI, event_listeners=[MongoCommandMetrics()])
+    return _client
+
+
+def get_db():
+    """The application database"""
+    return get_client()[MONGODB_DB_NAME]
+
+
+def close_client():
+    """Close the shared client if it was ever opened"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+class LazyCollection:
+    """
+    Stand-in for a pymongo Collection that resolves it on first use
+
+    Lets models keep module-level collection handles without opening a
+    connection at import time.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._collection = None
+        self._owner = None
+
+    def _resolve(self):
+        client = get_client()
+        if self._owner is not client:
+            self._collection = client[MONGODB_DB_NAME][self._name]
+            self._owner = client
+        return self._collection
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __repr__(self):
+        return f"LazyCollection({self._name!r})"
+
+
+class LazyDatabase:
+    """Hands out LazyCollections by attribute or item, like a pymongo Database"""
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return LazyCollection(name)
+
+    def __getitem__(self, name):
+        return LazyCollection(name)
+
+
+db = LazyDatabase()
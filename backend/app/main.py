@@ -1,15 +1,120 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from app.routes.documents import router as documents_router
 from app.routes.chat import router as chat_router
-from app.config import API_PREFIX, FRONTEND_URL
+from app.routes.analytics import router as analytics_router
+from app.database import get_client, close_client
+from app.models.chat import Chat
+from app.models.chunk import Chunk
+from app.models.document import Document
+from app.models.thumbnail import Thumbnail
+from app.models.ledger import Ledger
+from app.models.rollup import Rollup
+from app.utils.db_utils import create_text_search_index
+from app.utils.http_utils import CompressionMiddleware
+from app.utils.metrics import render_metrics
+from app.config import (
+    API_PREFIX, FRONTEND_URL, COMPRESSION_MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY,
+    ROLLUP_RECONCILE_INTERVAL, UPLOAD_DIR, WARMUP_ON_STARTUP, LLM_BACKEND, EXTRACTION_RETRY_INTERVAL,
+    CHAT_RETENTION_INTERVAL
+)
+
+def create_indexes():
+    """Create the indexes the hot read paths rely on; one that fails does not stop the others"""
+    for create in (Chat.create_indexes, Document.create_indexes, Thumbnail.create_indexes, Ledger.create_indexes,
+                   Rollup.create_indexes, Chunk.create_indexes, create_text_search_index):
+        try:
+            create()
+        except Exception as e:
+            print(f"Error creating indexes ({create.__qualname__}): {e}")
+
+def warm_up():
+    """Load the lazily imported libraries, open the MongoDB connection and build the near-duplicate index"""
+    import PIL.Image  # noqa: F401
+    import bs4  # noqa: F401
+    import fitz  # noqa: F401
+    import requests  # noqa: F401
+    from app.services.gemini_service import get_genai
+    from app.services.dedup_service import sync_index
+    if LLM_BACKEND != "fake":
+        get_genai()
+    get_client().admin.command("ping")
+    sync_index()
+
+async def reconcile_rollups_periodically():
+    """Correct any drift in the incrementally maintained analytics rollups"""
+    while True:
+        try:
+            written = await run_in_threadpool(Rollup.reconcile)
+            print(f"Reconciled {written} analytics rollups")
+        except Exception as e:
+            print(f"Error reconciling rollups: {e}")
+        await asyncio.sleep(ROLLUP_RECONCILE_INTERVAL)
+
+async def retry_deferred_extractions_periodically():
+    """Extract documents that were stored while Gemini was unavailable"""
+    from app.services.ingest_service import retry_deferred_extractions
+    while True:
+        await asyncio.sleep(EXTRACTION_RETRY_INTERVAL)
+        try:
+            extracted = await run_in_threadpool(retry_deferred_extractions)
+            if extracted:
+                print(f"Extracted {extracted} deferred documents")
+        except Exception as e:
+            print(f"Error retrying deferred extractions: {e}")
+
+async def apply_chat_retention_periodically():
+    """Summarize and archive chat messages past retention"""
+    from app.services.chat_retention_service import apply_chat_retention
+    while True:
+        await asyncio.sleep(CHAT_RETENTION_INTERVAL)
+        try:
+            conversations, archived = await run_in_threadpool(apply_chat_retention)
+            if archived:
+                print(f"Archived {archived} chat messages from {conversations} conversations")
+        except Exception as e:
+            print(f"Error applying chat retention: {e}")
+
+async def ensure_indexes():
+    try:
+        await run_in_threadpool(create_indexes)
+    except Exception as e:
+        print(f"Error creating indexes: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup and shutdown; nothing here touches the network unless asked to"""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    if WARMUP_ON_STARTUP:
+        await run_in_threadpool(warm_up)
+
+    # Index creation round-trips to MongoDB, so it runs behind the first requests
+    background_tasks = [asyncio.create_task(ensure_indexes())]
+    if ROLLUP_RECONCILE_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(reconcile_rollups_periodically()))
+    if EXTRACTION_RETRY_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(retry_deferred_extractions_periodically()))
+    if CHAT_RETENTION_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(apply_chat_retention_periodically()))
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    close_client()
 
 # Create FastAPI app
 app = FastAPI(
     title="KhataGPT API",
     description="API for document analysis and chat using Gemini AI",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS properly
@@ -27,9 +132,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses (documents carry multi-megabyte base64 payloads)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MIN_SIZE,
+    gzip_level=GZIP_LEVEL,
+    brotli_quality=BROTLI_QUALITY,
+)
+
 # Include routers with explicit prefixes
 app.include_router(documents_router, prefix=f"{API_PREFIX}/documents")
 app.include_router(chat_router, prefix=f"{API_PREFIX}/chat")
+app.include_router(analytics_router, prefix=f"{API_PREFIX}/analytics")
 
 # Root endpoint 
 @app.get("/")
@@ -40,5 +154,10 @@ async def root():
         "docs_url": "/docs"
     }
 
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -2,9 +2,12 @@ from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field, ConfigDict
 from bson import ObjectId
-from pymongo import MongoClient, DESCENDING
-import os
-from app.config import MONGODB_URI, MONGODB_DB_NAME
+from pymongo import DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from app.config import CHAT_ARCHIVE_TTL_DAYS
+from app.database import db, get_db
+from app.utils.http_utils import make_etag
+from app.utils.storage_codec import compress_value, decompress_fields
 
 # Custom ObjectId field for Pydantic v2
 class PyObjectId(str):
@@ -19,14 +22,21 @@ class PyObjectId(str):
         return str(v)
         
     @classmethod
-    def __get_pydantic_json_schema__(cls, field_schema):
-        field_schema.update(type="string")
+    def __get_pydantic_json_schema__(cls, core_schema, handler):  # Pydantic 2 signature, for /docs
+        return {"type": "string"}
 
-# MongoDB connection
-client = MongoClient(MONGODB_URI)
-db = client[MONGODB_DB_NAME]
+# MongoDB connection (shared with the other models)
 chats_collection = db["chats"]
 
+# Messages moved out of `chats` by the retention job, and one rolling summary
+# per conversation (_id: the document's ObjectId, or "global") of the messages
+# that no longer fit in the prompt's history window or were archived
+chats_archive_collection = db["chats_archive"]
+chat_summaries_collection = db["chat_summaries"]
+
+# Tool results (e.g. the web search results list) are stored zstd-compressed when large
+COMPRESSED_FIELDS = ("used_tools",)
+
 # Pydantic models for API
 class ToolInfo(BaseModel):
     tool_name: str
@@ -65,54 +75,148 @@ class ChatResponse(ChatBase):
         }
     )
 
+class GlobalChatCreate(BaseModel):
+    user_message: str
+
+class GlobalChatResponse(ChatBase):
+    id: PyObjectId = Field(default_factory=lambda: str(ObjectId()), alias="_id")
+    created_at: datetime
+    
+    model_config = ConfigDict(populate_by_name=True)
+
 # MongoDB interface
 class Chat:
     @staticmethod
     def create_chat(document_id, user_message, ai_response, used_tools=None):
-        """Create a new chat message"""
+        """Create a new chat message (document_id=None for a cross-document chat)"""
         if used_tools is None:
             used_tools = []
             
         chat = {
-            "document_id": ObjectId(document_id),
+            "document_id": ObjectId(document_id) if document_id else None,
             "user_message": user_message,
             "ai_response": ai_response,
-            "used_tools": used_tools,
+            "used_tools": compress_value(used_tools),
             "created_at": datetime.now()
         }
         
         result = chats_collection.insert_one(chat)
-        
-        # Get the created chat and convert ObjectId to string
-        created_chat = chats_collection.find_one({"_id": result.inserted_id})
-        if created_chat:
-            created_chat["document_id"] = str(created_chat["document_id"])
-        
         return result.inserted_id
     
     @staticmethod
     def get_chats_for_document(document_id):
         """Get all chat messages for a document"""
-        chats = list(chats_collection.find(
+        return [decompress_fields(chat, COMPRESSED_FIELDS) for chat in chats_collection.find(
             {"document_id": ObjectId(document_id)}
-        ).sort("created_at", 1))  # Sort by created_at in ascending order
-        
-        # Convert ObjectId to string for all chats
-        for chat in chats:
-            chat["document_id"] = str(chat["document_id"])
-        
+        ).sort("created_at", 1)]  # Sort by created_at in ascending order
+    
+    @staticmethod
+    def get_global_chats(limit=100):
+        """Get the most recent cross-document chat messages, oldest first"""
+        chats = [decompress_fields(chat, COMPRESSED_FIELDS) for chat in chats_collection.find({"document_id": None})
+                 .sort("_id", DESCENDING).limit(limit)]
+        chats.reverse()
         return chats
     
+    @staticmethod
+    def get_history_etag(document_id):
+        """Strong ETag for a document's chat history (message count + latest chat id)"""
+        query = {"document_id": ObjectId(document_id)}
+        latest = chats_collection.find_one(query, {"_id": 1}, sort=[("_id", DESCENDING)])
+        count = chats_collection.count_documents(query)
+        return make_etag(document_id, count, latest["_id"] if latest else None)
+    
+    @staticmethod
+    def create_indexes():
+        """
+        Index chats by document so history lookups never scan the collection,
+        and expire archived chats after CHAT_ARCHIVE_TTL_DAYS (if set)
+        """
+        chats_collection.create_index(
+            [("document_id", 1), ("_id", DESCENDING)],
+            name="document_id_id"
+        )
+        chats_archive_collection.create_index([("document_id", 1), ("_id", 1)], name="document_id_id")
+
+        ttl_seconds = CHAT_ARCHIVE_TTL_DAYS * 24 * 60 * 60
+        if ttl_seconds <= 0:
+            if "archived_at_ttl" in chats_archive_collection.index_information():
+                chats_archive_collection.drop_index("archived_at_ttl")
+            return
+        try:
+            chats_archive_collection.create_index("archived_at", name="archived_at_ttl", expireAfterSeconds=ttl_seconds)
+        except OperationFailure:
+            # The index exists with another expiry: change it in place
+            get_db().command("collMod", "chats_archive",
+                             index={"name": "archived_at_ttl", "expireAfterSeconds": ttl_seconds})
+    
     @staticmethod
     def delete_chats_for_document(document_id):
-        """Delete all chat messages for a document"""
+        """Delete all chat messages for a document, archived ones and their summary included"""
+        chats_archive_collection.delete_many({"document_id": ObjectId(document_id)})
+        chat_summaries_collection.delete_one({"_id": ObjectId(document_id)})
         return chats_collection.delete_many({"document_id": ObjectId(document_id)})
+
+    @staticmethod
+    def get_recent_chats(document_id, limit: int, projection: dict = None) -> list:
+        """A conversation's newest messages (document_id=None: global), newest first"""
+        return list(chats_collection.find({"document_id": ObjectId(document_id) if document_id else None}, projection)
+                    .sort("_id", DESCENDING).limit(limit))
+
+    @staticmethod
+    def get_summary(document_id) -> dict:
+        """The rolling summary of a conversation's older messages (document_id=None: global), or None"""
+        return chat_summaries_collection.find_one({"_id": ObjectId(document_id) if document_id else "global"})
+
+    @staticmethod
+    def save_summary(document_id, summary: str, through_id, messages: int, previous_through_id=None) -> bool:
+        """
+        Replace a conversation's summary, unless someone else updated it first
+
+        Args:
+            document_id: The document (None for the global conversation)
+            summary: Summary of every message up to through_id
+            through_id: _id of the newest message the summary covers
+            messages: Messages newly folded into the summary
+            previous_through_id: through_id of the summary this one was built on
+
+        Returns:
+            False if the stored summary no longer covers previous_through_id
+        """
+        try:
+            chat_summaries_collection.update_one(
+                {"_id": ObjectId(document_id) if document_id else "global", "through_id": previous_through_id},
+                {"$set": {"summary": summary, "through_id": through_id, "updated_at": datetime.now()},
+                 "$inc": {"messages": messages}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # No match, and the upsert collided with a summary built on other messages
+            return False
+        return True
+
+    @staticmethod
+    def archive_chats(chats: list) -> int:
+        """
+        Move chat records from `chats` to `chats_archive`
+
+        Safe to repeat after a failure halfway: records already in the archive
+        are skipped and only then deleted from `chats`.
+
+        Returns:
+            Number of records removed from `chats`
+        """
+        if not chats:
+            return 0
+        now = datetime.now()
+        try:
+            chats_archive_collection.insert_many([dict(chat, archived_at=now) for chat in chats], ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+        return chats_collection.delete_many({"_id": {"$in": [chat["_id"] for chat in chats]}}).deleted_count
     
     @staticmethod
     def get_chat_by_id(chat_id):
         """Get a single chat by ID"""
-        chat = chats_collection.find_one({"_id": ObjectId(chat_id)})
-        if chat:
-            # Convert ObjectId to string to avoid validation error
-            chat["document_id"] = str(chat["document_id"])
-        return chat
\ No newline at end of file
+        return decompress_fields(chats_collection.find_one({"_id": ObjectId(chat_id)}), COMPRESSED_FIELDS)
\ No newline at end of file
@@ -0,0 +1,91 @@
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ASCENDING, DeleteOne, InsertOne, UpdateOne
+from app.database import db
+from app.utils.chunk_utils import chunk_hash, diff_chunks, split_chunks
+
+# Search chunks of each document's extracted text, kept in step with the text
+chunks_collection = db.document_chunks
+documents_collection = db.documents
+
+
+class Chunk:
+    @staticmethod
+    def sync(document_id, text, text_version) -> dict:
+        """
+        Bring a document's chunks in line with its text by diffing chunk hashes
+
+        Only chunks whose text changed are written (and re-indexed); unchanged
+        chunks at most get a new position. Records the text version the chunks
+        now match as the document's `derived.chunks`.
+
+        Returns:
+            Counts of "added", "removed", "moved" and "kept" chunks
+        """
+        document_id = ObjectId(document_id)
+        stored = list(chunks_collection.find({"document_id": document_id}, {"hash": 1}).sort("seq", ASCENDING))
+        new_chunks = split_chunks(text)
+        changes = diff_chunks([chunk["hash"] for chunk in stored], new_chunks)
+
+        now = datetime.now()
+        operations = [DeleteOne({"_id": stored[old]["_id"]}) for old in changes["removed"]]
+        operations += [UpdateOne({"_id": stored[old]["_id"]}, {"$set": {"seq": new}}) for old, new in changes["moved"]]
+        operations += [InsertOne({
+            "document_id": document_id,
+            "seq": new,
+            "hash": chunk_hash(new_chunks[new]),
+            "text": new_chunks[new],
+            "text_version": text_version,
+            "created_at": now,
+        }) for new in changes["added"]]
+        if operations:
+            chunks_collection.bulk_write(operations, ordered=False)
+        documents_collection.update_one({"_id": document_id}, {"$set": {"derived.chunks": text_version}})
+
+        return {
+            "added": len(changes["added"]),
+            "removed": len(changes["removed"]),
+            "moved": len(changes["moved"]),
+            "kept": len(new_chunks) - len(changes["added"]),
+        }
+
+    @staticmethod
+    def search(document_ids: list, terms: str, limit: int = 20) -> list:
+        """Best-matching chunks of the given documents for a text search, best first"""
+        return list(chunks_collection.find(
+            {"document_id": {"$in": document_ids}, "$text": {"$search": terms}},
+            {"document_id": 1, "seq": 1, "text": 1, "score": {"$meta": "textScore"}}
+        ).sort([("score", {"$meta": "textScore"})]).limit(limit))
+
+    @staticmethod
+    def match_documents(terms: str, limit: int = 1000) -> dict:
+        """
+        Documents with chunks matching a text search, best first
+
+        Large documents store their text compressed, out of reach of the
+        documents' own text index; their chunks keep it searchable.
+
+        Returns:
+            Dict of document _id to the text score of its best chunk
+        """
+        return {row["_id"]: row["score"] for row in chunks_collection.aggregate([
+            {"$match": {"$text": {"$search": terms}}},
+            {"$group": {"_id": "$document_id", "score": {"$max": {"$meta": "textScore"}}}},
+            {"$sort": {"score": -1}},
+            {"$limit": limit},
+        ])}
+
+    @staticmethod
+    def match_documents_regex(pattern: str) -> list:
+        """_ids of the documents with a chunk matching a case-insensitive regex"""
+        return chunks_collection.distinct("document_id", {"text": {"$regex": pattern, "$options": "i"}})
+
+    @staticmethod
+    def delete_for_document(document_id):
+        return chunks_collection.delete_many({"document_id": ObjectId(document_id)})
+
+    @staticmethod
+    def create_indexes():
+        """Chunks in document order, and a text index for passage search"""
+        chunks_collection.create_index([("document_id", ASCENDING), ("seq", ASCENDING)], name="document_id_seq")
+        chunks_collection.create_index([("text", "text")], name="text_text")
@@ -0,0 +1,26 @@
+from datetime import datetime
+from bson import Binary
+from app.database import db
+
+# Trained models live in MongoDB so every worker loads the same one
+classifiers_collection = db.classifiers
+
+
+class Classifier:
+    @staticmethod
+    def save(name: str, model: dict, metrics: dict):
+        """Store (or replace) a trained model under its name"""
+        record = {key: Binary(value) if isinstance(value, bytes) else value for key, value in model.items()}
+        record.update(metrics=metrics, trained_at=datetime.now())
+        classifiers_collection.replace_one({"_id": name}, record, upsert=True)
+
+    @staticmethod
+    def get(name: str) -> dict:
+        """A stored model, or None if it was never trained"""
+        return classifiers_collection.find_one({"_id": name})
+
+    @staticmethod
+    def get_trained_at(name: str):
+        """When the stored model was trained (cheap check before reloading it)"""
+        record = classifiers_collection.find_one({"_id": name}, {"trained_at": 1})
+        return record["trained_at"] if record else None
@@ -2,12 +2,21 @@ from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field, ConfigDict
 from bson import ObjectId
-from pymongo import DESCENDING, TEXT
+from pymongo import DESCENDING, TEXT, ReturnDocument
 from app.database import db
+from app.models.chunk import Chunk
+from app.models.ledger import LedgerRecord
+from app.models.rollup import Rollup, ROLLUP_FIELDS
+from app.utils.http_utils import make_etag
+from app.utils.storage_codec import compress_fields, decompress_fields, decompress_value
 
 # Collection reference
 documents_collection = db.documents
 
+# Stored zstd-compressed when large (see app.utils.storage_codec); read them
+# straight from the collection through decompress_value
+COMPRESSED_FIELDS = ("extracted_text",)
+
 class PyObjectId(str):
     @classmethod
     def __get_validators__(cls):
@@ -20,18 +29,24 @@ class PyObjectId(str):
         return str(v)
         
     @classmethod
-    def __get_pydantic_json_schema__(cls, field_schema):
-        field_schema.update(type="string")
+    def __get_pydantic_json_schema__(cls, core_schema, handler):  # Pydantic 2 signature, for /docs
+        return {"type": "string"}
 
 class DocumentBase(BaseModel):
     title: str
     doc_type: str = "unknown"
     extracted_text: Optional[str] = None
     file_type: str = "image"  # Add this field with default "image"
+    ledger: Optional[LedgerRecord] = None  # Structured fields extracted at ingest
+    near_duplicate_of: Optional[str] = None  # Earlier document this upload looks like
+    extraction_status: Optional[str] = None  # "processing", "done", "failed", "deferred" or "partial" (both retried automatically)
+    extraction_error: Optional[str] = None  # Why extraction (or some of its pages) failed or was deferred
 
 class DocumentCreate(DocumentBase):
     image_base64: Optional[str] = None
     file_type: str = "image"  # Add explicit definition here too
+    phash: Optional[List[int]] = None  # Perceptual hash for near-duplicate lookup (not returned by the API)
+    extraction_meta: Optional[Dict[str, Any]] = None  # Model and prompt behind extracted_text
     
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
@@ -65,6 +80,12 @@ class DocumentListResponse(BaseModel):
         populate_by_name=True,
     )
 
+# Body of the 202 a streamed upload (POST /upload?stream=true) answers with
+class StreamedUploadResponse(BaseModel):
+    document_id: str
+    extraction_status: str  # "processing" until the events stream sends "done"
+    events_url: str
+
 class Document:
     @staticmethod
     def create_document(document: DocumentCreate) -> dict:
@@ -77,27 +98,26 @@ class Document:
         doc_dict["updated_at"] = now
         doc_dict["last_chat_at"] = None
         doc_dict["chat_count"] = 0
+        doc_dict["content_version"] = 1
+        doc_dict["text_version"] = 1  # Bumped only when extracted_text changes
+        if doc_dict.get("phash") is not None:
+            doc_dict["phash_at"] = now  # Read by each worker's near-duplicate index sync
         
         # Insert document
-        result = documents_collection.insert_one(doc_dict)
+        result = documents_collection.insert_one(compress_fields(doc_dict, COMPRESSED_FIELDS))
         
         # Return the created document
-        created_doc = documents_collection.find_one({"_id": result.inserted_id})
+        created_doc = decompress_fields(documents_collection.find_one({"_id": result.inserted_id}), COMPRESSED_FIELDS)
+        Rollup.apply(None, created_doc)
+        Document.sync_derived(created_doc)
         return created_doc
     
     @staticmethod
-    def get_all_documents():
+    def get_all_documents(projection: dict = None):
         """Get all documents"""
         try:
-            # Fetch documents and convert ObjectId to string
-            documents = list(documents_collection.find({}))
-            
-            # CRITICAL FIX: Convert ObjectId to string before returning
-            for doc in documents:
-                if '_id' in doc and isinstance(doc['_id'], ObjectId):
-                    doc['_id'] = str(doc['_id'])
-                    
-            return documents
+            # ObjectIds are stringified by the response encoder
+            return [decompress_fields(doc, COMPRESSED_FIELDS) for doc in documents_collection.find({}, projection)]
         except Exception as e:
             print(f"Error getting documents: {e}")
             return []
@@ -105,36 +125,101 @@ class Document:
     @staticmethod
     def get_document(document_id: str) -> dict:
         """Get a document by ID"""
-        return documents_collection.find_one({"_id": ObjectId(document_id)})
+        return decompress_fields(documents_collection.find_one({"_id": ObjectId(document_id)}), COMPRESSED_FIELDS)
     
     @staticmethod
     def get_document_by_id(document_id: str) -> dict:
         """Alias for get_document to ensure compatibility with chat service"""
         return Document.get_document(document_id)
     
+    @staticmethod
+    def get_document_version(document_id: str) -> dict:
+        """Get only the fields that identify a document's current representation"""
+        return documents_collection.find_one(
+            {"_id": ObjectId(document_id)},
+            {"updated_at": 1, "content_version": 1, "chat_count": 1, "last_chat_at": 1}
+        )
+    
+    @staticmethod
+    def compute_etag(version: dict) -> str:
+        """Strong ETag for a document, from get_document_version's fields"""
+        return make_etag(
+            version["_id"],
+            version.get("content_version", 0),
+            version.get("updated_at"),
+            version.get("chat_count", 0),
+            version.get("last_chat_at"),
+        )
+    
     @staticmethod
     def update_document(document_id: str, data: dict) -> dict:
         """Update a document"""
         # Add updated timestamp
         data["updated_at"] = datetime.now()
         
-        # Update the document
-        documents_collection.update_one(
+        # Update the document, keeping the fields the rollups need from before
+        increments = {"content_version": 1}
+        if "extracted_text" in data:
+            increments["text_version"] = 1
+        old_doc = documents_collection.find_one_and_update(
             {"_id": ObjectId(document_id)},
-            {"$set": data}
+            {"$set": compress_fields(dict(data), COMPRESSED_FIELDS), "$inc": increments},
+            projection=ROLLUP_FIELDS,
+            return_document=ReturnDocument.BEFORE
         )
         
         # Return the updated document
-        return documents_collection.find_one({"_id": ObjectId(document_id)})
+        updated_doc = Document.get_document(document_id)
+        if old_doc:
+            Rollup.apply(old_doc, updated_doc)
+            if "extracted_text" in data:
+                Document.sync_derived(updated_doc)
+        return updated_doc
+
+    @staticmethod
+    def sync_derived(document: dict) -> dict:
+        """
+        Update the search chunks derived from a document's text
+
+        Returns:
+            Chunk change counts (see Chunk.sync), or None if the sync failed;
+            the chunks then stay behind `text_version` until backfilled
+        """
+        try:
+            return Chunk.sync(document["_id"], decompress_value(document.get("extracted_text")),
+                              document.get("text_version", 1))
+        except Exception as e:
+            print(f"Error syncing chunks for document {document['_id']}: {e}")
+            return None
+    
+    @staticmethod
+    def save_progress(document_id: str, data: dict):
+        """
+        Write partial results (extracted text so far, the optimized image) of a
+        document still being processed; rollups are left to the final update
+        """
+        data["updated_at"] = datetime.now()
+        if data.get("phash") is not None:
+            data["phash_at"] = data["updated_at"]
+        documents_collection.update_one(
+            {"_id": ObjectId(document_id)},
+            {"$set": compress_fields(dict(data), COMPRESSED_FIELDS), "$inc": {"content_version": 1}}
+        )
     
     @staticmethod
     def delete_document(document_id: str) -> bool:
         """Delete a document"""
-        result = documents_collection.delete_one({"_id": ObjectId(document_id)})
-        return result.deleted_count > 0
+        deleted_doc = documents_collection.find_one_and_delete(
+            {"_id": ObjectId(document_id)},
+            projection=ROLLUP_FIELDS
+        )
+        Rollup.apply(deleted_doc, None)
+        if deleted_doc is not None:
+            Chunk.delete_for_document(document_id)
+        return deleted_doc is not None
     
     @staticmethod
-    def search_documents(search_term: str):
+    def search_documents(search_term: str, projection: dict = None):
         """Search documents by title and extracted text"""
         print(f"Backend searching for: {search_term}")
         
@@ -161,9 +246,19 @@ class Document:
             # First try MongoDB text search
             results = list(documents_collection.find(
                 {"$text": {"$search": search_term}},
-                {"score": {"$meta": "textScore"}}
+                {**(projection or {}), "score": {"$meta": "textScore"}}
             ).sort([("score", {"$meta": "textScore"})]))
             
+            # Compressed text is only searchable through the document's chunks
+            chunk_scores = Chunk.match_documents(search_term)
+            for doc in results:
+                doc["score"] = max(doc["score"], chunk_scores.pop(doc["_id"], 0))
+            if chunk_scores:
+                for doc in documents_collection.find({"_id": {"$in": list(chunk_scores)}}, projection):
+                    doc["score"] = chunk_scores[doc["_id"]]
+                    results.append(doc)
+                results.sort(key=lambda doc: doc["score"], reverse=True)
+            
             print(f"MongoDB text search found {len(results)} documents")
             
             # If no results, fall back to regex search
@@ -175,18 +270,13 @@ class Document:
                         {"title": {"$regex": regex_pattern, "$options": "i"}},
                         {"extracted_text": {"$regex": regex_pattern, "$options": "i"}},
                         {"filename": {"$regex": regex_pattern, "$options": "i"}},
-                        {"doc_type": {"$regex": regex_pattern, "$options": "i"}}
+                        {"doc_type": {"$regex": regex_pattern, "$options": "i"}},
+                        {"_id": {"$in": Chunk.match_documents_regex(regex_pattern)}}
                     ]
-                }))
+                }, projection))
                 print(f"Regex search found {len(results)} documents")
             
-            # CRITICAL FIX: Convert ObjectId to string before returning
-            # This is the key fix for the error
-            for doc in results:
-                if '_id' in doc and isinstance(doc['_id'], ObjectId):
-                    doc['_id'] = str(doc['_id'])
-                    
-            return results
+            return [decompress_fields(doc, COMPRESSED_FIELDS) for doc in results]
         except Exception as e:
             print(f"Error during document search: {e}")
             # Return an empty list if there's an error
@@ -206,4 +296,29 @@ class Document:
     @staticmethod
     def update_chat_stats(document_id: str):
         """Update chat stats for a document - alias for increment_chat_count"""
-        return Document.increment_chat_count(document_id)
\ No newline at end of file
+        return Document.increment_chat_count(document_id)
+    
+    @staticmethod
+    def create_indexes():
+        """
+        Small partial indexes over the documents waiting for an extraction
+        retry or still processing, and the near-duplicate sync's phash_at
+        """
+        documents_collection.create_index(
+            [("extraction_status", 1), ("_id", 1)],
+            name="extraction_deferred",
+            partialFilterExpression={"extraction_status": "deferred"}
+        )
+        # A key pattern of its own: MongoDB before 5.0 rejects two indexes that
+        # differ only in partialFilterExpression
+        documents_collection.create_index(
+            [("extraction_status", 1), ("extraction_attempts", 1), ("_id", 1)],
+            name="extraction_partial",
+            partialFilterExpression={"extraction_status": "partial"}
+        )
+        documents_collection.create_index(
+            [("extraction_status", 1), ("updated_at", 1)],
+            name="extraction_processing",
+            partialFilterExpression={"extraction_status": "processing"}
+        )
+        documents_collection.create_index("phash_at", name="phash_at", sparse=True)
\ No newline at end of file
@@ -0,0 +1,58 @@
+from datetime import datetime
+from bson import ObjectId
+from app.database import db
+
+# Progress of archive imports, one record per uploaded archive
+import_jobs_collection = db.import_jobs
+
+
+class ImportJob:
+    @staticmethod
+    def create(filename: str, files: list) -> dict:
+        """
+        Record a new import
+
+        Args:
+            filename: Name of the uploaded archive
+            files: One {"name", "status", ...} entry per archive member
+        """
+        now = datetime.now()
+        counts = {"total": len(files), "pending": 0, "done": 0, "failed": 0, "skipped": 0}
+        for entry in files:
+            counts[entry["status"]] += 1
+        job = {
+            "filename": filename,
+            "status": "running",
+            "counts": counts,
+            "files": files,
+            "created_at": now,
+            "updated_at": now,
+        }
+        job["_id"] = import_jobs_collection.insert_one(job).inserted_id
+        return job
+
+    @staticmethod
+    def get(job_id: str) -> dict:
+        """An import's progress record"""
+        return import_jobs_collection.find_one({"_id": ObjectId(job_id)})
+
+    @staticmethod
+    def update_file(job_id, index: int, status: str, document_id=None, error: str = None):
+        """Move one archive member from pending to done or failed"""
+        update = {f"files.{index}.status": status, "updated_at": datetime.now()}
+        if document_id is not None:
+            update[f"files.{index}.document_id"] = str(document_id)
+        if error is not None:
+            update[f"files.{index}.error"] = error
+        import_jobs_collection.update_one(
+            {"_id": job_id},
+            {"$set": update, "$inc": {"counts.pending": -1, f"counts.{status}": 1}}
+        )
+
+    @staticmethod
+    def finish(job_id, status: str = "completed", error: str = None):
+        """Mark an import completed or failed"""
+        update = {"status": status, "updated_at": datetime.now()}
+        if error is not None:
+            update["error"] = error
+        import_jobs_collection.update_one({"_id": job_id}, {"$set": update})
@@ -0,0 +1,58 @@
+from datetime import datetime
+from pymongo import ReturnDocument
+from app.database import db
+
+# Checkpoints of long-running maintenance jobs, one record per job name
+jobs_collection = db.jobs
+
+
+class Job:
+    @staticmethod
+    def get(job_id: str) -> dict:
+        """A job's checkpoint record"""
+        return jobs_collection.find_one({"_id": job_id})
+
+    @staticmethod
+    def start(job_id: str, kind: str, params: dict) -> dict:
+        """Create (or reset) a job record with empty progress"""
+        now = datetime.now()
+        return jobs_collection.find_one_and_replace(
+            {"_id": job_id},
+            {
+                "kind": kind,
+                "params": params,
+                "status": "running",
+                "last_id": None,
+                "counts": {},
+                "started_at": now,
+                "updated_at": now,
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def checkpoint(job_id: str, last_id, counts: dict):
+        """
+        Record that everything up to last_id is done
+
+        Args:
+            job_id: Job name
+            last_id: _id of the last document of a fully processed batch
+            counts: Increments for the job's counters (e.g. {"processed": 50})
+        """
+        jobs_collection.update_one(
+            {"_id": job_id},
+            {
+                "$set": {"last_id": last_id, "status": "running", "updated_at": datetime.now()},
+                "$inc": {f"counts.{name}": value for name, value in counts.items() if value},
+            }
+        )
+
+    @staticmethod
+    def finish(job_id: str, status: str, error: str = None):
+        """Mark a job completed, interrupted or failed"""
+        jobs_collection.update_one(
+            {"_id": job_id},
+            {"$set": {"status": status, "error": error, "updated_at": datetime.now()}}
+        )
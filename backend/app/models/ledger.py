@@ -0,0 +1,143 @@
+import re
+from datetime import datetime
+from typing import Optional, List
+from pydantic import BaseModel, Field, field_validator, model_validator
+from pymongo import ASCENDING, DESCENDING
+from app.database import db
+
+# Ledger records are embedded in documents under the "ledger" field
+documents_collection = db.documents
+
+# The number in an amount string, ignoring currency marks around it ("Rs. 1,296.75", "40.00/-")
+_AMOUNT = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+
+def parse_amount(value):
+    """
+    Coerce LLM-formatted amounts like "1,296.75" or "₹ 40" to float
+
+    >>> [parse_amount(s) for s in ("Rs. 40", "₹1,296.75", "INR 40", "40.00/-", "Rs. 1,296.75", "-12.5", "n/a")]
+    [40.0, 1296.75, 40.0, 40.0, 1296.75, -12.5, None]
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    match = _AMOUNT.search(str(value))
+    if not match:
+        return None
+    return float(match.group().replace(",", ""))
+
+
+def normalize_vendor(vendor):
+    """Case- and punctuation-insensitive vendor key used for indexed lookups"""
+    if not vendor:
+        return None
+    return re.sub(r"[^a-z0-9]+", " ", vendor.lower()).strip() or None
+
+
+class LineItem(BaseModel):
+    description: Optional[str] = None  # LLMs sometimes leave it out; the item still counts
+    quantity: Optional[float] = None
+    unit_price: Optional[float] = None
+    amount: Optional[float] = None
+
+    @field_validator("quantity", "unit_price", "amount", mode="before")
+    @classmethod
+    def parse_numbers(cls, value):
+        return parse_amount(value)
+
+
+class LedgerRecord(BaseModel):
+    """Structured ledger entry extracted from a document"""
+    vendor: Optional[str] = None
+    vendor_key: Optional[str] = None
+    category: Optional[str] = None
+    date: Optional[datetime] = None
+    currency: Optional[str] = None
+    total: Optional[float] = None
+    tax: Optional[float] = None
+    line_items: List[LineItem] = Field(default_factory=list)
+
+    @field_validator("total", "tax", mode="before")
+    @classmethod
+    def parse_numbers(cls, value):
+        return parse_amount(value)
+
+    @field_validator("date", mode="before")
+    @classmethod
+    def empty_date_is_none(cls, value):
+        return value or None
+
+    @field_validator("currency", mode="before")
+    @classmethod
+    def normalize_currency(cls, value):
+        return str(value).strip().upper() or None if value else None
+
+    @field_validator("category", mode="before")
+    @classmethod
+    def normalize_category(cls, value):
+        return str(value).strip().lower() or None if value else None
+
+    @model_validator(mode="after")
+    def set_vendor_key(self):
+        self.vendor_key = normalize_vendor(self.vendor)
+        return self
+
+
+class Ledger:
+    @staticmethod
+    def build_query(vendor=None, category=None, start=None, end=None, doc_type=None) -> dict:
+        """MongoDB filter over the indexed ledger fields"""
+        query = {"ledger": {"$ne": None}}
+        if vendor:
+            query["ledger.vendor_key"] = normalize_vendor(vendor)
+        if category:
+            query["ledger.category"] = category.lower()
+        if start or end:
+            query["ledger.date"] = {}
+            if start:
+                query["ledger.date"]["$gte"] = start
+            if end:
+                query["ledger.date"]["$lt"] = end
+        if doc_type:
+            query["doc_type"] = doc_type
+        return query
+
+    @staticmethod
+    def find_documents(query: dict, projection: dict = None, limit: int = 0):
+        """Documents matching a ledger query, newest ledger date first"""
+        return list(documents_collection.find(query, projection)
+                    .sort("ledger.date", DESCENDING)
+                    .limit(limit))
+
+    @staticmethod
+    def summarize(query: dict) -> list:
+        """Count, total and tax per currency for a ledger query"""
+        return list(documents_collection.aggregate([
+            {"$match": query},
+            {"$group": {
+                "_id": "$ledger.currency",
+                "documents": {"$sum": 1},
+                "total": {"$sum": "$ledger.total"},
+                "tax": {"$sum": "$ledger.tax"},
+                "first_date": {"$min": "$ledger.date"},
+                "last_date": {"$max": "$ledger.date"},
+            }},
+            {"$project": {"_id": 0, "currency": "$_id", "documents": 1, "total": 1,
+                          "tax": 1, "first_date": 1, "last_date": 1}},
+        ]))
+
+    @staticmethod
+    def create_indexes():
+        """Indexes behind vendor, category and date-range ledger queries"""
+        documents_collection.create_index(
+            [("ledger.vendor_key", ASCENDING), ("ledger.date", DESCENDING)],
+            name="ledger_vendor_date"
+        )
+        documents_collection.create_index(
+            [("ledger.category", ASCENDING), ("ledger.date", DESCENDING)],
+            name="ledger_category_date"
+        )
+        documents_collection.create_index(
+            [("ledger.date", DESCENDING)],
+            name="ledger_date"
+        )
@@ -0,0 +1,164 @@
+from collections import defaultdict
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from app.database import db
+
+# Precomputed analytics, one record per (dimension, key), e.g. "month:2025-03"
+rollups_collection = db.rollups
+documents_collection = db.documents
+
+# Document fields a rollup contribution depends on
+ROLLUP_FIELDS = {"created_at": 1, "doc_type": 1, "ledger.date": 1, "ledger.vendor": 1,
+                 "ledger.vendor_key": 1, "ledger.currency": 1, "ledger.total": 1}
+
+UNKNOWN_CURRENCY = "UNKNOWN"
+
+
+def _contribution(doc):
+    """
+    What one document adds to the rollups
+
+    Returns:
+        Dict mapping rollup _id to (dimension, key, label, currency, amount)
+    """
+    if not doc:
+        return {}
+
+    ledger = doc.get("ledger") or {}
+    day = ledger.get("date") or doc.get("created_at")
+    amount = ledger.get("total")
+    currency = ledger.get("currency") or UNKNOWN_CURRENCY
+
+    keys = [("all", "all", None), ("doc_type", doc.get("doc_type") or "unknown", None)]
+    if day:
+        keys.append(("month", day.strftime("%Y-%m"), None))
+    if ledger.get("vendor_key"):
+        keys.append(("vendor", ledger["vendor_key"], ledger.get("vendor")))
+
+    return {
+        f"{dimension}:{key}": (dimension, key, label, currency, amount)
+        for dimension, key, label in keys
+    }
+
+
+class Rollup:
+    @staticmethod
+    def apply(old_doc=None, new_doc=None):
+        """
+        Move a document's contribution from its old state to its new state
+
+        Pass old_doc=None for a created document and new_doc=None for a
+        deleted one. Unchanged contributions cost no writes.
+        """
+        removed, added = _contribution(old_doc), _contribution(new_doc)
+        if removed == added:
+            return
+
+        increments = defaultdict(lambda: defaultdict(int))
+        meta = {}
+        for sign, contribution in ((-1, removed), (1, added)):
+            for rollup_id, (dimension, key, label, currency, amount) in contribution.items():
+                increments[rollup_id]["documents"] += sign
+                if amount:
+                    increments[rollup_id][f"spend.{currency}"] += sign * amount
+                meta[rollup_id] = (dimension, key, label)
+
+        now = datetime.now()
+        operations = []
+        for rollup_id, inc in increments.items():
+            inc = {field: value for field, value in inc.items() if value}
+            if not inc:
+                continue
+            dimension, key, label = meta[rollup_id]
+            update = {"$inc": inc, "$set": {"dimension": dimension, "key": key, "updated_at": now}}
+            if label:
+                update["$set"]["label"] = label
+            operations.append(UpdateOne({"_id": rollup_id}, update, upsert=True))
+
+        if operations:
+            rollups_collection.bulk_write(operations, ordered=False)
+
+    @staticmethod
+    def get(dimension: str, key: str) -> dict:
+        """A single rollup record"""
+        return rollups_collection.find_one({"_id": f"{dimension}:{key}"})
+
+    @staticmethod
+    def list_dimension(dimension: str, start: str = None, end: str = None,
+                       sort_by_documents: bool = False, limit: int = 0) -> list:
+        """Rollup records of one dimension, optionally within a key range"""
+        query = {"dimension": dimension, "documents": {"$gt": 0}}
+        if start or end:
+            query["key"] = {}
+            if start:
+                query["key"]["$gte"] = start
+            if end:
+                query["key"]["$lte"] = end
+        sort = [("documents", DESCENDING)] if sort_by_documents else [("key", ASCENDING)]
+        return list(rollups_collection.find(query, {"dimension": 0, "updated_at": 0})
+                    .sort(sort).limit(limit))
+
+    @staticmethod
+    def reconcile() -> int:
+        """
+        Recompute every rollup from the documents and overwrite drifted records
+
+        The incremental updates are not transactional with the document
+        writes, so this periodically corrects any drift.
+
+        Returns:
+            Number of rollup records written
+        """
+        group_keys = {
+            "all": {"$literal": "all"},
+            "doc_type": {"$ifNull": ["$doc_type", "unknown"]},
+            "month": {"$dateToString": {"format": "%Y-%m",
+                                        "date": {"$ifNull": ["$ledger.date", "$created_at"]}}},
+            "vendor": "$ledger.vendor_key",
+        }
+
+        rollups = {}
+        for dimension, key_expression in group_keys.items():
+            pipeline = [
+                {"$group": {
+                    "_id": {"key": key_expression,
+                            "currency": {"$ifNull": ["$ledger.currency", UNKNOWN_CURRENCY]}},
+                    "documents": {"$sum": 1},
+                    "spend": {"$sum": {"$ifNull": ["$ledger.total", 0]}},
+                    "label": {"$first": "$ledger.vendor"},
+                }},
+            ]
+            for row in documents_collection.aggregate(pipeline, allowDiskUse=True):
+                key = row["_id"]["key"]
+                if key is None:
+                    continue
+                rollup = rollups.setdefault(f"{dimension}:{key}", {
+                    "dimension": dimension, "key": key, "documents": 0, "spend": {}
+                })
+                rollup["documents"] += row["documents"]
+                if row["spend"]:
+                    rollup["spend"][row["_id"]["currency"]] = row["spend"]
+                if dimension == "vendor" and row.get("label"):
+                    rollup["label"] = row["label"]
+
+        now = datetime.now()
+        operations = [
+            UpdateOne({"_id": rollup_id}, {"$set": {**rollup, "updated_at": now}}, upsert=True)
+            for rollup_id, rollup in rollups.items()
+        ]
+        if operations:
+            rollups_collection.bulk_write(operations, ordered=False)
+        rollups_collection.delete_many({"_id": {"$nin": list(rollups)}})
+        return len(operations)
+
+    @staticmethod
+    def create_indexes():
+        """Indexes behind the analytics listings"""
+        rollups_collection.create_index(
+            [("dimension", ASCENDING), ("key", ASCENDING)],
+            name="dimension_key"
+        )
+        rollups_collection.create_index(
+            [("dimension", ASCENDING), ("documents", DESCENDING)],
+            name="dimension_documents"
+        )
@@ -0,0 +1,44 @@
+from datetime import datetime
+from bson import ObjectId, Binary
+from app.database import db
+
+# Thumbnails live outside the documents collection so list queries stay small
+thumbnails_collection = db.thumbnails
+
+
+class Thumbnail:
+    @staticmethod
+    def save_thumbnails(document_id: str, thumbnails: dict):
+        """Store (or replace) the thumbnails of a document, one record per size"""
+        now = datetime.now()
+        for size, data in thumbnails.items():
+            thumbnails_collection.update_one(
+                {"document_id": ObjectId(document_id), "size": size},
+                {"$set": {
+                    "data": Binary(data),
+                    "mime_type": "image/webp",
+                    "created_at": now
+                }},
+                upsert=True
+            )
+
+    @staticmethod
+    def get_thumbnail(document_id: str, size: int) -> dict:
+        """Get the thumbnail of a document at one size"""
+        return thumbnails_collection.find_one(
+            {"document_id": ObjectId(document_id), "size": size}
+        )
+
+    @staticmethod
+    def delete_thumbnails_for_document(document_id: str):
+        """Delete every thumbnail of a document"""
+        return thumbnails_collection.delete_many({"document_id": ObjectId(document_id)})
+
+    @staticmethod
+    def create_indexes():
+        """One thumbnail per (document, size)"""
+        thumbnails_collection.create_index(
+            [("document_id", 1), ("size", 1)],
+            name="document_id_size",
+            unique=True
+        )
@@ -1,3 +1,4 @@
 # Expose routers for importing
 from app.routes.documents import router as documents_router
-from app.routes.chat import router as chat_router
\ No newline at end of file
+from app.routes.chat import router as chat_router
+from app.routes.analytics import router as analytics_router
\ No newline at end of file
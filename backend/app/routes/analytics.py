@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Query
+from typing import Optional
+
+from app.models.rollup import Rollup
+from app.utils.json_utils import MongoJSONResponse
+
+# Create router with the proper tag
+router = APIRouter(tags=["Analytics"])
+
+
+def _rows(rollups):
+    """Rollup records as API rows, with spend rounded to cents"""
+    return [
+        {
+            "key": rollup["key"],
+            "label": rollup.get("label", rollup["key"]),
+            "documents": rollup.get("documents", 0),
+            "spend": {currency: round(amount, 2) for currency, amount in rollup.get("spend", {}).items()},
+        }
+        for rollup in rollups
+    ]
+
+
+@router.get("/summary")
+async def get_summary():
+    """Total document count and spend per currency"""
+    rollup = Rollup.get("all", "all") or {"key": "all", "documents": 0, "spend": {}}
+    return MongoJSONResponse(_rows([rollup])[0])
+
+
+@router.get("/by-month")
+async def get_spend_by_month(
+    start: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="First month, YYYY-MM"),
+    end: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Last month, YYYY-MM")
+):
+    """Document count and spend per month (ledger date, else upload date)"""
+    return MongoJSONResponse(_rows(Rollup.list_dimension("month", start, end)))
+
+
+@router.get("/by-type")
+async def get_spend_by_type():
+    """Document count and spend per document type"""
+    return MongoJSONResponse(_rows(Rollup.list_dimension("doc_type")))
+
+
+@router.get("/by-vendor")
+async def get_spend_by_vendor(limit: int = Query(20, ge=1, le=500)):
+    """Document count and spend for the vendors with the most documents"""
+    return MongoJSONResponse(_rows(Rollup.list_dimension("vendor", sort_by_documents=True, limit=limit)))
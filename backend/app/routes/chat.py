@@ -1,27 +1,99 @@
-from fastapi import APIRouter, HTTPException, Body
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Body, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from datetime import datetime
 from bson.objectid import ObjectId
 
-from app.models.chat import Chat, ChatResponse, ChatCreate
+from app.models.chat import Chat, ChatResponse, ChatCreate, GlobalChatCreate, GlobalChatResponse
 from app.models.document import Document
+from app.services.chat_retention_service import update_conversation_summary
 from app.services.chat_service import process_chat_with_document
+from app.services.global_chat_service import process_global_chat
+from app.services.export_service import EXPORT_MEDIA_TYPES, build_export_query, export_chats
+from app.utils.json_utils import MongoJSONResponse, shape_for_response
+from app.utils.http_utils import etag_matches, not_modified
+from app.utils.resilience import CircuitOpen, DeadlineExceeded
+from app.config import BREAKER_RESET
 
 # Create router with the proper tag
 router = APIRouter(tags=["Chat"])
 
+def unavailable(error):
+    """503 for a chat that could not be answered because Gemini is down or too slow"""
+    return HTTPException(
+        status_code=503,
+        detail=f"The assistant is temporarily unavailable: {str(error)}",
+        headers={"Retry-After": str(int(BREAKER_RESET))}
+    )
+
+@router.get("/global", response_model=List[GlobalChatResponse])
+async def get_global_chats():
+    """Get recent cross-document chat messages"""
+    chats = Chat.get_global_chats()
+    return MongoJSONResponse([shape_for_response(chat, GlobalChatResponse) for chat in chats])
+
+@router.post("/global", response_model=GlobalChatResponse)
+async def create_global_chat(background_tasks: BackgroundTasks, chat: GlobalChatCreate = Body(...)):
+    """Ask a question across all documents (totals, vendors, date ranges)"""
+    try:
+        ai_response, used_tools = await run_in_threadpool(process_global_chat, chat.user_message)
+        chat_id = Chat.create_chat(None, chat.user_message, ai_response, used_tools)
+        # Turns pushed out of the history window go into the summary after the response
+        background_tasks.add_task(update_conversation_summary, None)
+        return MongoJSONResponse(shape_for_response(Chat.get_chat_by_id(chat_id), GlobalChatResponse))
+    except (CircuitOpen, DeadlineExceeded) as e:
+        raise unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
+
+@router.get("/export")
+async def export_chats_route(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    document_id: Optional[str] = None,
+    global_only: bool = False,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """
+    Download chat history as NDJSON or CSV, streamed in batches
+
+    Filter to one document with `document_id`, or to cross-document chats
+    with `global_only=true`.
+    """
+    if document_id and not ObjectId.is_valid(document_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    query = build_export_query(
+        document_id=ObjectId(document_id) if document_id else None,
+        global_only=global_only, since=since, until=until
+    )
+    filename = f"chats-{datetime.now():%Y%m%d-%H%M%S}.{export_format}"
+    return StreamingResponse(
+        export_chats(export_format, query),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/{document_id}", response_model=List[ChatResponse])
-async def get_chats_for_document(document_id: str):
+async def get_chats_for_document(document_id: str, if_none_match: Optional[str] = Header(None)):
     """Get all chat messages for a document"""
     # Verify document exists
-    document = Document.get_document_by_id(document_id)
+    document = Document.get_document_version(document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
+    etag = Chat.get_history_etag(document_id)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    
     chats = Chat.get_chats_for_document(document_id)
-    return chats
+    return MongoJSONResponse(
+        [shape_for_response(chat, ChatResponse) for chat in chats],
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
 
 @router.post("/", response_model=ChatResponse)
-async def create_chat(chat: ChatCreate = Body(...)):
+async def create_chat(background_tasks: BackgroundTasks, chat: ChatCreate = Body(...)):
     """Create a new chat message"""
     try:
         # Verify document exists
@@ -29,8 +101,9 @@ async def create_chat(chat: ChatCreate = Body(...)):
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
             
-        # Process chat with AI
-        ai_response, used_tools = process_chat_with_document(
+        # Process chat with AI (off the event loop, it may wait on Gemini)
+        ai_response, used_tools = await run_in_threadpool(
+            process_chat_with_document,
             chat.document_id, 
             chat.user_message
         )
@@ -45,9 +118,14 @@ async def create_chat(chat: ChatCreate = Body(...)):
         
         # Update document chat stats
         Document.update_chat_stats(chat.document_id)
+        background_tasks.add_task(update_conversation_summary, chat.document_id)
         
         # Return the chat
-        return Chat.get_chat_by_id(chat_id)
+        return MongoJSONResponse(shape_for_response(Chat.get_chat_by_id(chat_id), ChatResponse))
+    except HTTPException:
+        raise
+    except (CircuitOpen, DeadlineExceeded) as e:
+        raise unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
 
@@ -1,16 +1,37 @@
-from fastapi import APIRouter, HTTPException, Query, File, UploadFile, Form, Body
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Query, File, UploadFile, Form, Body, Header, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from typing import Optional, List
+from datetime import datetime
 import base64
 from io import BytesIO
 from pathlib import Path
 import os
+import zipfile
+from bson import ObjectId
 from pydantic import BaseModel
 
-from app.models.document import Document, DocumentResponse, DocumentCreate, DocumentListResponse
+from app.models.document import (
+    Document, DocumentResponse, DocumentCreate, DocumentListResponse, StreamedUploadResponse
+)
+from app.models.thumbnail import Thumbnail
+from app.models.ledger import Ledger
+from app.models.import_job import ImportJob
 from app.services.document_processor import DocumentProcessor
-from app.config import API_PREFIX
+from app.services.dedup_service import forget_document
+from app.services.document_events import document_event_stream
+from app.services.export_service import EXPORT_MEDIA_TYPES, build_export_query, export_documents
+from app.services.llm_governor import llm_lane
+from app.services.ingest_service import (
+    document_from_file, ingest_document, save_upload, scan_archive, run_import,
+    start_progressive_ingest, finish_progressive_ingest, refresh_ledger
+)
+from app.services.thumbnail_service import generate_document_thumbnails, pick_thumbnail_size
+from app.config import API_PREFIX, BATCH_PAGE_EXTRACTION
 from app.utils.image_utils import combine_images_to_pdf
+from app.utils.json_utils import MongoJSONResponse, shape_for_response
+from app.utils.http_utils import etag_matches, not_modified, make_etag
+from app.utils.metrics import span
 
 
 # Create router
@@ -23,15 +44,23 @@ class ContentUpdateModel(BaseModel):
     content: str
 
 
+# Fields left out of list responses when only a summary is requested
+SUMMARY_PROJECTION = {"image_base64": 0, "extracted_text": 0}
+
+
 @router.get("/")
-async def get_documents(search: str = None):
+async def get_documents(search: str = None, summary: bool = False):
     """
     Get all documents or search documents by title and content
+
+    With `summary=true` the large `image_base64` and `extracted_text` fields
+    are left out; use the thumbnail endpoint for previews.
     """
     try:
+        projection = SUMMARY_PROJECTION if summary else None
         if search:
             print(f"API search request received for: '{search}'")
-            documents = Document.search_documents(search)
+            documents = Document.search_documents(search, projection)
             print(f"Found {len(documents)} documents matching '{search}'")
 
             # Log sample document to debug content issues
@@ -44,10 +73,10 @@ async def get_documents(search: str = None):
                         sample['extracted_text']) > 100 else sample['extracted_text']
                     print(f"Content preview: {content_preview}")
         else:
-            documents = Document.get_all_documents()
+            documents = Document.get_all_documents(projection)
 
         # Return documents with all fields
-        return documents
+        return MongoJSONResponse(documents)
     except Exception as e:
         print(f"Error in get_documents: {e}")
         import traceback
@@ -55,6 +84,19 @@ async def get_documents(search: str = None):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _process_and_create(document):
+    with llm_lane("ingest"):
+        # Process document image, extract text, etc.; the processor always
+        # generates a title based on content, regardless of what was provided
+        processor = DocumentProcessor()
+        processed_data = processor.process_document(document)
+
+    # Create document with processed data
+    created_doc = Document.create_document(processed_data)
+    generate_document_thumbnails(created_doc)
+    return created_doc
+
+
 @router.post("/", response_model=DocumentResponse)
 async def create_document(file: UploadFile = File(None), document: DocumentCreate = None):
     """Create a new document"""
@@ -80,34 +122,174 @@ async def create_document(file: UploadFile = File(None), document: DocumentCreat
 
     # Process the document
     if document and document.image_base64:
-        # Process document image, extract text, etc.
-        processor = DocumentProcessor()
-        processed_data = processor.process_document(document)
-
-        # Always generate a title based on content, regardless of what was provided
-        from app.services.document_service import generate_document_title
-        processed_data.title = generate_document_title(
-            processed_data.extracted_text)
-
-        # Create document with processed data
-        created_doc = Document.create_document(processed_data)
-        return created_doc
+        created_doc = await run_in_threadpool(_process_and_create, document)
+        return MongoJSONResponse(shape_for_response(created_doc, DocumentResponse))
     elif document:
         # Create document without processing
         created_doc = Document.create_document(document)
-        return created_doc
+        return MongoJSONResponse(shape_for_response(created_doc, DocumentResponse))
     else:
         raise HTTPException(
             status_code=400, detail="No document data provided")
 
 
+@router.get("/ledger")
+async def query_ledger(
+    vendor: Optional[str] = None,
+    category: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    doc_type: Optional[str] = None,
+    limit: int = Query(100, ge=0, le=1000)
+):
+    """
+    Query documents by their structured ledger fields
+
+    Returns per-currency totals for everything that matches, plus the
+    matching documents (newest first, without image or text).
+    """
+    query = Ledger.build_query(vendor, category, start, end, doc_type)
+    return MongoJSONResponse({
+        "summary": Ledger.summarize(query),
+        "documents": Ledger.find_documents(query, SUMMARY_PROJECTION, limit),
+    })
+
+
+@router.get("/export")
+async def export_documents_route(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    doc_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    include_text: bool = False
+):
+    """
+    Download document metadata and ledger fields as NDJSON or CSV
+
+    The export is streamed from the database in batches, so it starts
+    immediately and uses the same memory however many documents match.
+    Images are never included; extracted text only with `include_text=true`.
+    """
+    query = build_export_query(doc_type=doc_type, since=since, until=until)
+    filename = f"documents-{datetime.now():%Y%m%d-%H%M%S}.{export_format}"
+    return StreamingResponse(
+        export_documents(export_format, query, include_text),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.post("/import", status_code=202)
+async def import_archive(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    doc_type: Optional[str] = Form("unknown")
+):
+    """
+    Import every document in a zip archive
+
+    The archive is saved and its file list checked, then the files are
+    processed in the background. Poll the returned status URL for progress.
+    """
+    try:
+        path = await run_in_threadpool(save_upload, file.file)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    try:
+        entries = await run_in_threadpool(scan_archive, path)
+    except (zipfile.BadZipFile, ValueError) as e:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail=f"Invalid archive: {str(e)}")
+
+    job = ImportJob.create(file.filename, entries)
+    background_tasks.add_task(run_import, job["_id"], path, entries, doc_type)
+
+    return MongoJSONResponse({
+        "job_id": job["_id"],
+        "status": job["status"],
+        "counts": job["counts"],
+        "status_url": f"{API_PREFIX}/documents/import/{job['_id']}",
+    }, status_code=202)
+
+
+@router.get("/import/{job_id}")
+async def get_import_status(job_id: str):
+    """Progress of an archive import, with the outcome of each file"""
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=404, detail="Import job not found")
+    job = ImportJob.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return MongoJSONResponse(job)
+
+
 @router.get("/{document_id}", response_model=DocumentResponse)
-async def get_document(document_id: str):
+async def get_document(document_id: str, if_none_match: Optional[str] = Header(None)):
     """Get a document by ID"""
+    # Check the cheap version fields first so revalidation skips the full read
+    version = Document.get_document_version(document_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    etag = Document.compute_etag(version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
     document = Document.get_document(document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
-    return document
+    return MongoJSONResponse(
+        shape_for_response(document, DocumentResponse),
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
+
+
+@router.get("/{document_id}/events")
+async def get_document_events(document_id: str):
+    """
+    Server-Sent Events with a document's processing progress
+
+    Events: "text" (`{"text": ...}`, chunks of markdown in order), "ledger",
+    "doc_type", "title", then "done" with the final title, type and
+    extraction status, or "error". Connecting late replays the text so far;
+    a document that is already processed gets its results and "done" at once.
+    """
+    if not ObjectId.is_valid(document_id) or not Document.get_document_version(document_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return StreamingResponse(
+        document_event_stream(document_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/{document_id}/thumbnail")
+async def get_document_thumbnail(
+    document_id: str,
+    size: Optional[int] = Query(None, gt=0),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get a WebP thumbnail of a document (first page for PDFs)"""
+    size = pick_thumbnail_size(size)
+    thumbnail = Thumbnail.get_thumbnail(document_id, size)
+
+    if not thumbnail:
+        # Documents ingested before thumbnails existed are rendered on first request
+        document = Document.get_document(document_id)
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        # Rendering a large image or PDF would block the event loop
+        if size not in await run_in_threadpool(generate_document_thumbnails, document):
+            raise HTTPException(status_code=404, detail="Thumbnail not available")
+        thumbnail = Thumbnail.get_thumbnail(document_id, size)
+
+    etag = make_etag(thumbnail["_id"], thumbnail["created_at"])
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=bytes(thumbnail["data"]), media_type=thumbnail["mime_type"], headers=headers)
 
 
 @router.put("/{document_id}", response_model=DocumentResponse)
@@ -118,17 +300,29 @@ async def update_document(document_id: str, data: dict):
         raise HTTPException(status_code=404, detail="Document not found")
 
     updated_doc = Document.update_document(document_id, data)
-    return updated_doc
+    return MongoJSONResponse(shape_for_response(updated_doc, DocumentResponse))
 
 
 @router.put("/{document_id}/content", response_model=dict)
-async def update_document_content(document_id: str, content_update: ContentUpdateModel):
-    """Update only the content of a document"""
+async def update_document_content(
+    document_id: str,
+    content_update: ContentUpdateModel,
+    background_tasks: BackgroundTasks
+):
+    """
+    Update only the content of a document
+
+    Only the search chunks the edit touched are rewritten; the ledger is
+    re-extracted from the new text in the background.
+    """
     try:
         document = Document.get_document(document_id)
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
 
+        if content_update.content == document.get("extracted_text"):
+            return {"message": "Document content unchanged", "success": True}
+
         # Update only the extracted_text field
         update_data = {"extracted_text": content_update.content}
 
@@ -136,6 +330,7 @@ async def update_document_content(document_id: str, content_update: ContentUpdat
         result = Document.update_document(document_id, update_data)
 
         if result:
+            background_tasks.add_task(refresh_ledger, document_id, result["text_version"])
             return {"message": "Document content updated successfully", "success": True}
         else:
             raise HTTPException(
@@ -186,6 +381,8 @@ async def delete_document(document_id: str):
         raise HTTPException(status_code=404, detail="Document not found")
 
     result = Document.delete_document(document_id)
+    Thumbnail.delete_thumbnails_for_document(document_id)
+    forget_document(document["_id"])
     if result:
         return {"message": "Document deleted successfully"}
     else:
@@ -193,19 +390,30 @@ async def delete_document(document_id: str):
             status_code=500, detail="Failed to delete document")
 
 
-@router.post("/upload", response_model=DocumentResponse)
+@router.post("/upload", response_model=DocumentResponse, responses={
+    202: {"model": StreamedUploadResponse, "description": "With stream=true: stored, still being processed"}
+})
 async def upload_document(
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),  # Changed from file to files (List)
     title: Optional[str] = Form(None),
-    doc_type: Optional[str] = Form("unknown")
+    doc_type: Optional[str] = Form("unknown"),
+    stream: bool = False
 ):
-    """Upload one or more document files"""
+    """
+    Upload one or more document files
+
+    With `stream=true` the document is stored right away and processed in the
+    background: the response (202) carries its id and an events URL that
+    streams the markdown as Gemini writes it, then the title and type.
+    """
 
     # Check if we have multiple image files
     is_batch_image_upload = len(files) > 1 and all(
         file.content_type.startswith("image/") for file in files
     )
 
+    page_images = None
     if is_batch_image_upload:
         # Process multiple images as a batch and convert to PDF
         image_buffers = []
@@ -214,7 +422,8 @@ async def upload_document(
             image_buffers.append(BytesIO(content))
 
         # Combine images into a single PDF
-        pdf_buffer = combine_images_to_pdf(image_buffers)
+        with span("image_normalize"):
+            pdf_buffer = combine_images_to_pdf(image_buffers)
         pdf_content = pdf_buffer.getvalue()
 
         # Convert to base64
@@ -227,34 +436,29 @@ async def upload_document(
             image_base64=base64_string,
             file_type="pdf"  # Always set as PDF for batch uploads
         )
+        if BATCH_PAGE_EXTRACTION:
+            # Extract the photos in parallel; the PDF is kept for viewing
+            page_images = [buffer.getvalue() for buffer in image_buffers]
     else:
         # Process single file (existing logic)
         file = files[0]  # Take the first file if only one was uploaded
         contents = await file.read()
-
-        # Convert to base64
-        base64_string = base64.b64encode(contents).decode()
-
-        # Determine file type
-        file_extension = file.filename.split('.')[-1].lower()
-        file_type = "pdf" if file_extension == "pdf" else "image"
-
-        # Create document with base64 data
-        document = DocumentCreate(
-            title="Document being processed...",
-            doc_type=doc_type,
-            image_base64=base64_string,
-            file_type=file_type
-        )
-
-    # Process and create document using existing logic
-    processor = DocumentProcessor()
-    processed_data = processor.process_document(document)
-
-    # The title should be set by the processor from the content
-    created_doc = Document.create_document(processed_data)
-
-    return created_doc
+        document = document_from_file(contents, file.filename, doc_type)
+
+    if stream:
+        placeholder = await run_in_threadpool(start_progressive_ingest, document)
+        background_tasks.add_task(finish_progressive_ingest, placeholder["_id"], document, page_images)
+        return MongoJSONResponse({
+            "document_id": placeholder["_id"],
+            "extraction_status": placeholder["extraction_status"],
+            "events_url": f"{API_PREFIX}/documents/{placeholder['_id']}/events",
+        }, status_code=202)
+
+    # Process and create document; the title is set by the processor from the content.
+    # Run off the event loop so waiting for Gemini does not hold up other requests
+    created_doc = await run_in_threadpool(ingest_document, document, page_images)
+
+    return MongoJSONResponse(shape_for_response(created_doc, DocumentResponse))
 
 
 @router.post("/{document_id}/increment-chat")
@@ -0,0 +1,37 @@
+"""
+Summarize and archive the chat messages past retention (CHAT_HOT_MESSAGES,
+CHAT_RETENTION_DAYS)
+
+The API does this every CHAT_RETENTION_INTERVAL seconds; run it by hand
+after lowering the limits, or with --dry-run to see what would move.
+
+Usage (from backend/):
+    python -m app.scripts.archive_chats [--limit N] [--dry-run]
+"""
+import argparse
+
+from app.models.chat import chats_collection
+from app.services.chat_retention_service import apply_chat_retention, conversations_over_limit, expired_query
+from app.services.llm_governor import set_default_lane
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive chat messages past retention")
+    parser.add_argument("--limit", type=int, default=0, help="maximum conversations to process")
+    parser.add_argument("--dry-run", action="store_true", help="count the messages without archiving them")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        conversations = conversations_over_limit()[:args.limit or None]
+        expired = sum(chats_collection.count_documents(expired_query(document_id) or {"_id": None})
+                      for document_id in conversations)
+        print(f"Would archive {expired} messages from {len(conversations)} conversations")
+        return
+
+    set_default_lane("backfill")
+    conversations, archived = apply_chat_retention(args.limit)
+    print(f"Done: {archived} messages archived from {conversations} conversations")
+
+
+if __name__ == "__main__":
+    main()
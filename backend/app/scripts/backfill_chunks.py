@@ -0,0 +1,64 @@
+"""
+Build the search chunks of documents stored before chunking existed, or whose
+chunks fell behind their text (a failed sync leaves `derived.chunks` older
+than `text_version`)
+
+Usage (from backend/):
+    python -m app.scripts.backfill_chunks [--limit N] [--force]
+"""
+import argparse
+
+from app.models.document import Document, documents_collection
+
+
+def backfill_chunks(limit=0, force=False, batch_size=100):
+    """
+    Sync the chunks of every document whose chunks are missing or stale
+
+    Args:
+        limit: Stop after this many documents (0 for no limit)
+        force: Re-sync every document (unchanged chunks are still not rewritten)
+        batch_size: Cursor batch size
+
+    Returns:
+        Tuple of (documents synced, chunks added)
+    """
+    # Documents from before text versions start at version 1
+    documents_collection.update_many({"text_version": {"$exists": False}}, {"$set": {"text_version": 1}})
+
+    query = {} if force else {"$expr": {"$ne": ["$derived.chunks", "$text_version"]}}
+    cursor = documents_collection.find(
+        query,
+        {"extracted_text": 1, "text_version": 1},
+        no_cursor_timeout=True
+    ).batch_size(batch_size).limit(limit)
+
+    synced = added = 0
+    try:
+        for document in cursor:
+            changes = Document.sync_derived(document)
+            if changes is None:
+                continue
+            synced += 1
+            added += changes["added"]
+            if synced % 500 == 0:
+                print(f"Chunks: {synced} documents synced, {added} chunks added")
+    finally:
+        cursor.close()
+
+    return synced, added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill document search chunks")
+    parser.add_argument("--limit", type=int, default=0, help="maximum documents to process")
+    parser.add_argument("--force", action="store_true", help="re-sync documents whose chunks look current")
+    parser.add_argument("--batch-size", type=int, default=100, help="MongoDB cursor batch size")
+    args = parser.parse_args()
+
+    synced, added = backfill_chunks(args.limit, args.force, args.batch_size)
+    print(f"Done: {synced} documents synced, {added} chunks added")
+
+
+if __name__ == "__main__":
+    main()
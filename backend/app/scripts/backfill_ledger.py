@@ -0,0 +1,80 @@
+"""
+Build structured ledger records for documents ingested before ledgers existed
+
+Usage (from backend/):
+    python -m app.scripts.backfill_ledger [--limit N] [--force] [--concurrency 4]
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from app.models.document import Document, documents_collection
+from app.services.ledger_service import extract_ledger
+from app.services.llm_governor import set_default_lane
+from app.utils.storage_codec import decompress_value
+
+
+def _backfill_one(document):
+    ledger = extract_ledger(decompress_value(document.get("extracted_text")))
+    if ledger is None:
+        return False
+    Document.update_document(str(document["_id"]), {"ledger": ledger.model_dump()})
+    return True
+
+
+def backfill_ledger(limit=0, force=False, concurrency=4, batch_size=100):
+    """
+    Extract a ledger for every document that does not have one yet
+
+    Args:
+        limit: Stop after this many documents (0 for no limit)
+        force: Re-extract ledgers that already exist
+        concurrency: Parallel Gemini calls
+        batch_size: Documents handed to the workers at a time
+
+    Returns:
+        Tuple of (processed, failed) counts
+    """
+    query = {"extracted_text": {"$nin": [None, ""]}}
+    if not force:
+        query["ledger"] = None
+
+    cursor = documents_collection.find(
+        query,
+        {"extracted_text": 1},
+        no_cursor_timeout=True
+    ).batch_size(batch_size).limit(limit)
+
+    processed = failed = 0
+    try:
+        with ThreadPoolExecutor(concurrency) as pool:
+            batch = []
+            for document in cursor:
+                batch.append(document)
+                if len(batch) < batch_size:
+                    continue
+                for ok in pool.map(_backfill_one, batch):
+                    processed, failed = processed + ok, failed + (not ok)
+                print(f"Ledger: {processed} extracted, {failed} failed")
+                batch = []
+            for ok in pool.map(_backfill_one, batch):
+                processed, failed = processed + ok, failed + (not ok)
+    finally:
+        cursor.close()
+
+    return processed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill structured ledger records")
+    parser.add_argument("--limit", type=int, default=0, help="maximum documents to process")
+    parser.add_argument("--force", action="store_true", help="re-extract existing ledgers")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel Gemini calls")
+    args = parser.parse_args()
+
+    set_default_lane("backfill")
+    processed, failed = backfill_ledger(args.limit, args.force, args.concurrency)
+    print(f"Done: {processed} documents updated, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
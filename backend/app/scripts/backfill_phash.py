@@ -0,0 +1,70 @@
+"""
+Compute perceptual hashes for documents ingested before near-duplicate
+detection existed, so new uploads can be matched against them
+
+A running API picks up the new hashes at its next near-duplicate lookup.
+
+Usage (from backend/):
+    python -m app.scripts.backfill_phash [--limit N] [--force]
+"""
+import argparse
+import base64
+from datetime import datetime
+
+from app.models.document import documents_collection
+from app.services.dedup_service import compute_document_phash
+
+
+def backfill_phash(limit=0, force=False, batch_size=50):
+    """
+    Hash every document that has a file but no phash yet
+
+    Args:
+        limit: Stop after this many documents (0 for no limit)
+        force: Recompute hashes that already exist
+        batch_size: Cursor batch size (each document carries its full image)
+
+    Returns:
+        Tuple of (processed, failed) counts
+    """
+    query = {"image_base64": {"$nin": [None, ""]}}
+    if not force:
+        query["phash"] = None
+
+    cursor = documents_collection.find(
+        query,
+        {"image_base64": 1, "file_type": 1},
+        no_cursor_timeout=True
+    ).batch_size(batch_size).limit(limit)
+
+    processed = failed = 0
+    try:
+        for document in cursor:
+            phash = compute_document_phash(base64.b64decode(document["image_base64"]),
+                                           document.get("file_type", "image"))
+            if phash is None:
+                failed += 1
+            else:
+                documents_collection.update_one({"_id": document["_id"]}, {"$set": {"phash": phash, "phash_at": datetime.now()}})
+                processed += 1
+            if (processed + failed) % 100 == 0:
+                print(f"Hashes: {processed} computed, {failed} failed")
+    finally:
+        cursor.close()
+
+    return processed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill document perceptual hashes")
+    parser.add_argument("--limit", type=int, default=0, help="maximum documents to process")
+    parser.add_argument("--force", action="store_true", help="recompute existing hashes")
+    parser.add_argument("--batch-size", type=int, default=50, help="MongoDB cursor batch size")
+    args = parser.parse_args()
+
+    processed, failed = backfill_phash(args.limit, args.force, args.batch_size)
+    print(f"Done: {processed} documents updated, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
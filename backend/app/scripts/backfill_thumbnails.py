@@ -0,0 +1,62 @@
+"""
+Generate thumbnails for documents ingested before thumbnails existed
+
+Usage (from backend/):
+    python -m app.scripts.backfill_thumbnails [--limit N] [--force]
+"""
+import argparse
+
+from app.models.document import documents_collection
+from app.services.thumbnail_service import generate_document_thumbnails
+
+
+def backfill_thumbnails(limit=0, force=False, batch_size=50):
+    """
+    Render thumbnails for every document that does not have them yet
+
+    Args:
+        limit: Stop after this many documents (0 for no limit)
+        force: Regenerate thumbnails even where they already exist
+        batch_size: Cursor batch size (each document carries its full image)
+
+    Returns:
+        Tuple of (processed, failed) counts
+    """
+    query = {"image_base64": {"$nin": [None, ""]}}
+    if not force:
+        query["thumbnail_sizes"] = {"$exists": False}
+
+    cursor = documents_collection.find(
+        query,
+        {"image_base64": 1, "file_type": 1},
+        no_cursor_timeout=True
+    ).batch_size(batch_size).limit(limit)
+
+    processed = failed = 0
+    try:
+        for document in cursor:
+            if generate_document_thumbnails(document):
+                processed += 1
+            else:
+                failed += 1
+            if (processed + failed) % 100 == 0:
+                print(f"Thumbnails: {processed} generated, {failed} failed")
+    finally:
+        cursor.close()
+
+    return processed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill document thumbnails")
+    parser.add_argument("--limit", type=int, default=0, help="maximum documents to process")
+    parser.add_argument("--force", action="store_true", help="regenerate existing thumbnails")
+    parser.add_argument("--batch-size", type=int, default=50, help="MongoDB cursor batch size")
+    args = parser.parse_args()
+
+    processed, failed = backfill_thumbnails(args.limit, args.force, args.batch_size)
+    print(f"Done: {processed} documents updated, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
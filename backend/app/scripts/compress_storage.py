@@ -0,0 +1,104 @@
+"""
+Compress the extracted text of documents and the tool results of chats
+stored before storage compression existed (or decompress them again)
+
+Prints collStats for both collections before and after: `size` is the
+uncompressed data size (what the working set holds in cache), `storageSize`
+what WiredTiger uses on disk. Disk space freed by an in-place rewrite is
+reused for new writes; run `compact` on the collections to hand it back.
+
+Usage (from backend/):
+    python -m app.scripts.compress_storage [--limit N] [--decompress] [--dry-run]
+"""
+import argparse
+
+import bson
+from pymongo import UpdateOne
+
+from app.database import get_db
+from app.models.chat import COMPRESSED_FIELDS as CHAT_FIELDS, chats_collection
+from app.models.document import COMPRESSED_FIELDS as DOCUMENT_FIELDS, documents_collection
+from app.utils.storage_codec import compress_value, decompress_value
+
+STAT_FIELDS = ("count", "size", "avgObjSize", "storageSize", "totalIndexSize")
+
+
+def collection_stats(collection):
+    stats = get_db().command("collStats", collection.name)
+    return {field: stats.get(field, 0) for field in STAT_FIELDS}
+
+
+def print_stats(label, collections):
+    for collection in collections:
+        stats = collection_stats(collection)
+        print(f"{label:>6} {collection.name:<10} " + "  ".join(
+            f"{field} {stats[field]:,.0f}" for field in STAT_FIELDS))
+
+
+def rewrite_field(collection, field, decompress=False, limit=0, batch_size=100, dry_run=False):
+    """
+    Compress (or decompress) one field of every record in place
+
+    Each write is conditional on the stored value being unchanged, so a record
+    edited meanwhile is skipped rather than overwritten.
+
+    Returns:
+        Tuple of (records rewritten, bytes before, bytes after) for the field
+    """
+    stored_type = "binData" if decompress else ("string" if field in DOCUMENT_FIELDS else "array")
+    cursor = collection.find(
+        {field: {"$type": stored_type}},
+        {field: 1},
+        no_cursor_timeout=True
+    ).batch_size(batch_size).limit(limit)
+
+    rewritten = before = after = 0
+    operations = []
+    try:
+        for record in cursor:
+            value = record[field]
+            new_value = decompress_value(value) if decompress else compress_value(value)
+            if new_value is value:
+                continue
+            rewritten += 1
+            before += _stored_size(value)
+            after += _stored_size(new_value)
+            operations.append(UpdateOne({"_id": record["_id"], field: value}, {"$set": {field: new_value}}))
+            if len(operations) == batch_size:
+                if not dry_run:
+                    collection.bulk_write(operations, ordered=False)
+                operations = []
+                print(f"{collection.name}.{field}: {rewritten} rewritten")
+        if operations and not dry_run:
+            collection.bulk_write(operations, ordered=False)
+    finally:
+        cursor.close()
+
+    return rewritten, before, after
+
+
+def _stored_size(value):
+    return len(bson.encode({"v": value}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress large stored text and tool results in place")
+    parser.add_argument("--limit", type=int, default=0, help="maximum records per collection")
+    parser.add_argument("--decompress", action="store_true", help="store compressed fields as plain values again")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--batch-size", type=int, default=100, help="records per cursor batch and bulk write")
+    args = parser.parse_args()
+
+    collections = (documents_collection, chats_collection)
+    print_stats("before", collections)
+    for collection, fields in ((documents_collection, DOCUMENT_FIELDS), (chats_collection, CHAT_FIELDS)):
+        for field in fields:
+            rewritten, before, after = rewrite_field(collection, field, args.decompress, args.limit,
+                                                     args.batch_size, args.dry_run)
+            print(f"{collection.name}.{field}: {rewritten} records, {before:,} -> {after:,} bytes")
+    if not args.dry_run:
+        print_stats("after", collections)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""
+Recompute the analytics rollups from scratch
+
+The API keeps rollups up to date incrementally and reconciles them
+periodically (ROLLUP_RECONCILE_INTERVAL); run this after bulk imports or
+manual database edits.
+
+Usage (from backend/):
+    python -m app.scripts.reconcile_rollups
+"""
+from app.models.rollup import Rollup
+
+
+def main():
+    written = Rollup.reconcile()
+    print(f"Done: {written} rollup records written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Re-run extraction stages over existing documents, e.g. after changing
+DOCUMENT_SYSTEM_PROMPT or EXTRACTION_MODEL in document_processor.py
+
+Documents are streamed in _id order and handed to a thread pool one batch
+at a time. After each batch the job's position is checkpointed in the
+`jobs` collection, so an interrupted run resumes where it stopped (at most
+one batch is redone). Start over with --restart.
+
+Stages:
+    text      re-extract extracted_text from the stored image/PDF
+    ledger    rebuild the structured ledger record from the text
+    title     regenerate the title
+    doc_type  re-detect the document type
+
+Usage (from backend/):
+    python -m app.scripts.reextract --stale --dry-run
+    python -m app.scripts.reextract --stale [--stages text,ledger,title]
+        [--doc-type receipt] [--since 2025-01-01] [--until 2025-04-01]
+        [--concurrency 4] [--rate 30] [--job reextract] [--restart]
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.models.document import documents_collection
+from app.models.job import Job
+from app.services.document_processor import DOCUMENT_SYSTEM_PROMPT, EXTRACTION_MODEL, extraction_meta
+from app.services.ingest_service import reextract_document
+from app.services.llm_governor import set_default_lane
+
+STAGES = ["text", "ledger", "title", "doc_type"]
+
+
+class RateLimiter:
+    """Spaces calls evenly to at most `per_minute` a minute (0 for no limit)"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def build_query(doc_types=None, since=None, until=None, stale=False):
+    """
+    Documents selected for re-extraction
+
+    Args:
+        doc_types: Only these document types
+        since: Only documents created on or after this datetime
+        until: Only documents created before this datetime
+        stale: Only documents not extracted by the current model and prompt,
+            or whose extraction failed or is missing pages
+    """
+    query = {"image_base64": {"$nin": [None, ""]}}
+    if doc_types:
+        query["doc_type"] = {"$in": doc_types}
+    if since or until:
+        query["created_at"] = {}
+        if since:
+            query["created_at"]["$gte"] = since
+        if until:
+            query["created_at"]["$lt"] = until
+    if stale:
+        current = extraction_meta()
+        query["$or"] = [
+            {"extraction_meta.model": {"$ne": current["model"]}},
+            {"extraction_meta.prompt_hash": {"$ne": current["prompt_hash"]}},
+            {"extraction_status": {"$in": ["failed", "deferred", "partial"]}},
+            {"extracted_text": {"$regex": "^Error"}},  # Failures stored before extraction_status
+        ]
+    return query
+
+
+def run_job(job_id, query, stages, concurrency=4, rate=0, batch_size=50, limit=0, restart=False):
+    """
+    Process every matching document, resuming from the job's checkpoint
+
+    Returns:
+        The job's final counts
+    """
+    params = {"query": repr(query), "stages": stages}
+    job = Job.get(job_id)
+    if job and not restart and job["status"] != "completed":
+        if job["params"] != params:
+            raise SystemExit(f"Job '{job_id}' was started with different options "
+                             f"({job['params']}); pass --restart or another --job name")
+        print(f"Resuming job '{job_id}' after {job['last_id']} ({job['counts']})")
+    else:
+        job = Job.start(job_id, "reextract", params)
+
+    if job["last_id"] is not None:
+        query = {"$and": [query, {"_id": {"$gt": job["last_id"]}}]}
+
+    fields = {"image_base64": 1, "file_type": 1} if "text" in stages else {"extracted_text": 1}
+    fields.update(doc_type=1, ledger=1)  # Titles are built from the type, vendor and date
+    # Whether a failed re-extraction may mark the document failed (see reextract_document)
+    fields.update(extracted_text=1, extraction_status=1, reextraction_error=1)
+    cursor = documents_collection.find(query, fields, no_cursor_timeout=True) \
+        .sort("_id", 1).batch_size(batch_size).limit(limit)
+
+    limiter = RateLimiter(rate)
+    totals = dict(job["counts"])
+
+    def run_batch(pool, batch):
+        futures = []
+        for document in batch:
+            limiter.wait()
+            futures.append(pool.submit(reextract_document, document, stages))
+        counts = {"processed": 0, "failed": 0}
+        for future in futures:
+            try:
+                ok = future.result()
+            except Exception as e:
+                print(f"Error re-extracting document: {e}")
+                ok = False
+            counts["processed" if ok else "failed"] += 1
+        Job.checkpoint(job_id, batch[-1]["_id"], counts)
+        for name, value in counts.items():
+            totals[name] = totals.get(name, 0) + value
+        print(f"Re-extract: {totals.get('processed', 0)} updated, {totals.get('failed', 0)} failed")
+
+    try:
+        with ThreadPoolExecutor(concurrency) as pool:
+            batch = []
+            for document in cursor:
+                batch.append(document)
+                if len(batch) == batch_size:
+                    run_batch(pool, batch)
+                    batch = []
+            if batch:
+                run_batch(pool, batch)
+        Job.finish(job_id, "completed")
+    except KeyboardInterrupt:
+        Job.finish(job_id, "interrupted")
+        print(f"Interrupted; run again with --job {job_id} to resume")
+        raise
+    except Exception as e:
+        Job.finish(job_id, "failed", str(e))
+        raise
+    finally:
+        cursor.close()
+
+    return totals
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run extraction stages over existing documents")
+    parser.add_argument("--stages", default="text,ledger,title",
+                        help=f"comma-separated stages to run ({', '.join(STAGES)})")
+    parser.add_argument("--doc-type", action="append", help="only this document type (repeatable)")
+    parser.add_argument("--since", type=parse_date, help="only documents created on or after YYYY-MM-DD")
+    parser.add_argument("--until", type=parse_date, help="only documents created before YYYY-MM-DD")
+    parser.add_argument("--stale", action="store_true",
+                        help="only documents not extracted by the current model and prompt, or that failed")
+    parser.add_argument("--limit", type=int, default=0, help="maximum documents to process")
+    parser.add_argument("--concurrency", type=int, default=4, help="documents processed in parallel")
+    parser.add_argument("--rate", type=float, default=0, help="maximum documents started per minute (0 for no limit)")
+    parser.add_argument("--batch-size", type=int, default=50, help="documents per checkpoint")
+    parser.add_argument("--job", default="reextract", help="checkpoint name, to run separate jobs side by side")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the beginning")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be processed")
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    query = build_query(args.doc_type, args.since, args.until, args.stale)
+
+    if args.dry_run:
+        matching = documents_collection.count_documents(query)
+        job = Job.get(args.job)
+        print(f"Model: {EXTRACTION_MODEL}, prompt hash: {extraction_meta()['prompt_hash']} "
+              f"({len(DOCUMENT_SYSTEM_PROMPT)} chars)")
+        print(f"Stages: {', '.join(stages)}")
+        print(f"Matching documents: {matching}" + (f" (limit {args.limit})" if args.limit else ""))
+        if job and job["status"] != "completed" and not args.restart:
+            print(f"Checkpoint '{args.job}': {job['status']} after {job['last_id']} ({job['counts']})")
+        if args.rate:
+            documents = min(matching, args.limit) if args.limit else matching
+            print(f"At {args.rate:g} documents/minute this takes at least {documents / args.rate:.0f} minutes")
+        return
+
+    # Lowest governor lane: calls wait for their turn instead of timing out
+    set_default_lane("backfill")
+    totals = run_job(args.job, query, stages, args.concurrency, args.rate, args.batch_size, args.limit, args.restart)
+    print(f"Done: {totals.get('processed', 0)} documents updated, {totals.get('failed', 0)} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Chat memory and bounded chat history
+
+Prompts carry a conversation's (a document's chat, or the global one) newest
+turns verbatim within CHAT_HISTORY_TOKENS, and everything older through a
+rolling summary. Turns that leave that window are folded into the summary
+CHAT_SUMMARY_MIN_TURNS at a time, and stay in the prompt verbatim until then.
+
+Each conversation keeps its newest CHAT_HOT_MESSAGES messages, none older
+than CHAT_RETENTION_DAYS, in `chats`; older messages are folded into the
+summary too (if they are not already) and then moved to `chats_archive`.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from app.config import (
+    CHAT_HISTORY_TOKENS, CHAT_HISTORY_TURNS, CHAT_HOT_MESSAGES, CHAT_RETENTION_DAYS, CHAT_SUMMARY_MAX_CHARS,
+    CHAT_SUMMARY_MIN_TURNS
+)
+from app.models.chat import Chat, chats_collection
+from app.services.gemini_service import generate_content
+from app.services.llm_governor import llm_lane
+from app.utils.token_utils import estimate_text_tokens
+
+# Messages folded into the summary per Gemini call, and how much of each it sees
+SUMMARY_BATCH = 40
+SUMMARY_MESSAGE_CHARS = 600
+
+HISTORY_FIELDS = {"user_message": 1, "ai_response": 1}
+
+# Conversations whose summary this process is updating
+_folding = set()
+_folding_lock = threading.Lock()
+
+SUMMARY_PROMPT = """
+You keep a running summary of a user's conversation with a document assistant.
+Update the summary with the new messages below. Keep the facts, figures,
+decisions and open questions a later answer may need; drop greetings and
+repetition. Write compact bullet points, at most {max_chars} characters in total.
+
+Current summary:
+{summary}
+
+New messages (oldest first):
+{messages}
+
+Return only the updated summary.
+"""
+
+
+def _conversation(document_id):
+    return ObjectId(document_id) if document_id else None
+
+
+def _format_turn(chat, max_chars=None):
+    return (f"User: {chat['user_message'][:max_chars]}\n"
+            f"Assistant: {chat['ai_response'][:max_chars]}")
+
+
+def _cutoff():
+    return datetime.now() - timedelta(days=CHAT_RETENTION_DAYS) if CHAT_RETENTION_DAYS > 0 else None
+
+
+def conversations_over_limit():
+    """document_ids (None for the global chat) of the conversations with messages to archive"""
+    conditions = []
+    if CHAT_HOT_MESSAGES > 0:
+        conditions.append({"count": {"$gt": CHAT_HOT_MESSAGES}})
+    if _cutoff():
+        conditions.append({"oldest": {"$lt": _cutoff()}})
+    if not conditions:
+        return []
+    return [row["_id"] for row in chats_collection.aggregate([
+        {"$group": {"_id": "$document_id", "count": {"$sum": 1}, "oldest": {"$min": "$created_at"}}},
+        {"$match": {"$or": conditions}},
+    ])]
+
+
+def expired_query(document_id):
+    """
+    Filter for a conversation's messages past retention: all but the newest
+    CHAT_HOT_MESSAGES, and any older than CHAT_RETENTION_DAYS
+
+    Returns:
+        A MongoDB filter, or None if every message is within retention
+    """
+    conditions = []
+    if CHAT_HOT_MESSAGES > 0:
+        boundary = chats_collection.find_one({"document_id": document_id}, {"_id": 1},
+                                             sort=[("_id", DESCENDING)], skip=CHAT_HOT_MESSAGES)
+        if boundary:
+            conditions.append({"_id": {"$lte": boundary["_id"]}})
+    if _cutoff():
+        conditions.append({"created_at": {"$lt": _cutoff()}})
+    return {"document_id": document_id, "$or": conditions} if conditions else None
+
+
+def summarize_messages(summary, chats):
+    """
+    Fold chat messages into a conversation summary
+
+    Raises:
+        Whatever the Gemini call raises; nothing is archived then
+    """
+    messages = "\n".join(_format_turn(chat, SUMMARY_MESSAGE_CHARS) for chat in chats)
+    prompt = SUMMARY_PROMPT.format(max_chars=CHAT_SUMMARY_MAX_CHARS, summary=summary or "(none yet)",
+                                   messages=messages)
+    text = generate_content('gemini-2.0-flash', prompt, call_site="chat_summary").text.strip()
+    if len(text) > CHAT_SUMMARY_MAX_CHARS:
+        # Cut at a line break so the summary does not end mid-point
+        text = text[:CHAT_SUMMARY_MAX_CHARS]
+        text = text[:text.rfind("\n")] if "\n" in text else text
+    return text
+
+
+def fold_into_summary(document_id, query, archive=False):
+    """
+    Fold a conversation's messages matching `query` into its summary, oldest
+    first, and optionally archive them
+
+    Messages the summary already covers are not summarized again; with
+    `archive`, a batch is only archived once the summary covering it is
+    saved. Stops early if another process updated the summary meanwhile.
+
+    Returns:
+        Number of messages folded in (or archived, with `archive`)
+    """
+    stored = Chat.get_summary(document_id) or {}
+    summary, through_id = stored.get("summary", ""), stored.get("through_id")
+
+    done = 0
+    while True:
+        batch_query = query if archive or through_id is None else {"$and": [query, {"_id": {"$gt": through_id}}]}
+        batch = list(chats_collection.find(batch_query).sort("_id", ASCENDING).limit(SUMMARY_BATCH))
+        if not batch:
+            return done
+        unsummarized = [chat for chat in batch if through_id is None or chat["_id"] > through_id]
+        if unsummarized:
+            new_summary = summarize_messages(summary, unsummarized)
+            if not Chat.save_summary(document_id, new_summary, unsummarized[-1]["_id"], len(unsummarized), through_id):
+                return done
+            summary, through_id = new_summary, unsummarized[-1]["_id"]
+        done += Chat.archive_chats(batch) if archive else len(unsummarized)
+
+
+def archive_conversation(document_id):
+    """
+    Summarize, then archive, a conversation's messages past retention
+
+    Returns:
+        Number of messages archived
+    """
+    query = expired_query(document_id)
+    return fold_into_summary(document_id, query, archive=True) if query else 0
+
+
+def apply_chat_retention(limit=0):
+    """
+    Archive the messages past retention of every conversation
+
+    A conversation whose summary cannot be updated (e.g. Gemini is down)
+    keeps its messages until the next run.
+
+    Args:
+        limit: Stop after this many conversations (0 for no limit)
+
+    Returns:
+        Tuple of (conversations processed, messages archived)
+    """
+    conversations = archived = 0
+    with llm_lane("backfill"):
+        for document_id in conversations_over_limit():
+            if limit and conversations >= limit:
+                break
+            try:
+                archived += archive_conversation(document_id)
+                conversations += 1
+            except Exception as e:
+                print(f"Error archiving chats of {document_id or 'the global chat'}: {e}")
+    return conversations, archived
+
+
+def history_window(document_id, budget=CHAT_HISTORY_TOKENS):
+    """
+    A conversation's newest turns that fit in a token budget together
+
+    Returns:
+        List of chat records (user_message and ai_response), oldest first
+    """
+    turns, used = [], 0
+    for chat in Chat.get_recent_chats(document_id, CHAT_HISTORY_TURNS, HISTORY_FIELDS):
+        tokens = estimate_text_tokens(_format_turn(chat))
+        if used + tokens > budget:
+            break
+        turns.append(chat)
+        used += tokens
+    turns.reverse()
+    return turns
+
+
+def unfolded_query(conversation, window, through_id):
+    """Filter for a conversation's turns older than its history window and not yet in its summary"""
+    query = {"document_id": conversation}
+    ids = {}
+    if window:
+        ids["$lt"] = window[0]["_id"]
+    if through_id is not None:
+        ids["$gt"] = through_id
+    if ids:
+        query["_id"] = ids
+    return query
+
+
+def update_conversation_summary(document_id):
+    """
+    Fold the turns that have left the history window into the summary, once
+    there are CHAT_SUMMARY_MIN_TURNS of them
+
+    Runs after each chat message; skipped while this process is already
+    updating the same conversation.
+
+    Returns:
+        Number of turns folded in
+    """
+    conversation = _conversation(document_id)
+    with _folding_lock:
+        if conversation in _folding:
+            return 0
+        _folding.add(conversation)
+    try:
+        window = history_window(conversation)
+        stored = Chat.get_summary(conversation) or {}
+        query = unfolded_query(conversation, window, stored.get("through_id"))
+        if chats_collection.count_documents(query, limit=CHAT_SUMMARY_MIN_TURNS) < CHAT_SUMMARY_MIN_TURNS:
+            return 0
+        with llm_lane("backfill"):
+            return fold_into_summary(conversation, query)
+    except Exception as e:
+        print(f"Error updating the chat summary of {document_id or 'the global chat'}: {e}")
+        return 0
+    finally:
+        with _folding_lock:
+            _folding.discard(conversation)
+
+
+def conversation_summary(document_id, stored=None):
+    """Prompt section with the summary of a conversation's older turns, or "" if it has none"""
+    stored = stored or Chat.get_summary(document_id)
+    if not stored or not stored.get("summary"):
+        return ""
+    return f"Summary of earlier conversation ({stored.get('messages', 0)} messages):\n{stored['summary']}"
+
+
+def conversation_history(document_id):
+    """
+    Prompt section with a conversation's memory: the summary of its older
+    turns and its newest turns verbatim, within about
+    CHAT_HISTORY_TOKENS + CHAT_SUMMARY_MAX_CHARS / 4 tokens, plus the turns
+    waiting to be folded into the summary (fewer than CHAT_SUMMARY_MIN_TURNS)
+
+    Returns:
+        The section, or "" for a new conversation
+    """
+    conversation = _conversation(document_id)
+    stored = Chat.get_summary(conversation) or {}
+    sections = [conversation_summary(conversation, stored)]
+    turns = history_window(conversation)
+    if turns:
+        unfolded = chats_collection.find(unfolded_query(conversation, turns, stored.get("through_id")),
+                                         HISTORY_FIELDS).sort("_id", DESCENDING).limit(CHAT_SUMMARY_MIN_TURNS)
+        turns = list(unfolded)[::-1] + turns
+    if turns:
+        sections.append("Recent conversation (oldest first):\n" + "\n\n".join(_format_turn(chat) for chat in turns))
+    return "\n\n".join(section for section in sections if section)
@@ -1,10 +1,10 @@
-import os
+from app.config import CHAT_DEADLINE, DEEP_SEARCH
 from app.models.document import Document
+from app.utils.resilience import CircuitOpen, DeadlineExceeded, deadline, search_breaker
+from app.utils.deep_search import deep_search
 from app.utils.search_utils import search_duckduckgo
-import google.generativeai as genai
-
-# Configure the Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+from app.services.chat_retention_service import conversation_history
+from app.services.gemini_service import generate_content
 
 # Base prompt template for document chat
 CHAT_SYSTEM_PROMPT = """
@@ -59,9 +59,6 @@ def should_use_search_tool(query, doc_content):
         Boolean indicating whether to use search
     """
     try:
-        # Use Gemini to decide if we need to search
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
         prompt = f"""
         Analyze this query and tell me if it requires external information beyond what might be in the document content.
         Reply with "YES" if external search would be useful for any of these cases:
@@ -84,7 +81,8 @@ def should_use_search_tool(query, doc_content):
         Reply only with YES or NO.
         """
         
-        response = model.generate_content(prompt)
+        # Use Gemini to decide if we need to search
+        response = generate_content('gemini-1.5-flash', prompt, call_site="chat_search_decision")
         result = response.text.strip().upper()
         
         return "YES" in result
@@ -102,25 +100,31 @@ def process_chat_with_document(document_id, user_message):
         
     Returns:
         AI response, used tools list
+        
+    Raises:
+        CircuitOpen, DeadlineExceeded: Gemini is unavailable or CHAT_DEADLINE ran out
     """
+    with deadline(CHAT_DEADLINE):
+        return _process_chat_with_document(document_id, user_message)
+
+def _process_chat_with_document(document_id, user_message):
     try:
         # Get document content
         doc = Document.get_document_by_id(document_id)
         if not doc:
             return "Sorry, I couldn't find the document you're referring to.", []
         
-        # Document content
-        doc_content = doc['extracted_text']
+        # Document content (empty if extraction failed)
+        doc_content = doc.get('extracted_text') or ""
         doc_title = doc['title']
         doc_type = doc['doc_type']
         
         used_tools = []
         search_results = ""
         
-        # Check if we need to search
-        if should_use_search_tool(user_message, doc_content):
+        # Check if we need to search (skipped while web search is failing)
+        if not search_breaker.is_open and should_use_search_tool(user_message, doc_content):
             # Generate a more targeted search query based on what we're looking for
-            model = genai.GenerativeModel('gemini-1.5-flash')
             search_prompt = f"""
             Create a specific, targeted web search query to find information about:
             
@@ -136,7 +140,7 @@ def process_chat_with_document(document_id, user_message):
             Return only the search query text, no additional explanation.
             """
             
-            search_response = model.generate_content(search_prompt)
+            search_response = generate_content('gemini-1.5-flash', search_prompt, call_site="chat_search_query")
             search_query = search_response.text.strip()
             
             # Fallback if query generation fails
@@ -146,9 +150,14 @@ def process_chat_with_document(document_id, user_message):
             results = search_duckduckgo(search_query)
             
             if results and not any('error' in r for r in results):
+                if DEEP_SEARCH:
+                    # Passages from the result pages themselves, within a fixed time budget
+                    results = deep_search(search_query, results)
                 search_results = "\n\nSearch results:\n"
                 for result in results:
                     search_results += f"- {result['title']}: {result['snippet']}\n"
+                    if result.get('passages'):
+                        search_results += f"  From the page: {result['passages']}\n"
                 
                 used_tools.append({
                     "tool_name": "search",
@@ -156,9 +165,6 @@ def process_chat_with_document(document_id, user_message):
                     "results": results
                 })
         
-        # Initialize the Gemini model
-        model = genai.GenerativeModel('gemini-2.0-pro-exp-02-05')
-        
         # Build the prompt with document content
         prompt = f"""{CHAT_SYSTEM_PROMPT}
 
@@ -168,6 +174,8 @@ Document Title: {doc_title}
 Document Content:
 {doc_content}
 
+{conversation_history(document_id)}
+
 {search_results}
 
 User Question: {user_message}
@@ -181,7 +189,9 @@ Instructions for response:
 """
         
         # Get response from Gemini
-        response = model.generate_content(prompt)
+        response = generate_content('gemini-2.0-pro-exp-02-05', prompt, call_site="chat_answer")
         return response.text, used_tools
+    except (CircuitOpen, DeadlineExceeded):
+        raise
     except Exception as e:
         return f"Error processing your question: {str(e)}", []
\ No newline at end of file
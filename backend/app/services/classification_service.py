@@ -0,0 +1,191 @@
+"""
+Document type and title, without a Gemini call where possible
+
+The type comes from a TF-IDF classifier trained on already labeled documents
+(python -m app.scripts.train_doc_classifier) when it is at least
+DOC_TYPE_CONFIDENCE sure, and the title from a template filled with the
+vendor and date. Gemini is only asked when either comes up short.
+"""
+import random
+import threading
+import time
+from datetime import datetime
+
+from app.config import DOC_TYPE_CONFIDENCE, TEMPLATE_TITLES
+from app.models.classifier import Classifier
+from app.models.document import documents_collection
+from app.services.gemini_service import generate_content
+from app.utils.metrics import DOCUMENT_LABELS
+from app.utils.storage_codec import decompress_value
+from app.utils.text_classifier import TextClassifier
+from app.utils.title_utils import MAX_TITLE_LENGTH, build_title
+
+DOC_TYPES = ["receipt", "invoice", "bill", "statement", "form",
+             "menu", "contract", "report", "letter", "other"]
+
+DOC_TYPE_MODEL = "doc_type"
+# Characters of extracted text the classifier (and the Gemini fallbacks) read
+CLASSIFIER_INPUT_CHARS = 2000
+# Seconds between checks for a newly trained model
+MODEL_REFRESH_INTERVAL = 300
+
+DOC_TYPE_PROMPT = f"""
+Classify this document text into one category: {", ".join(DOC_TYPES[:-1])}, or {DOC_TYPES[-1]}.
+Return only the category name, nothing else.
+
+Document text:
+"""
+
+TITLE_PROMPT = """
+Based on the following document text, generate a clear, descriptive title
+(maximum 60 characters).
+
+The title should:
+1. Start with the document type (e.g., "Receipt:", "Invoice:", "Menu:")
+2. Include business/organization name if available
+3. Include key identifying details (date, reference numbers, etc.)
+4. Be specific enough to distinguish it from similar documents
+
+Examples of good titles:
+- "Receipt: Walmart Groceries - March 24, 2025"
+- "Menu: Riverfront Grill Food & Drinks"
+- "Invoice #INV-2025-03-24: Computer Accessories"
+
+Document text:
+"""
+
+_model = {"classifier": None, "trained_at": None, "checked_at": 0.0}
+_model_lock = threading.Lock()
+
+
+def fallback_title():
+    return f"Document Scan ({datetime.now():%Y-%m-%d %H:%M})"
+
+
+def get_doc_type_classifier():
+    """The trained doc-type classifier, reloaded when a newer one is stored; None if never trained"""
+    with _model_lock:
+        if time.monotonic() - _model["checked_at"] < MODEL_REFRESH_INTERVAL:
+            return _model["classifier"]
+        _model["checked_at"] = time.monotonic()
+        try:
+            trained_at = Classifier.get_trained_at(DOC_TYPE_MODEL)
+            if trained_at and trained_at != _model["trained_at"]:
+                _model["classifier"] = TextClassifier.from_dict(Classifier.get(DOC_TYPE_MODEL))
+                _model["trained_at"] = trained_at
+        except Exception as e:
+            print(f"Error loading document type classifier: {e}")
+        return _model["classifier"]
+
+
+def classify_document_type(extracted_text):
+    """
+    Local prediction of a document's type
+
+    Returns:
+        Tuple of (doc_type, confidence), or (None, 0.0) without a trained model
+    """
+    classifier = get_doc_type_classifier() if DOC_TYPE_CONFIDENCE <= 1 else None
+    if classifier is None or not extracted_text:
+        return None, 0.0
+    return classifier.predict(extracted_text[:CLASSIFIER_INPUT_CHARS])
+
+
+def detect_document_type(extracted_text):
+    """Document type, one of DOC_TYPES: local classifier if confident, else Gemini"""
+    if not extracted_text:
+        return "other"
+    doc_type, confidence = classify_document_type(extracted_text)
+    if doc_type and confidence >= DOC_TYPE_CONFIDENCE:
+        DOCUMENT_LABELS.inc(("doc_type", "local"))
+        return doc_type
+
+    DOCUMENT_LABELS.inc(("doc_type", "gemini"))
+    try:
+        response = generate_content('gemini-2.0-flash', DOC_TYPE_PROMPT + extracted_text[:1000], call_site="doc_type")
+        doc_type = response.text.strip().lower()
+        return doc_type if doc_type in DOC_TYPES else "other"
+    except Exception as e:
+        print(f"Error detecting document type: {e}")
+        return "other"
+
+
+def generate_document_title(extracted_text, doc_type="unknown", vendor=None, date=None):
+    """
+    Title for a document: "Type: Vendor - Date" from the vendor and date
+    (given, e.g. from the ledger, or found in the text), else Gemini's
+
+    Returns:
+        A title of at most 60 characters
+    """
+    if not extracted_text:
+        return fallback_title()
+    if TEMPLATE_TITLES:
+        title = build_title(extracted_text, doc_type, vendor, date)
+        if title:
+            DOCUMENT_LABELS.inc(("title", "template"))
+            return title
+
+    DOCUMENT_LABELS.inc(("title", "gemini"))
+    try:
+        response = generate_content('gemini-2.0-flash', TITLE_PROMPT + extracted_text[:1000], call_site="title")
+        title = response.text.strip()
+        return title if title and len(title) <= MAX_TITLE_LENGTH else fallback_title()
+    except Exception as e:
+        print(f"Error generating title: {e}")
+        return fallback_title()
+
+
+def train_doc_type_classifier(limit=5000, holdout=0.2, min_documents=50, seed=0):
+    """
+    Train the doc-type classifier on the newest labeled documents and store it
+
+    A share of the documents is held out first to measure accuracy, and how
+    many predictions clear DOC_TYPE_CONFIDENCE (and how often those are
+    right); the stored model is then trained on all of them.
+
+    Args:
+        limit: Newest documents to train on
+        holdout: Share of documents held out for evaluation
+        min_documents: Refuse to train on fewer labeled documents
+        seed: Shuffle seed for the holdout split
+
+    Returns:
+        Metrics dict (documents, per-type counts, accuracy, coverage, confident_accuracy)
+
+    Raises:
+        ValueError: Too few labeled documents or only one type among them
+    """
+    cursor = documents_collection.find(
+        {"doc_type": {"$in": DOC_TYPES}, "extracted_text": {"$nin": [None, ""]},
+         "extraction_status": {"$nin": ["failed", "deferred", "processing"]}},
+        {"doc_type": 1, "extracted_text": 1}
+    ).sort("_id", -1).limit(limit)
+    examples = [(decompress_value(doc["extracted_text"])[:CLASSIFIER_INPUT_CHARS], doc["doc_type"]) for doc in cursor]
+    labels = sorted({label for _, label in examples})
+    if len(examples) < min_documents or len(labels) < 2:
+        raise ValueError(f"Need at least {min_documents} labeled documents of two or more types, "
+                         f"found {len(examples)} of {len(labels)}")
+
+    random.Random(seed).shuffle(examples)
+    split = int(len(examples) * (1 - holdout))
+    train, test = examples[:split], examples[split:]
+    metrics = {"documents": len(examples),
+               "types": {label: sum(1 for _, l in examples if l == label) for label in labels},
+               "threshold": DOC_TYPE_CONFIDENCE}
+    if test:
+        classifier = TextClassifier().fit(*zip(*train))
+        probabilities = classifier.predict_proba([text for text, _ in test])
+        predicted = [classifier.labels[i] for i in probabilities.argmax(axis=1)]
+        correct = [p == label for p, (_, label) in zip(predicted, test)]
+        confident = probabilities.max(axis=1) >= DOC_TYPE_CONFIDENCE
+        metrics["accuracy"] = sum(correct) / len(test)
+        metrics["coverage"] = float(confident.mean())
+        metrics["confident_accuracy"] = (float(sum(c for c, keep in zip(correct, confident) if keep) / confident.sum())
+                                         if confident.any() else None)
+
+    classifier = TextClassifier().fit(*zip(*examples))
+    Classifier.save(DOC_TYPE_MODEL, classifier.to_dict(), metrics)
+    with _model_lock:
+        _model["checked_at"] = 0.0
+    return metrics
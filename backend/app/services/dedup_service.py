@@ -0,0 +1,109 @@
+import threading
+from datetime import datetime, timedelta
+from io import BytesIO
+from app.config import NEAR_DUPLICATE_DISTANCE
+from app.models.document import documents_collection
+from app.utils.hamming_index import HammingIndex
+from app.utils.image_utils import dhash, preprocess_document_image
+from app.utils.metrics import span
+
+# Fields copied from an earlier document when its extraction is reused
+REUSABLE_FIELDS = {"extracted_text": 1, "ledger": 1, "title": 1, "doc_type": 1, "file_type": 1}
+
+# Hashes written up to this long before the last sync are read again: other
+# workers' clocks and writes that become visible late stay within it
+SYNC_OVERLAP = timedelta(seconds=60)
+
+_index = None
+_synced_at = None
+_sync_lock = threading.Lock()
+
+
+def compute_document_phash(file_bytes, file_type):
+    """
+    Perceptual hash of an uploaded file (first page for PDFs)
+
+    Images are cropped and deskewed first so two photos of the same page hash
+    alike.
+
+    Returns:
+        256-bit dHash as four signed 64-bit ints, or None if the file cannot
+        be rendered
+    """
+    try:
+        if file_type == "pdf":
+            from app.utils.thumbnail_utils import render_pdf_first_page
+            return dhash(render_pdf_first_page(file_bytes, 256))
+        from PIL import Image
+        return dhash(preprocess_document_image(Image.open(BytesIO(file_bytes)), max_size=512))
+    except Exception as e:
+        print(f"Error computing perceptual hash: {e}")
+        return None
+
+
+def sync_index():
+    """
+    Load hashes stored since the last sync
+
+    The first call loads every hashed document; later calls read the hashes
+    whose phash_at is past the previous sync (less SYNC_OVERLAP), which
+    picks up other workers' uploads, including progressive uploads hashed
+    after they were inserted.
+    """
+    global _index, _synced_at
+    with _sync_lock:
+        if _index is None:
+            _index = HammingIndex(radius=NEAR_DUPLICATE_DISTANCE)
+        started = datetime.now()
+        if _synced_at is None:
+            query = {"phash": {"$ne": None}}
+        else:
+            query = {"phash_at": {"$gte": _synced_at - SYNC_OVERLAP}}
+        for doc in documents_collection.find(query, {"phash": 1, "phash_at": 1}):
+            # Hashes read in the overlap before are already indexed
+            if _synced_at is not None and doc["_id"] in _index and doc["phash_at"] < _synced_at:
+                continue
+            if doc.get("phash") is not None:
+                _index.add(doc["_id"], doc["phash"])
+        _synced_at = started
+    return _index
+
+
+def find_near_duplicate(phash):
+    """
+    The closest earlier document whose perceptual hash is within
+    NEAR_DUPLICATE_DISTANCE bits
+
+    Args:
+        phash: dHash of the new upload (see compute_document_phash)
+
+    Returns:
+        The earlier document with REUSABLE_FIELDS, or None
+    """
+    if phash is None or NEAR_DUPLICATE_DISTANCE <= 0:
+        return None
+
+    with span("near_duplicate_lookup"):
+        index = sync_index()
+        for document_id, _ in index.query(phash):
+            document = documents_collection.find_one({"_id": document_id}, REUSABLE_FIELDS)
+            if document:
+                return document
+            # Deleted by another worker since it was indexed
+            index.remove(document_id)
+    return None
+
+
+def remember_document(document_id, phash):
+    """
+    Add a document whose hash was stored after it was inserted (progressive
+    uploads) right away; other workers pick it up at their next sync
+    """
+    if _index is not None and phash is not None:
+        _index.add(document_id, phash)
+
+
+def forget_document(document_id):
+    """Drop a deleted document from the in-memory index"""
+    if _index is not None:
+        _index.remove(document_id)
@@ -0,0 +1,192 @@
+"""
+Live progress of documents being processed, as Server-Sent Events
+
+A progressive upload (POST /documents/upload?stream=true) publishes what the
+processor produces to a channel keyed by the document id: "text" chunks of
+markdown as Gemini streams them, then "ledger", "doc_type" and "title", and
+finally "done" (or "error"). GET /documents/{id}/events relays the channel,
+replaying what was already published to late subscribers.
+
+Channels live in the worker that runs the upload. A client that reaches
+another worker, or connects after the channel expired, is served by polling
+the stored document instead, which is written as the text streams in.
+"""
+import asyncio
+import threading
+import time
+
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+
+from app.models.document import documents_collection
+from app.utils.json_utils import dumps_mongo
+from app.utils.storage_codec import decompress_value
+
+CHANNEL_TTL = 60  # Seconds a finished channel is kept for late subscribers
+KEEPALIVE_INTERVAL = 15  # Seconds between comments that keep proxies from closing an idle stream
+POLL_INTERVAL = 0.5  # Seconds between reads of a document processed by another worker
+FINAL_EVENTS = ("done", "error")
+
+# Fields sent with "done", and read when polling
+RESULT_FIELDS = {"title": 1, "doc_type": 1, "ledger": 1, "extraction_status": 1, "extraction_error": 1,
+                 "near_duplicate_of": 1, "file_type": 1}
+
+
+class Channel:
+    def __init__(self):
+        self.history = []
+        self.subscribers = []
+        self.closed_at = None
+
+
+class EventBus:
+    """In-process publish/subscribe of document events, thread-safe on the publishing side"""
+
+    def __init__(self, ttl=CHANNEL_TTL):
+        self.ttl = ttl
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def _expire(self):
+        now = time.monotonic()
+        for document_id in [key for key, channel in self.channels.items()
+                            if channel.closed_at is not None and now - channel.closed_at > self.ttl]:
+            del self.channels[document_id]
+
+    def open(self, document_id):
+        """Start a channel for a document about to be processed"""
+        with self.lock:
+            self._expire()
+            self.channels[str(document_id)] = Channel()
+
+    def publish(self, document_id, event, data=None):
+        """
+        Send an event to every subscriber of a document; a final event
+        ("done" or "error") closes the channel
+
+        Safe to call from worker threads: events are handed to each
+        subscriber's event loop.
+        """
+        with self.lock:
+            channel = self.channels.get(str(document_id))
+            if channel is None or channel.closed_at is not None:
+                return
+            channel.history.append((event, data))
+            if event in FINAL_EVENTS:
+                channel.closed_at = time.monotonic()
+            subscribers = list(channel.subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+            except RuntimeError:
+                pass  # The subscriber's event loop has shut down
+
+    def subscribe(self, document_id):
+        """
+        Register the running event loop for a document's events
+
+        Returns:
+            (events so far, asyncio.Queue of later events), or None if this
+            worker has no channel for the document
+        """
+        queue = asyncio.Queue()
+        with self.lock:
+            channel = self.channels.get(str(document_id))
+            if channel is None:
+                return None
+            history = list(channel.history)
+            if channel.closed_at is None:
+                channel.subscribers.append((asyncio.get_running_loop(), queue))
+        return history, queue
+
+    def unsubscribe(self, document_id, queue):
+        with self.lock:
+            channel = self.channels.get(str(document_id))
+            if channel is not None:
+                channel.subscribers = [(loop, q) for loop, q in channel.subscribers if q is not queue]
+
+
+event_bus = EventBus()
+
+
+def format_sse(event, data):
+    """One Server-Sent Event with a JSON payload"""
+    return b"event: " + event.encode() + b"\ndata: " + dumps_mongo(data) + b"\n\n"
+
+
+def coalesce_text(events):
+    """Merge runs of "text" events so a replay sends the text so far in one piece"""
+    merged = []
+    for event, data in events:
+        if event == "text" and merged and merged[-1][0] == "text":
+            merged[-1] = ("text", {"text": merged[-1][1]["text"] + data["text"]})
+        else:
+            merged.append((event, data))
+    return merged
+
+
+async def _relay(document_id, history, queue):
+    try:
+        for event, data in coalesce_text(history):
+            yield format_sse(event, data)
+            if event in FINAL_EVENTS:
+                return
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            yield format_sse(event, data)
+            if event in FINAL_EVENTS:
+                return
+    finally:
+        event_bus.unsubscribe(document_id, queue)
+
+
+def result_event(document):
+    """The "done" payload: what the document ended up as, without its image or text"""
+    result = {key: document.get(key) for key in RESULT_FIELDS}
+    result["id"] = document["_id"]
+    return result
+
+
+async def _poll(document_id):
+    """Events for a document processed elsewhere, from its stored record"""
+    projection = dict(RESULT_FIELDS, extracted_text=1)
+    sent = 0
+    last_keepalive = time.monotonic()
+    while True:
+        document = await run_in_threadpool(documents_collection.find_one, {"_id": ObjectId(document_id)}, projection)
+        if document is None:
+            yield format_sse("error", {"detail": "Document not found"})
+            return
+
+        text = decompress_value(document.get("extracted_text")) or ""
+        if len(text) > sent:
+            yield format_sse("text", {"text": text[sent:]})
+            sent = len(text)
+            last_keepalive = time.monotonic()
+
+        if document.get("extraction_status") != "processing":
+            for field in ("ledger", "doc_type", "title"):
+                yield format_sse(field, document.get(field))
+            yield format_sse("done", result_event(document))
+            return
+
+        if time.monotonic() - last_keepalive > KEEPALIVE_INTERVAL:
+            yield b": keep-alive\n\n"
+            last_keepalive = time.monotonic()
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+def document_event_stream(document_id):
+    """
+    Server-Sent Events for a document: live from this worker's channel if
+    it has one, otherwise polled from the database
+    """
+    subscription = event_bus.subscribe(document_id)
+    if subscription is None:
+        return _poll(document_id)
+    return _relay(document_id, *subscription)
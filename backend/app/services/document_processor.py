@@ -1,12 +1,23 @@
 import base64
+import contextvars
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from io import BytesIO
-from PIL import Image
-import google.generativeai as genai
-from app.config import GEMINI_API_KEY
-from app.utils.image_utils import convert_to_jpg, resize_image_if_needed, get_image_base64
-
-# Configure Gemini
-genai.configure(api_key=GEMINI_API_KEY)
+from app.config import (
+    IMAGE_PREPROCESSING, IMAGE_TEXT_LINE_HEIGHT, REUSE_DUPLICATE_EXTRACTION, PAGE_EXTRACTION_CONCURRENCY
+)
+from app.models.ledger import LedgerRecord
+from app.services.classification_service import detect_document_type, fallback_title, generate_document_title
+from app.services.dedup_service import compute_document_phash, find_near_duplicate
+from app.services.gemini_service import generate_content, generate_content_stream
+from app.services.ledger_service import extract_ledger
+from app.utils.image_utils import (
+    convert_to_jpg, get_image_base64, preprocess_document_image, image_to_jpg, dhash
+)
+from app.utils.metrics import span
+from app.utils.resilience import CircuitOpen, DeadlineExceeded, is_retryable
+from app.utils.storage_codec import decompress_value
 
 # System prompt for document extraction
 DOCUMENT_SYSTEM_PROMPT = """
@@ -14,21 +25,60 @@ You are an expert document analyzer. Extract all text and information from the p
 Organize the information in a well-structured markdown format with appropriate headings, lists, and tables.
 """
 
+# Between the markdown of pages extracted one by one
+PAGE_SEPARATOR = "\n\n---\n\n"
+
+# Model used for text extraction. After changing it or DOCUMENT_SYSTEM_PROMPT,
+# re-extract existing documents with `python -m app.scripts.reextract --stale`
+EXTRACTION_MODEL = 'gemini-2.0-pro-exp-02-05'
+
+def extraction_meta():
+    """Identifies the model and prompt behind an extraction"""
+    return {
+        "model": EXTRACTION_MODEL,
+        "prompt_hash": hashlib.sha1(DOCUMENT_SYSTEM_PROMPT.encode()).hexdigest()[:12],
+        "extracted_at": datetime.now(),
+    }
+
+def extraction_failed(document):
+    """
+    True if a stored document has no usable extraction, including documents
+    saved before extraction_status existed, whose text holds the error message
+    """
+    if document.get("extraction_status") in ("failed", "deferred"):
+        return True
+    # Error messages are short, so never stored compressed
+    text = document.get("extracted_text")
+    return isinstance(text, str) and text.startswith("Error")
+
+def failure_status(error):
+    """"deferred" for upstream outages and timeouts (retried later), "failed" otherwise"""
+    if isinstance(error, (CircuitOpen, DeadlineExceeded)) or is_retryable(error):
+        return "deferred"
+    return "failed"
+
 class DocumentProcessor:
     """
     Process document images and extract information
     """
     
-    def process_document(self, document_data):
+    def process_document(self, document_data, on_progress=None, page_images=None):
         """
         Process a document from its image data
         
         Args:
             document_data: Document data containing image_base64
+            page_images: For a PDF combined from photos, the photos' bytes in
+                page order; each is then extracted on its own, in parallel
+            on_progress: Optional callback(event, data) told about each step as it
+                finishes: "prepared" (optimized image and phash), "text" (chunks of
+                markdown as Gemini streams them), "ledger", "doc_type" and "title"
             
         Returns:
             Processed document data with extracted text
         """
+        notify = on_progress or (lambda event, data: None)
+        on_text = (lambda text: on_progress("text", text)) if on_progress else None
         try:
             # Get image/PDF data
             if not document_data.image_base64:
@@ -38,146 +88,240 @@ class DocumentProcessor:
             file_type = document_data.file_type if hasattr(document_data, "file_type") else "image"
             
             # Decode base64 to get binary data for processing
-            file_binary = base64.b64decode(document_data.image_base64)
+            with span("base64_decode"):
+                file_binary = base64.b64decode(document_data.image_base64)
             
             if file_type == "pdf":
+                # Same first page as an earlier upload?
+                document_data.phash = compute_document_phash(file_binary, "pdf")
+                if self.reuse_near_duplicate(document_data, file_type):
+                    return document_data
+                notify("prepared", {"phash": document_data.phash})
+                
                 # Process PDF with Gemini
-                extracted_text = self.extract_text_from_pdf(document_data.image_base64)
+                status = "done"
+                try:
+                    if page_images:
+                        extracted_text, page_errors = self.extract_pages(page_images, on_text)
+                        if page_errors:
+                            document_data.extraction_error = "; ".join(
+                                f"page {number}: {error}" for number, error in page_errors.items())[:500]
+                            # Pages lost to an outage or timeout are extracted again later
+                            if any(failure_status(error) == "deferred" for error in page_errors.values()):
+                                status = "partial"
+                    else:
+                        extracted_text = self.extract_text_from_pdf(document_data.image_base64, on_text)
+                except Exception as e:
+                    return self.mark_extraction_failed(document_data, e)
                 
                 # Update document with extracted info
                 document_data.extracted_text = extracted_text
+                document_data.extraction_meta = extraction_meta()
+                document_data.extraction_status = status
                 
                 # No additional processing needed for PDF binary data
                 # Keep original base64 for PDF viewing
             else:
                 # Process as image (existing code)
-                # Create a BytesIO object from the binary data
-                image_io = BytesIO(file_binary)
+                stored_base64, processed_base64, phash = self.normalize_image(file_binary)
                 
-                # Open the image
-                img = Image.open(image_io)
+                # Same page as an earlier upload (e.g. the receipt photographed twice)?
+                document_data.phash = phash if phash is not None else compute_document_phash(file_binary, "image")
+                if self.reuse_near_duplicate(document_data, file_type):
+                    document_data.image_base64 = stored_base64
+                    return document_data
                 
-                # Convert to JPG and resize if needed
-                jpg_buffer = convert_to_jpg(BytesIO(file_binary))
-                img = resize_image_if_needed(img)
-                
-                # Get base64 encoded image for Gemini
-                processed_base64 = get_image_base64(jpg_buffer)
+                # Keep the full image even if extraction has to be retried later;
+                # only Gemini gets the preprocessed copy
+                document_data.image_base64 = stored_base64
+                notify("prepared", {"image_base64": stored_base64, "phash": document_data.phash})
                 
                 # Extract text with Gemini
-                extracted_text = self.extract_text_with_gemini(processed_base64)
+                try:
+                    extracted_text = self.extract_text_with_gemini(processed_base64, on_text)
+                except Exception as e:
+                    return self.mark_extraction_failed(document_data, e)
                 
                 # Update document with extracted info
                 document_data.extracted_text = extracted_text
-                document_data.image_base64 = processed_base64  # Update with optimized image
+                document_data.extraction_meta = extraction_meta()
+                document_data.extraction_status = "done"
             
-            # Always generate a title from the content
-            document_data.title = self.generate_document_title(document_data.extracted_text)
+            # Structured ledger fields (vendor, date, totals) for indexed queries
+            document_data.ledger = extract_ledger(document_data.extracted_text)
+            notify("ledger", document_data.ledger)
             
             # Detect document type if not specified
             if document_data.doc_type == "unknown":
                 document_data.doc_type = self.detect_document_type(document_data.extracted_text)
+            notify("doc_type", document_data.doc_type)
+            
+            # Always generate a title from the content
+            document_data.title = self.generate_document_title(
+                document_data.extracted_text, document_data.doc_type, document_data.ledger)
+            notify("title", document_data.title)
             
             return document_data
         
         except Exception as e:
-            # If there's an error, preserve original document but add error message
+            # If there's an error, preserve original document and record why
             print(f"Error processing document: {str(e)}")
             if not document_data.extracted_text:
-                document_data.extracted_text = f"Error processing document: {str(e)}"
+                return self.mark_extraction_failed(document_data, e)
             return document_data
 
-    def extract_text_with_gemini(self, image_base64):
-        """Extract text from image using Gemini"""
-        try:
-            model = genai.GenerativeModel('gemini-2.0-pro-exp-02-05')
-            response = model.generate_content([
-                DOCUMENT_SYSTEM_PROMPT,
-                {"mime_type": "image/jpeg", "data": image_base64}
-            ])
-            return response.text
-        except Exception as e:
-            return f"Error extracting text: {str(e)}"
-    
-    def extract_text_from_pdf(self, base64_pdf: str) -> str:
-        """Extract text from PDF using Gemini"""
-        try:
-            # Convert base64 to binary
-            pdf_bytes = base64.b64decode(base64_pdf)
-            
-            # Configure Gemini
-            model = genai.GenerativeModel('gemini-2.0-pro-exp-02-05')
-            
-            # Create a prompt with PDF content
-            response = model.generate_content([
-                DOCUMENT_SYSTEM_PROMPT,
-                {
-                    "mime_type": "application/pdf",
-                    "data": pdf_bytes
-                }
-            ])
-            
-            return response.text
-        except Exception as e:
-            print(f"Error extracting text from PDF: {e}")
-            return f"Error extracting text from PDF: {str(e)}"
-    
-    def generate_document_title(self, extracted_text):
-        """Generate a descriptive title for the document"""
-        try:
-            model = genai.GenerativeModel('gemini-2.0-flash')
-            prompt = """
-            Based on the following document text, generate a clear, descriptive title 
-            (maximum 60 characters).
-            
-            The title should:
-            1. Start with the document type (e.g., "Receipt:", "Invoice:", "Menu:")
-            2. Include business/organization name if available
-            3. Include key identifying details (date, reference numbers, etc.)
-            4. Be specific enough to distinguish it from similar documents
+    def normalize_image(self, file_binary):
+        """
+        Prepare an uploaded image for storage and for Gemini
+        
+        The stored image is the upload converted to JPG; the cropped, deskewed
+        and downscaled copy is only sent to Gemini and hashed, so the user's
+        view, thumbnails and later re-extractions start from the full image.
+        
+        Returns:
+            Tuple of (base64 JPEG to store, base64 JPEG for Gemini,
+            dHash or None if preprocessing failed)
+        """
+        with span("image_normalize"):
+            # Convert to JPG
+            stored_base64 = get_image_base64(convert_to_jpg(BytesIO(file_binary)))
             
-            Examples of good titles:
-            - "Receipt: Walmart Groceries - March 24, 2025"
-            - "Menu: Riverfront Grill Food & Drinks"
-            - "Invoice #INV-2025-03-24: Computer Accessories"
+            if not IMAGE_PREPROCESSING:
+                return stored_base64, stored_base64, None
             
-            Document text:
-            """
+            # Crop to the page, deskew and downscale to cut image tokens
+            # (Pillow is imported on first use)
+            from PIL import Image
+            try:
+                img = preprocess_document_image(Image.open(BytesIO(file_binary)),
+                                                text_line_height=IMAGE_TEXT_LINE_HEIGHT)
+                return stored_base64, get_image_base64(image_to_jpg(img)), dhash(img)
+            except Exception as e:
+                print(f"Error preprocessing image, sending it unmodified: {e}")
+                return stored_base64, stored_base64, None
+
+    def extract_text_from_image(self, image_bytes, on_text=None):
+        """Preprocess an image and extract its text with Gemini (raises if Gemini fails)"""
+        return self.extract_text_with_gemini(self.normalize_image(image_bytes)[1], on_text)
+
+    def extract_pages(self, page_images, on_text=None, concurrency=PAGE_EXTRACTION_CONCURRENCY):
+        """
+        Normalize and extract each page image on its own, `concurrency` at a
+        time, and merge the markdown in page order
+        
+        A page that fails is marked in the text instead of failing the others.
+        
+        Args:
+            page_images: Image bytes, one per page
+            on_text: Called with each page's markdown, in page order, as soon as
+                it and every page before it are done
             
-            response = model.generate_content(prompt + extracted_text[:1000])
-            title = response.text.strip()
+        Returns:
+            Tuple of (merged markdown, {page number: error} for failed pages)
             
-            if len(title) > 60 or not title:
-                from datetime import datetime
-                now = datetime.now().strftime("%Y-%m-%d %H:%M")
-                title = f"Document Scan ({now})"
-                
-            return title
-        except Exception as e:
-            from datetime import datetime
-            now = datetime.now().strftime("%Y-%m-%d %H:%M")
-            return f"Document Scan ({now})"
+        Raises:
+            The first page's error if every page failed
+        """
+        pages, errors = [], {}
+        with ThreadPoolExecutor(max(1, min(concurrency, len(page_images))), thread_name_prefix="page-extract") as pool:
+            # Each page keeps the caller's Gemini lane and deadline
+            futures = [pool.submit(contextvars.copy_context().run, self.extract_text_from_image, image)
+                       for image in page_images]
+            for number, future in enumerate(futures, 1):
+                try:
+                    markdown = future.result()
+                except Exception as e:
+                    print(f"Error extracting page {number}: {e}")
+                    errors[number] = e
+                    markdown = f"*Page {number} could not be extracted.*"
+                pages.append(markdown)
+                if on_text:
+                    on_text(PAGE_SEPARATOR + markdown if number > 1 else markdown)
+        
+        if len(errors) == len(page_images):
+            raise errors[1]
+        return PAGE_SEPARATOR.join(pages), errors
+
+    def mark_extraction_failed(self, document_data, error):
+        """
+        Record a failed extraction on the document instead of storing the
+        error as its text; "deferred" documents are retried automatically
+        """
+        status = failure_status(error)
+        print(f"Extraction {status}: {error}")
+        document_data.extracted_text = None
+        document_data.extraction_status = status
+        document_data.extraction_error = str(error)[:500]
+        if document_data.title == "Document being processed...":
+            document_data.title = fallback_title()
+        return document_data
+
+    def reuse_near_duplicate(self, document_data, file_type):
+        """
+        Flag an upload that looks like an earlier document and, with
+        REUSE_DUPLICATE_EXTRACTION on, copy that document's extraction
+        
+        Returns:
+            True if the extraction was reused and no Gemini calls are needed
+        """
+        duplicate = find_near_duplicate(document_data.phash)
+        if not duplicate:
+            return False
+        document_data.near_duplicate_of = str(duplicate["_id"])
+        
+        extracted_text = decompress_value(duplicate.get("extracted_text"))
+        if (not REUSE_DUPLICATE_EXTRACTION or duplicate.get("file_type", "image") != file_type
+                or not extracted_text or extraction_failed(duplicate)):
+            return False
+        
+        document_data.extracted_text = extracted_text
+        document_data.ledger = LedgerRecord.model_validate(duplicate["ledger"]) if duplicate.get("ledger") else None
+        document_data.extraction_status = "done"
+        document_data.title = duplicate.get("title") or document_data.title
+        if document_data.doc_type == "unknown":
+            document_data.doc_type = duplicate.get("doc_type", "unknown")
+        return True
+
+    def extract_text(self, contents, call_site, on_text=None):
+        """
+        Run an extraction prompt; with on_text, stream the response and pass
+        each chunk of markdown to on_text as it arrives
+        """
+        if on_text is None:
+            return generate_content(EXTRACTION_MODEL, contents, call_site=call_site).text
+        chunks = []
+        for text in generate_content_stream(EXTRACTION_MODEL, contents, call_site=call_site):
+            chunks.append(text)
+            on_text(text)
+        return "".join(chunks)
+
+    def extract_text_with_gemini(self, image_base64, on_text=None):
+        """Extract text from image using Gemini (raises if Gemini fails)"""
+        return self.extract_text([
+            DOCUMENT_SYSTEM_PROMPT,
+            {"mime_type": "image/jpeg", "data": image_base64}
+        ], "extract_image", on_text)
+    
+    def extract_text_from_pdf(self, base64_pdf: str, on_text=None) -> str:
+        """Extract text from PDF using Gemini (raises if Gemini fails)"""
+        # Convert base64 to binary
+        with span("base64_decode"):
+            pdf_bytes = base64.b64decode(base64_pdf)
+        
+        # Create a prompt with PDF content
+        return self.extract_text([
+            DOCUMENT_SYSTEM_PROMPT,
+            {
+                "mime_type": "application/pdf",
+                "data": pdf_bytes
+            }
+        ], "extract_pdf", on_text)
+    
+    def generate_document_title(self, extracted_text, doc_type="unknown", ledger=None):
+        """Title from the type, vendor and date; Gemini only if the text names neither"""
+        return generate_document_title(extracted_text, doc_type,
+                                       ledger.vendor if ledger else None, ledger.date if ledger else None)
     
     def detect_document_type(self, extracted_text):
-        """Detect document type from extracted text"""
-        try:
-            model = genai.GenerativeModel('gemini-2.0-flash')
-            prompt = """
-            Classify this document text into one category: receipt, invoice, bill, statement, 
-            form, menu, contract, report, letter, or other.
-            Return only the category name, nothing else.
-            
-            Document text:
-            """
-            response = model.generate_content(prompt + extracted_text[:1000])
-            doc_type = response.text.strip().lower()
-            
-            valid_types = ["receipt", "invoice", "bill", "statement", "form", 
-                           "menu", "contract", "report", "letter", "other"]
-            
-            if doc_type not in valid_types:
-                return "other"
-                
-            return doc_type
-        except Exception as e:
-            return "other"
\ No newline at end of file
+        """Document type from the local classifier, or Gemini when it is unsure"""
+        return detect_document_type(extracted_text)
@@ -2,15 +2,11 @@ from datetime import datetime
 import os
 import base64
 from io import BytesIO
-from PIL import Image
-import google.generativeai as genai
 
-from app.config import GEMINI_API_KEY, ALLOWED_EXTENSIONS
+from app.config import ALLOWED_EXTENSIONS
+from app.services.gemini_service import generate_content
 from app.utils.image_utils import convert_to_jpg, resize_image_if_needed, get_image_base64
 
-# Configure the Gemini API
-genai.configure(api_key=GEMINI_API_KEY)
-
 # System prompt for Gemini document extraction
 DOCUMENT_SYSTEM_PROMPT = """
 You are an expert document analyzer. Your task is to extract all information from the uploaded document image.
@@ -56,7 +52,8 @@ def process_document_image(file_contents):
     Returns:
         Tuple of (base64_image, extracted_text)
     """
-    # Load image
+    # Load image (Pillow is imported on first use)
+    from PIL import Image
     img = Image.open(BytesIO(file_contents))
     
     # Convert to JPG
@@ -84,126 +81,12 @@ def extract_text_with_gemini(image_base64):
         Extracted text
     """
     try:
-        # Initialize the Gemini model - using the latest pro model
-        model = genai.GenerativeModel('gemini-2.0-pro-exp-02-05')
-        
-        # Create the content with the image and prompt
-        response = model.generate_content([
+        # Create the content with the image and prompt - using the latest pro model
+        response = generate_content('gemini-2.0-pro-exp-02-05', [
             DOCUMENT_SYSTEM_PROMPT,
             {"mime_type": "image/jpeg", "data": image_base64}
-        ])
+        ], call_site="extract_image")
         
         return response.text
     except Exception as e:
         return f"Error in processing with Gemini: {str(e)}"
-
-def generate_document_title(extracted_text):
-    """
-    Generate a descriptive title for the document using Gemini
-    
-    Args:
-        extracted_text: The extracted text from the document
-        
-    Returns:
-        A descriptive title for the document
-    """
-    try:
-        # Initialize the Gemini model
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        prompt = """
-        Based on the following document text, generate a clear, descriptive title 
-        (maximum 60 characters).
-        
-        The title should:
-        1. Start with the document type (e.g., "Receipt:", "Invoice:", "Menu:")
-        2. Include business/organization name if available
-        3. Include key identifying details (date, reference numbers, etc.)
-        4. Be specific enough to distinguish it from similar documents
-        
-        Examples of good titles:
-        - "Receipt: Walmart Groceries - March 24, 2025"
-        - "Menu: Riverfront Grill Food & Drinks"
-        - "Invoice #INV-2025-03-24: Computer Accessories"
-        
-        Document text:
-        """
-        
-        # Get a short summary of the text for the title
-        response = model.generate_content(prompt + extracted_text[:1000])  # Limit text to first 1000 chars
-        
-        # Get the response and strip whitespace
-        title = response.text.strip()
-        
-        # If title is too long or empty, provide a fallback
-        if len(title) > 60 or not title:
-            title = f"Document Scan ({get_now_formatted()})"
-            
-        return title
-    except Exception as e:
-        # If there's an error, return a generic title with timestamp
-        return f"Document Scan ({get_now_formatted()})"
-        
-def detect_document_type(extracted_text):
-    """
-    Detect the document type from the extracted text
-    
-    Args:
-        extracted_text: The extracted text from the document
-        
-    Returns:
-        The detected document type (receipt, invoice, etc.)
-    """
-    try:
-        # Initialize the Gemini model
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        
-        prompt = """
-        Classify the following document text into one of these categories:
-        - receipt
-        - invoice
-        - bill
-        - statement
-        - form
-        - menu
-        - contract
-        - report
-        - letter
-        -id card
-        -document
-        -ticket
-        -certificate
-        -license
-        -permit
-        -application
-        -enrollment
-        -registration
-        -reservation
-        -schedule
-        -agenda
-        -itinerary
-        -manifesto
-        - other
-        
-        Return only the category name, nothing else.
-        
-        Document text:
-        """
-        
-        # Get the document type
-        response = model.generate_content(prompt + extracted_text[:1000])  # Limit text to first 1000 chars
-        
-        # Return the document type
-        doc_type = response.text.strip().lower()
-        
-        # Validate that it's one of our categories
-        valid_types = ["receipt", "invoice", "bill", "statement", "form", 
-                       "menu", "contract", "report", "letter", "other"]
-        
-        if doc_type not in valid_types:
-            return "other"
-            
-        return doc_type
-    except Exception as e:
-        # If there's an error, return a generic type
-        return "other"
\ No newline at end of file
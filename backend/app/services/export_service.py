@@ -0,0 +1,110 @@
+import csv
+import io
+
+from app.config import EXPORT_BATCH_SIZE
+from app.models.chat import chats_collection
+from app.models.document import documents_collection
+from app.utils.json_utils import dumps_mongo
+from app.utils.storage_codec import decompress_fields
+
+# Columns of each export; nested fields use dotted paths (flattened in CSV)
+DOCUMENT_EXPORT_FIELDS = [
+    "_id", "title", "doc_type", "file_type", "created_at", "updated_at", "last_chat_at", "chat_count",
+    "near_duplicate_of", "ledger.vendor", "ledger.category", "ledger.date", "ledger.currency",
+    "ledger.total", "ledger.tax",
+]
+CHAT_EXPORT_FIELDS = ["_id", "document_id", "created_at", "user_message", "ai_response", "used_tools"]
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def build_export_query(doc_type=None, since=None, until=None, document_id=None, global_only=False):
+    """MongoDB filter for an export; every argument is optional"""
+    query = {}
+    if doc_type:
+        query["doc_type"] = doc_type
+    if document_id:
+        query["document_id"] = document_id
+    elif global_only:
+        query["document_id"] = None
+    if since or until:
+        query["created_at"] = {}
+        if since:
+            query["created_at"]["$gte"] = since
+        if until:
+            query["created_at"]["$lt"] = until
+    return query
+
+
+def _get_path(doc, path):
+    """Value at a dotted path, or None if any part is missing"""
+    for key in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return dumps_mongo(value).decode()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _iter_batches(collection, query, fields, batch_size):
+    """
+    Matching documents in _id order, a batch at a time
+
+    Only one batch is held in memory; the cursor is closed even if the
+    client disconnects halfway through the download.
+    """
+    projection = {field: 1 for field in fields}
+    cursor = collection.find(query, projection).sort("_id", 1).batch_size(batch_size)
+    try:
+        batch = []
+        for doc in cursor:
+            batch.append(decompress_fields(doc))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        cursor.close()
+
+
+def iter_ndjson(collection, query, fields, batch_size=EXPORT_BATCH_SIZE):
+    """One JSON object per line; yields one chunk of bytes per batch"""
+    for batch in _iter_batches(collection, query, fields, batch_size):
+        yield b"".join(dumps_mongo(doc) + b"\n" for doc in batch)
+
+
+def iter_csv(collection, query, fields, batch_size=EXPORT_BATCH_SIZE):
+    """CSV with a header row; yields the header, then one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    yield buffer.getvalue().encode()
+
+    for batch in _iter_batches(collection, query, fields, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(_get_path(doc, field)) for field in fields] for doc in batch)
+        yield buffer.getvalue().encode()
+
+
+def export_documents(export_format, query, include_text=False):
+    """Byte chunks of a document export; never includes the stored images"""
+    fields = DOCUMENT_EXPORT_FIELDS + (["extracted_text"] if include_text else [])
+    iterate = iter_csv if export_format == "csv" else iter_ndjson
+    return iterate(documents_collection, query, fields)
+
+
+def export_chats(export_format, query):
+    """Byte chunks of a chat export"""
+    iterate = iter_csv if export_format == "csv" else iter_ndjson
+    return iterate(chats_collection, query, CHAT_EXPORT_FIELDS)
@@ -0,0 +1,153 @@
+"""
+Deterministic stand-in for the Gemini API
+
+Selected with LLM_BACKEND=fake. Responses are derived from the prompt, so
+the same request always gets the same answer, and each call sleeps for a
+latency drawn from FAKE_LLM_LATENCY. Used by the benchmark suite and for
+local development without an API key.
+
+FAKE_LLM_LATENCY formats (milliseconds):
+    fixed:800
+    uniform:200,1200
+    lognormal:800,0.5        (median, sigma)
+    pareto:500,2.5           (minimum, shape - long tail)
+
+A PDF takes one sampled latency per page, as a real extraction's output
+grows with the pages. With stream=True the first chunk arrives after FIRST_CHUNK_SHARE of the
+sampled latency and the rest of the answer is spread over the remainder.
+"""
+import math
+import random
+import re
+import threading
+import time
+
+from app.config import FAKE_LLM_LATENCY, FAKE_LLM_SEED
+from app.utils.token_utils import TOKENS_PER_TILE, estimate_part_tokens
+
+FAKE_EXTRACTION = """# Fake Mart
+
+**Date:** March 24, 2025
+**Address:** 12 MG Road, Bengaluru
+
+| Item | Qty | Price |
+|------|-----|-------|
+| Basmati Rice 5kg | 1 | 640.00 |
+| Toor Dal 1kg | 2 | 310.00 |
+| Amul Butter 500g | 1 | 285.00 |
+
+- **Subtotal:** 1,235.00
+- **GST (5%):** 61.75
+- **Total:** INR 1,296.75
+- **Payment:** UPI
+"""
+
+FAKE_LEDGER = """{"vendor": "Fake Mart", "category": "grocery", "date": "2025-03-24",
+"currency": "INR", "total": 1296.75, "tax": 61.75, "line_items": [
+{"description": "Basmati Rice 5kg", "quantity": 1, "unit_price": 640.0, "amount": 640.0},
+{"description": "Toor Dal 1kg", "quantity": 2, "unit_price": 155.0, "amount": 310.0},
+{"description": "Amul Butter 500g", "quantity": 1, "unit_price": 285.0, "amount": 285.0}]}"""
+
+
+class LatencyModel:
+    """Thread-safe, seeded sampler for per-call latency in seconds"""
+
+    def __init__(self, spec, seed=0):
+        self.kind, _, params = spec.partition(":")
+        self.params = [float(value) for value in params.split(",") if value]
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        if self.kind not in ("fixed", "uniform", "lognormal", "pareto"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self):
+        with self.lock:
+            if self.kind == "fixed":
+                millis = self.params[0]
+            elif self.kind == "uniform":
+                millis = self.random.uniform(self.params[0], self.params[1])
+            elif self.kind == "lognormal":
+                median, sigma = self.params
+                millis = self.random.lognormvariate(math.log(median), sigma)
+            else:
+                minimum, shape = self.params
+                millis = minimum * self.random.paretovariate(shape)
+        return millis / 1000
+
+
+latency_model = LatencyModel(FAKE_LLM_LATENCY, FAKE_LLM_SEED)
+
+FIRST_CHUNK_SHARE = 0.25
+STREAM_CHUNK_CHARS = 40
+
+
+class FakeResponse:
+    """The subset of a Gemini response the app reads"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+def _prompt_text(contents):
+    if isinstance(contents, str):
+        return contents
+    return "\n".join(part for part in contents if isinstance(part, str))
+
+
+def _pdf_pages(contents):
+    if isinstance(contents, str):
+        return 1
+    pages = sum(estimate_part_tokens(part) // TOKENS_PER_TILE for part in contents
+                if isinstance(part, dict) and part.get("mime_type") == "application/pdf")
+    return max(1, pages)
+
+
+def _has_file_part(contents):
+    return not isinstance(contents, str) and any(isinstance(part, dict) for part in contents)
+
+
+def fake_answer(contents):
+    """Pick a plausible, deterministic answer for each prompt the app sends"""
+    prompt = _prompt_text(contents)
+
+    if _has_file_part(contents):
+        return FAKE_EXTRACTION
+    if "Reply only with YES or NO" in prompt:
+        query = re.search(r"User query:(.*)", prompt)
+        wants_search = query and re.search(r"price|calorie|review|compare", query.group(1), re.I)
+        return "YES" if wants_search else "NO"
+    if "query planner" in prompt:
+        return '{"intent": "aggregate", "category": "grocery", "start_date": "2025-03-01", "end_date": "2025-04-01"}'
+    if "as a ledger entry" in prompt:
+        return FAKE_LEDGER
+    if "web search query" in prompt:
+        return "basmati rice typical price market rate"
+    if "Classify" in prompt:
+        return "receipt"
+    if "descriptive title" in prompt:
+        return "Receipt: Fake Mart Groceries - March 24, 2025"
+    return "**Total:** INR 1,296.75 including 5% GST.\n\n- Basmati Rice: 640.00\n- Toor Dal: 310.00"
+
+
+class FakeGenerativeModel:
+    """Drop-in for genai.GenerativeModel"""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        latency = sum(latency_model.sample() for _ in range(_pdf_pages(contents)))
+        if stream:
+            return _stream(fake_answer(contents), latency)
+        time.sleep(latency)
+        return FakeResponse(fake_answer(contents))
+
+
+def _stream(text, latency):
+    """Yield the answer in chunks, paced like a streaming response"""
+    chunks = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)] or [""]
+    time.sleep(latency * FIRST_CHUNK_SHARE)
+    for index, chunk in enumerate(chunks):
+        if index:
+            time.sleep(latency * (1 - FIRST_CHUNK_SHARE) / max(1, len(chunks) - 1))
+        yield FakeResponse(chunk)
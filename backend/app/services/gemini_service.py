@@ -1,9 +1,146 @@
-import google.generativeai as genai
-import os
-from app.config import GEMINI_API_KEY
+import itertools
+import threading
+from time import perf_counter
+from app.config import GEMINI_API_KEY, GEMINI_TIMEOUT, LLM_BACKEND
+from app.services.llm_governor import governor
+from app.services.llm_hedging import hedger
+from app.utils.metrics import span, GEMINI_SECONDS, GEMINI_FIRST_CHUNK_SECONDS
+from app.utils.resilience import gemini_breaker
+from app.utils.token_utils import estimate_tokens
 
-# Configure the Gemini API
-genai.configure(api_key=GEMINI_API_KEY)
+# google.generativeai takes a few hundred milliseconds to import, so it is
+# loaded and configured on the first real call instead of at startup
+_genai = None
+_genai_lock = threading.Lock()
+
+def get_genai():
+    """The configured google.generativeai module, imported on first use"""
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=GEMINI_API_KEY)
+                _genai = genai
+    return _genai
+
+def _model(model_name):
+    if LLM_BACKEND == "fake":
+        from app.services.fake_llm import FakeGenerativeModel
+        return FakeGenerativeModel(model_name)
+    return get_genai().GenerativeModel(model_name)
+
+def generate_content(model_name, contents, call_site, **kwargs):
+    """
+    Call Gemini's generate_content, timed per call-site and model
+    
+    Every Gemini call in the app goes through here so it shows up in
+    /metrics under `khatagpt_gemini_request_duration_seconds`, and waits
+    for the governor (llm_governor.py) before it is sent. Each attempt gets
+    the time left in the current deadline (at most GEMINI_TIMEOUT) and
+    retryable errors are retried through the Gemini circuit breaker. With
+    LLM_HEDGING on, slow calls from HEDGE_CALL_SITES are hedged
+    (llm_hedging.py).
+    
+    Args:
+        model_name: Gemini model name
+        contents: Prompt or list of prompt parts
+        call_site: Short label for where the call comes from (e.g. "chat_answer")
+        **kwargs: Passed through to generate_content
+        
+    Returns:
+        The Gemini response
+        
+    Raises:
+        CircuitOpen: Gemini has been failing and was not called
+        QueueTimeout, DeadlineExceeded: no time left to make the call
+        The Gemini error, once retries are used up
+    """
+    model = _model(model_name)
+    tokens = estimate_tokens(contents, kwargs.get("generation_config"))
+
+    def send(timeout):
+        with span("gemini", GEMINI_SECONDS, (call_site, model_name)):
+            return model.generate_content(contents, request_options={"timeout": timeout}, **kwargs)
+
+    def duplicate(timeout, settled):
+        governor.acquire(model_name, tokens)
+        response = None
+        try:
+            if settled.is_set():
+                return None  # The first call has already answered
+            response = send(timeout)
+            return response
+        finally:
+            used_tokens = getattr(getattr(response, "usage_metadata", None), "total_token_count", None)
+            governor.release(model_name, tokens, used_tokens)
+
+    def attempt(timeout):
+        # The slot is taken here, on the caller's thread and in its lane; the
+        # hedger only times and duplicates calls that already hold one
+        governor.acquire(model_name, tokens)
+        response = None
+        try:
+            response = hedger.call(call_site, model_name, lambda: send(timeout),
+                                   lambda settled: duplicate(timeout, settled))
+            return response
+        finally:
+            used_tokens = getattr(getattr(response, "usage_metadata", None), "total_token_count", None)
+            governor.release(model_name, tokens, used_tokens)
+
+    return gemini_breaker.call(attempt, GEMINI_TIMEOUT)
+
+def _chunk_text(chunk):
+    try:
+        return chunk.text
+    except ValueError:
+        # A chunk without text parts (e.g. only the finish reason)
+        return ""
+
+def generate_content_stream(model_name, contents, call_site, **kwargs):
+    """
+    Like generate_content, but yields the response text as Gemini generates it
+    
+    The call holds its governor slot until the stream is consumed or closed.
+    Retries only happen before the first chunk arrives, so the caller never
+    sees text twice; time to the first chunk is recorded in
+    `khatagpt_gemini_first_chunk_seconds`. Not hedged.
+    
+    Args:
+        model_name: Gemini model name
+        contents: Prompt or list of prompt parts
+        call_site: Short label for where the call comes from
+        **kwargs: Passed through to generate_content
+        
+    Yields:
+        Text chunks
+    """
+    model = _model(model_name)
+    tokens = estimate_tokens(contents, kwargs.get("generation_config"))
+    started = perf_counter()
+
+    def start(timeout):
+        governor.acquire(model_name, tokens)
+        try:
+            response = model.generate_content(contents, stream=True, request_options={"timeout": timeout}, **kwargs)
+            chunks = iter(response)
+            return response, chunks, next(chunks, None)
+        except Exception:
+            governor.release(model_name, tokens)
+            raise
+
+    with span("gemini", GEMINI_SECONDS, (call_site, model_name)):
+        response, chunks, first = gemini_breaker.call(start, GEMINI_TIMEOUT)
+        GEMINI_FIRST_CHUNK_SECONDS.observe(perf_counter() - started, (call_site, model_name))
+        used_tokens = None
+        try:
+            for chunk in itertools.chain([first] if first is not None else [], chunks):
+                text = _chunk_text(chunk)
+                if text:
+                    yield text
+            used_tokens = getattr(getattr(response, "usage_metadata", None), "total_token_count", None)
+        finally:
+            governor.release(model_name, tokens, used_tokens)
 
 def get_gemini_response(image_data, prompt):
     """
@@ -17,14 +154,11 @@ def get_gemini_response(image_data, prompt):
         The model's response
     """
     try:
-        # Initialize the Gemini model
-        model = genai.GenerativeModel('gemini-2.0-pro-exp-02-05')
-        
         # Create the content with the image and prompt
-        response = model.generate_content([
+        response = generate_content('gemini-2.0-pro-exp-02-05', [
             prompt,
             {"mime_type": "image/jpeg", "data": image_data}
-        ])
+        ], call_site="image_analysis")
         
         return response.text
     except Exception as e:
@@ -42,11 +176,8 @@ def get_gemini_text_response(prompt, model_name='gemini-2.0-pro'):
         The model's response
     """
     try:
-        # Initialize the Gemini model
-        model = genai.GenerativeModel(model_name)
-        
         # Get response
-        response = model.generate_content(prompt)
+        response = generate_content(model_name, prompt, call_site="text_query")
         
         return response.text
     except Exception as e:
@@ -0,0 +1,233 @@
+import re
+from datetime import datetime
+from typing import Optional, List
+from pydantic import BaseModel, Field, ValidationError
+from app.config import CHAT_DEADLINE
+from app.models.chunk import Chunk
+from app.models.document import documents_collection
+from app.models.ledger import Ledger
+from app.services.chat_retention_service import conversation_history
+from app.services.gemini_service import generate_content
+from app.services.ledger_service import LEDGER_CATEGORIES
+from app.utils.json_utils import dumps_mongo
+from app.utils.resilience import CircuitOpen, DeadlineExceeded, deadline
+from app.utils.storage_codec import decompress_value
+
+# Bounds that keep the answer prompt the same size however large the library gets
+MAX_LISTED_DOCUMENTS = 25
+MAX_PASSAGE_DOCUMENTS = 5
+MAX_PASSAGE_CHARS = 600
+MAX_CONTEXT_CHARS = 12000
+
+GLOBAL_CHAT_SYSTEM_PROMPT = """
+You are a bookkeeping assistant answering questions about a user's whole collection
+of documents (receipts, invoices, bills, statements).
+
+You are given pre-computed totals from the user's ledger and a short list of the
+matching documents. The totals are exact; prefer them over adding numbers yourself.
+If the data does not answer the question, say what is missing.
+
+Answer concisely in markdown, leading with the direct answer and key figures.
+"""
+
+
+class QueryPlan(BaseModel):
+    """How to answer a cross-document question from the indexed ledger"""
+    intent: str = "list"  # "aggregate", "list" or "lookup"
+    vendor: Optional[str] = None
+    category: Optional[str] = None
+    doc_type: Optional[str] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    keywords: List[str] = Field(default_factory=list)
+
+
+def plan_query(user_message):
+    """
+    Turn a question into a QueryPlan with one small LLM call
+
+    Args:
+        user_message: The user's question
+
+    Returns:
+        QueryPlan (a keyword-only plan if the model output does not validate)
+    """
+    prompt = f"""
+    You are a query planner for a personal ledger database. Today is {datetime.now():%Y-%m-%d}.
+    Convert the question into a JSON object with these keys:
+    - "intent": "aggregate" for totals/counts, "list" to find documents, "lookup" for details inside documents
+    - "vendor": business name mentioned, or null
+    - "category": one of {", ".join(LEDGER_CATEGORIES)}, or null
+    - "doc_type": receipt, invoice, bill, statement, menu, or null
+    - "start_date": first day of the period as YYYY-MM-DD, or null
+    - "end_date": day AFTER the period ends as YYYY-MM-DD, or null
+    - "keywords": up to 5 search words for things not covered above (items, products)
+
+    Question: {user_message}
+
+    Return only the JSON object.
+    """
+    try:
+        response = generate_content(
+            'gemini-2.0-flash',
+            prompt,
+            call_site="global_chat_plan",
+            generation_config={"response_mime_type": "application/json"}
+        )
+        return QueryPlan.model_validate_json(response.text)
+    except (ValidationError, ValueError) as e:
+        print(f"Query plan did not validate, falling back to keywords: {e}")
+    except Exception as e:
+        print(f"Error planning query: {e}")
+    words = re.findall(r"[A-Za-z]{4,}", user_message)
+    return QueryPlan(keywords=words[:5])
+
+
+def _relevant_passages(text, keywords, max_chars=MAX_PASSAGE_CHARS):
+    """The paragraphs of a document that mention the keywords, up to max_chars"""
+    if not text or not keywords:
+        return ""
+    pattern = re.compile("|".join(re.escape(word) for word in keywords), re.I)
+    passages, used = [], 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        if not pattern.search(paragraph):
+            continue
+        paragraph = paragraph.strip()[: max_chars - used]
+        passages.append(paragraph)
+        used += len(paragraph)
+        if used >= max_chars:
+            break
+    return "\n".join(passages)
+
+
+def find_passages(document_ids, keywords, max_chars=MAX_PASSAGE_CHARS):
+    """
+    Passages about the keywords from each document, from its best-matching
+    search chunks; documents without matching chunks (e.g. not chunked yet)
+    are scanned in full
+
+    Returns:
+        Dict of document _id to passage text (documents with none are left out)
+    """
+    passages = {}
+    try:
+        for chunk in Chunk.search(document_ids, " ".join(keywords), limit=4 * len(document_ids)):
+            text = passages.get(chunk["document_id"], "")
+            room = max_chars - len(text)
+            if room > 0:
+                passage = _relevant_passages(chunk["text"], keywords, room) or chunk["text"][:room]
+                passages[chunk["document_id"]] = f"{text}\n{passage}" if text else passage
+    except Exception as e:
+        print(f"Error searching chunks for global chat: {e}")
+
+    missing = [document_id for document_id in document_ids if document_id not in passages]
+    if missing:
+        for doc in documents_collection.find({"_id": {"$in": missing}}, {"extracted_text": 1}):
+            passage = _relevant_passages(decompress_value(doc.get("extracted_text")), keywords, max_chars)
+            if passage:
+                passages[doc["_id"]] = passage
+    return passages
+
+
+def _describe_document(doc):
+    ledger = doc.get("ledger") or {}
+    day = ledger.get("date") or doc.get("created_at")
+    amount = f"{ledger.get('currency') or ''} {ledger['total']:.2f}".strip() if ledger.get("total") is not None else "-"
+    return (f"- {day:%Y-%m-%d} | {ledger.get('vendor') or '-'} | {ledger.get('category') or doc.get('doc_type')}"
+            f" | {amount} | {doc.get('title')} (id {doc['_id']})")
+
+
+def gather_context(plan):
+    """
+    Run a QueryPlan against the indexed store
+
+    Returns:
+        Tuple of (context text, tool info for the chat record)
+    """
+    query = Ledger.build_query(plan.vendor, plan.category, plan.start_date, plan.end_date, plan.doc_type)
+    has_filters = len(query) > 1
+    if not has_filters:
+        # Keyword-only questions may match documents that have no ledger yet
+        query.pop("ledger")
+
+    projection = {"title": 1, "doc_type": 1, "created_at": 1, "ledger.vendor": 1, "ledger.category": 1,
+                  "ledger.date": 1, "ledger.currency": 1, "ledger.total": 1}
+    wants_summary = has_filters or plan.intent == "aggregate"
+    try:
+        if plan.keywords:
+            # Large documents store their text compressed: those match through their chunks
+            terms = " ".join(plan.keywords)
+            query["$or"] = [{"$text": {"$search": terms}}, {"_id": {"$in": list(Chunk.match_documents(terms))}}]
+        summary = Ledger.summarize(query) if wants_summary else []
+        documents = Ledger.find_documents(query, projection, MAX_LISTED_DOCUMENTS)
+    except Exception as e:
+        # Text search unavailable: retry on the ledger filters alone
+        print(f"Error searching documents for global chat: {e}")
+        query.pop("$or", None)
+        summary = Ledger.summarize(query) if wants_summary else []
+        documents = Ledger.find_documents(query, projection, MAX_LISTED_DOCUMENTS)
+
+    sections = []
+    if summary:
+        sections.append("Totals for matching documents:\n" + "\n".join(
+            f"- {row['currency'] or 'unknown currency'}: {row['documents']} documents, "
+            f"total {row['total']:.2f}, tax {row['tax']:.2f}"
+            for row in summary
+        ))
+    if documents:
+        sections.append(f"Matching documents (newest first, up to {MAX_LISTED_DOCUMENTS}):\n"
+                        + "\n".join(_describe_document(doc) for doc in documents))
+    else:
+        sections.append("No documents matched.")
+
+    if plan.intent == "lookup" and plan.keywords and documents:
+        passages = find_passages([doc["_id"] for doc in documents[:MAX_PASSAGE_DOCUMENTS]], plan.keywords)
+        for doc in documents[:MAX_PASSAGE_DOCUMENTS]:
+            if doc["_id"] in passages:
+                sections.append(f"From \"{doc.get('title')}\":\n{passages[doc['_id']]}")
+
+    context = "\n\n".join(sections)[:MAX_CONTEXT_CHARS]
+    tool = {
+        "tool_name": "ledger_query",
+        "query": dumps_mongo(plan.model_dump(exclude_none=True)).decode(),
+        "results": summary,
+    }
+    return context, tool
+
+
+def process_global_chat(user_message):
+    """
+    Answer a question across all documents
+
+    Args:
+        user_message: User's message
+
+    Returns:
+        AI response, used tools list
+
+    Raises:
+        CircuitOpen, DeadlineExceeded: Gemini is unavailable or CHAT_DEADLINE ran out
+    """
+    try:
+        with deadline(CHAT_DEADLINE):
+            return _answer_global_question(user_message)
+    except (CircuitOpen, DeadlineExceeded):
+        raise
+    except Exception as e:
+        return f"Error processing your question: {str(e)}", []
+
+
+def _answer_global_question(user_message):
+    plan = plan_query(user_message)
+    context, tool = gather_context(plan)
+
+    prompt = f"""{GLOBAL_CHAT_SYSTEM_PROMPT}
+
+{context}
+
+{conversation_history(None)}
+
+User Question: {user_message}
+"""
+    response = generate_content('gemini-2.0-pro-exp-02-05', prompt, call_site="global_chat_answer")
+    return response.text, [tool]
@@ -0,0 +1,385 @@
+import base64
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.config import (
+    ALLOWED_EXTENSIONS, MAX_UPLOAD_SIZE, MAX_IMPORT_SIZE, MAX_IMPORT_FILES, IMPORT_CONCURRENCY, UPLOAD_DIR,
+    INGEST_DEADLINE, EXTRACTION_MAX_ATTEMPTS, PROGRESS_WRITE_INTERVAL
+)
+from app.models.document import Document, DocumentCreate, documents_collection
+from app.models.import_job import ImportJob
+from app.models.ledger import LedgerRecord
+from app.services.dedup_service import remember_document
+from app.services.document_events import event_bus, result_event
+from app.services.document_processor import DocumentProcessor, extraction_meta, extraction_failed, failure_status
+from app.services.ledger_service import extract_ledger
+from app.services.llm_governor import llm_lane
+from app.services.thumbnail_service import generate_document_thumbnails
+from app.utils.resilience import deadline, gemini_breaker
+from app.utils.storage_codec import decompress_value
+
+
+def file_type_for(filename):
+    """"pdf" or "image", from a file name's extension"""
+    return "pdf" if filename.rsplit(".", 1)[-1].lower() == "pdf" else "image"
+
+
+def document_from_file(contents, filename, doc_type="unknown", title=None):
+    """
+    Wrap an uploaded file as a DocumentCreate ready for processing
+
+    Args:
+        contents: Raw file bytes
+        filename: Original file name (decides image vs PDF)
+        doc_type: Document type if known
+        title: Title if known (the processor generates one either way)
+    """
+    return DocumentCreate(
+        title=title or "Document being processed...",  # Temporary title
+        doc_type=doc_type or "unknown",
+        image_base64=base64.b64encode(contents).decode(),
+        file_type=file_type_for(filename)
+    )
+
+
+def ingest_document(document, page_images=None):
+    """
+    Run a new document through extraction, store it and render its thumbnails
+
+    This is the one ingestion path shared by single uploads, batch uploads
+    and archive imports. Its Gemini calls run in the "ingest" lane, behind chat,
+    within INGEST_DEADLINE. If extraction fails the document is still stored,
+    with extraction_status "failed" or "deferred" (retried later); "partial"
+    if some pages of a multi-photo PDF are deferred (also retried later).
+
+    Args:
+        document: DocumentCreate carrying image_base64
+        page_images: Photos a PDF was combined from, to extract page by page
+
+    Returns:
+        The created MongoDB document
+    """
+    with llm_lane("ingest"), deadline(INGEST_DEADLINE):
+        processed_data = DocumentProcessor().process_document(document, page_images=page_images)
+    created_doc = Document.create_document(processed_data)
+    generate_document_thumbnails(created_doc)
+    return created_doc
+
+
+class ProgressWriter:
+    """
+    Saves and publishes a progressive upload's results as the processor
+    produces them (see DocumentProcessor.process_document's on_progress)
+    """
+
+    def __init__(self, document_id):
+        self.document_id = document_id
+        self.text = []
+        self.last_write = 0.0
+
+    def __call__(self, event, data):
+        if event == "prepared":
+            Document.save_progress(str(self.document_id), dict(data))
+            remember_document(self.document_id, data.get("phash"))
+        elif event == "text":
+            self.text.append(data)
+            event_bus.publish(self.document_id, "text", {"text": data})
+            if time.monotonic() - self.last_write >= PROGRESS_WRITE_INTERVAL:
+                self.last_write = time.monotonic()
+                Document.save_progress(str(self.document_id), {"extracted_text": "".join(self.text)})
+        else:
+            if event == "ledger" and data is not None:
+                data = data.model_dump()
+            event_bus.publish(self.document_id, event, data)
+
+
+def start_progressive_ingest(document):
+    """
+    Store a document straight away, before any processing, and open its
+    event channel; finish it with `finish_progressive_ingest`
+
+    Args:
+        document: DocumentCreate carrying image_base64
+
+    Returns:
+        The stored placeholder, with extraction_status "processing"
+    """
+    placeholder = Document.create_document(document.model_copy(update={"extraction_status": "processing"}))
+    event_bus.open(placeholder["_id"])
+    return placeholder
+
+
+def finish_progressive_ingest(document_id, document, page_images=None):
+    """
+    Process a document stored by `start_progressive_ingest`, writing its
+    text to the record as Gemini streams it and publishing each result
+    (text chunks, ledger, title, type, then "done") to its event channel
+
+    Args:
+        document_id: The placeholder's ObjectId
+        document: The DocumentCreate it was stored from
+        page_images: Photos a PDF was combined from, to extract page by page
+    """
+    try:
+        with llm_lane("ingest"), deadline(INGEST_DEADLINE):
+            processed = DocumentProcessor().process_document(document, ProgressWriter(document_id), page_images)
+        update = processed.model_dump(by_alias=True)
+        update["extraction_status"] = processed.extraction_status or "done"
+        updated_doc = Document.update_document(str(document_id), update)
+        generate_document_thumbnails(updated_doc)
+        event_bus.publish(document_id, "done", result_event(updated_doc))
+    except Exception as e:
+        print(f"Error processing document {document_id}: {e}")
+        Document.update_document(str(document_id), {"extraction_status": "failed", "extraction_error": str(e)[:500]})
+        event_bus.publish(document_id, "error", {"detail": str(e)})
+
+
+def recover_interrupted_ingests():
+    """
+    Defer progressive uploads left "processing" by a worker that stopped,
+    so the extraction retry picks them up
+
+    Returns:
+        Number of documents deferred
+    """
+    cutoff = datetime.now() - timedelta(seconds=2 * INGEST_DEADLINE)
+    result = documents_collection.update_many(
+        {"extraction_status": "processing", "updated_at": {"$lt": cutoff}},
+        {"$set": {"extraction_status": "deferred", "extraction_error": "Processing was interrupted"}}
+    )
+    return result.modified_count
+
+
+def reextract_document(document, stages=("text", "ledger", "title", "doc_type")):
+    """
+    Re-run extraction stages on a stored document and save the result
+
+    If the text cannot be extracted, only a document without a usable
+    extraction gets the failure as its extraction_status; one that has text
+    keeps it, its status and its title, with the error in reextraction_error.
+
+    Args:
+        document: Stored document with image_base64 and file_type (for "text")
+            or extracted_text, and doc_type and ledger (for "title"), and
+            extraction_status
+        stages: Any of "text", "ledger", "title", "doc_type"
+
+    Returns:
+        True if the document was updated with a new extraction
+    """
+    processor = DocumentProcessor()
+    update = {}
+    text = decompress_value(document.get("extracted_text")) or ""
+
+    with llm_lane("ingest"), deadline(INGEST_DEADLINE):
+        if "text" in stages:
+            try:
+                if document.get("file_type") == "pdf":
+                    text = processor.extract_text_from_pdf(document["image_base64"])
+                else:
+                    text = processor.extract_text_from_image(base64.b64decode(document["image_base64"]))
+            except Exception as e:
+                status = failure_status(e)
+                print(f"{document['_id']}: extraction {status}: {e}")
+                if extraction_failed(document):
+                    failure = {"extraction_status": status, "extraction_error": str(e)[:500]}
+                else:
+                    failure = {"reextraction_error": str(e)[:500]}
+                Document.update_document(str(document["_id"]), failure)
+                return False
+            update["extracted_text"] = text
+            update["extraction_meta"] = extraction_meta()
+            update["extraction_status"] = "done"
+            update["extraction_error"] = None
+            if document.get("reextraction_error"):
+                update["reextraction_error"] = None
+
+        ledger = LedgerRecord.model_validate(document["ledger"]) if document.get("ledger") else None
+        if "ledger" in stages:
+            ledger = extract_ledger(text)
+            update["ledger"] = ledger.model_dump() if ledger else None
+        if "doc_type" in stages:
+            update["doc_type"] = processor.detect_document_type(text)
+        if "title" in stages:
+            update["title"] = processor.generate_document_title(
+                text, update.get("doc_type", document.get("doc_type", "unknown")), ledger)
+
+    if update:
+        Document.update_document(str(document["_id"]), update)
+    return bool(update)
+
+
+def refresh_ledger(document_id, text_version):
+    """
+    Re-extract the ledger of a document whose text was edited
+
+    Skipped if the text has been edited again since (that edit schedules its
+    own refresh), so an older ledger never overwrites a newer one.
+
+    Args:
+        document_id: The document's id
+        text_version: The text_version the edit produced
+
+    Returns:
+        True if the ledger was updated
+    """
+    current = {"_id": ObjectId(document_id), "text_version": text_version}
+    document = documents_collection.find_one(current, {"extracted_text": 1})
+    if not document:
+        return False
+    with llm_lane("ingest"), deadline(INGEST_DEADLINE):
+        ledger = extract_ledger(decompress_value(document.get("extracted_text")))
+    if not documents_collection.count_documents(current, limit=1):
+        return False
+    Document.update_document(str(document_id), {"ledger": ledger.model_dump() if ledger else None})
+    return True
+
+
+def retry_deferred_extractions(limit=20):
+    """
+    Re-extract documents whose extraction was deferred because Gemini was
+    unavailable, up to EXTRACTION_MAX_ATTEMPTS tries each
+
+    "partial" documents (some pages deferred) are extracted again as a whole
+    from their stored PDF; the pages they already have are kept until that
+    succeeds.
+
+    Returns:
+        Number of documents extracted
+    """
+    recover_interrupted_ingests()
+    attempted = extracted = 0
+    # One query per status, so each uses its partial index
+    for status in ("deferred", "partial"):
+        if gemini_breaker.is_open or attempted >= limit:
+            break
+        cursor = documents_collection.find(
+            {"extraction_status": status, "extraction_attempts": {"$not": {"$gte": EXTRACTION_MAX_ATTEMPTS}}},
+            {"image_base64": 1, "file_type": 1, "doc_type": 1, "ledger": 1, "extraction_status": 1,
+             "reextraction_error": 1}
+        ).sort("_id", 1).limit(limit - attempted)
+
+        for document in cursor:
+            attempted += 1
+            documents_collection.update_one({"_id": document["_id"]}, {"$inc": {"extraction_attempts": 1}})
+            stages = ["text", "ledger", "title"] + (["doc_type"] if document.get("doc_type", "unknown") == "unknown" else [])
+            if reextract_document(document, stages):
+                extracted += 1
+            elif gemini_breaker.is_open:
+                break
+    return extracted
+
+
+def save_upload(source, max_size=MAX_IMPORT_SIZE, chunk_size=1024 * 1024):
+    """
+    Copy an uploaded file to a temporary file in UPLOAD_DIR, chunk by chunk
+
+    The request's own spooled file is closed when the response is sent, so
+    archives processed in the background need their own copy.
+
+    Returns:
+        Path of the copy (the caller deletes it)
+
+    Raises:
+        ValueError: The upload is larger than max_size
+    """
+    copied = 0
+    with tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, suffix=".zip", delete=False) as target:
+        try:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                copied += len(chunk)
+                if copied > max_size:
+                    raise ValueError(f"Archive is larger than {max_size // (1024 * 1024)}MB")
+                target.write(chunk)
+        except Exception:
+            target.close()
+            os.remove(target.name)
+            raise
+    return target.name
+
+
+def scan_archive(path):
+    """
+    List the members of a zip archive that can be imported
+
+    Only the central directory is read. Folders, hidden files and macOS
+    metadata are left out; unsupported or oversized files are listed as
+    skipped so they show up in the job report.
+
+    Returns:
+        List of {"name", "size", "status"} entries, status "pending" or "skipped"
+
+    Raises:
+        zipfile.BadZipFile: Not a zip archive
+        ValueError: Too many files
+    """
+    entries = []
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            basename = os.path.basename(info.filename)
+            if info.is_dir() or not basename or basename.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            entry = {"name": info.filename, "size": info.file_size, "status": "pending"}
+            extension = basename.rsplit(".", 1)[-1].lower() if "." in basename else ""
+            if extension not in ALLOWED_EXTENSIONS:
+                entry.update(status="skipped", error="Unsupported file type")
+            elif info.file_size > MAX_UPLOAD_SIZE:
+                entry.update(status="skipped", error=f"Larger than {MAX_UPLOAD_SIZE // (1024 * 1024)}MB")
+            entries.append(entry)
+
+    if len(entries) > MAX_IMPORT_FILES:
+        raise ValueError(f"Archive has {len(entries)} files; the limit is {MAX_IMPORT_FILES}")
+    return entries
+
+
+def _import_member(job_id, archive, index, entry, doc_type):
+    try:
+        # Members are read one at a time by each worker, so at most
+        # IMPORT_CONCURRENCY files are held in memory
+        with archive.open(entry["name"]) as member:
+            contents = member.read(MAX_UPLOAD_SIZE + 1)
+        if len(contents) > MAX_UPLOAD_SIZE:
+            raise ValueError(f"Larger than {MAX_UPLOAD_SIZE // (1024 * 1024)}MB")
+
+        created_doc = ingest_document(document_from_file(contents, entry["name"], doc_type))
+        if extraction_failed(created_doc):
+            ImportJob.update_file(job_id, index, "failed", created_doc["_id"], created_doc.get("extraction_error"))
+        else:
+            ImportJob.update_file(job_id, index, "done", created_doc["_id"])
+    except Exception as e:
+        print(f"Error importing {entry['name']}: {e}")
+        ImportJob.update_file(job_id, index, "failed", error=str(e))
+
+
+def run_import(job_id, path, entries, doc_type="unknown"):
+    """
+    Ingest every pending member of an archive with bounded parallelism,
+    recording per-file progress on the import job; deletes the archive when done
+
+    Args:
+        job_id: _id of the ImportJob
+        path: Archive path from save_upload
+        entries: Entries from scan_archive (in the same order as on the job)
+        doc_type: Document type for every file, if known
+    """
+    try:
+        with zipfile.ZipFile(path) as archive, ThreadPoolExecutor(IMPORT_CONCURRENCY) as pool:
+            futures = [
+                pool.submit(_import_member, job_id, archive, index, entry, doc_type)
+                for index, entry in enumerate(entries) if entry["status"] == "pending"
+            ]
+            for future in futures:
+                future.result()
+        ImportJob.finish(job_id)
+    except Exception as e:
+        print(f"Error running import {job_id}: {e}")
+        ImportJob.finish(job_id, "failed", str(e))
+    finally:
+        os.remove(path)
@@ -0,0 +1,62 @@
+from pydantic import ValidationError
+from app.models.ledger import LedgerRecord
+from app.services.gemini_service import generate_content
+
+LEDGER_CATEGORIES = ["restaurant", "grocery", "fuel", "utilities", "pharmacy", "travel",
+                     "shopping", "entertainment", "services", "other"]
+
+# Prompt for turning extracted markdown into a structured ledger record
+LEDGER_SYSTEM_PROMPT = f"""
+You are a bookkeeping assistant. Read the document text below and return a JSON object
+describing it as a ledger entry, with exactly these keys:
+
+- "vendor": business or organization name, or null
+- "category": one of {", ".join(LEDGER_CATEGORIES)}
+- "date": transaction date as YYYY-MM-DD, or null
+- "currency": ISO 4217 code (e.g. "INR", "USD"), or null
+- "total": final amount paid as a number, or null
+- "tax": total tax as a number, or null
+- "line_items": list of {{"description", "quantity", "unit_price", "amount"}} objects
+
+Use numbers without currency symbols or thousands separators. Use null for anything
+the document does not state. Return only the JSON object.
+
+Document text:
+"""
+
+# Ledgers are read from the start of the text; totals sit near the top or bottom of receipts
+MAX_LEDGER_INPUT_CHARS = 12000
+
+
+def extract_ledger(extracted_text):
+    """
+    Extract a structured ledger record from a document's markdown
+
+    Args:
+        extracted_text: The markdown extracted from the document
+
+    Returns:
+        LedgerRecord, or None if the text is empty or the model output
+        does not validate
+    """
+    if not extracted_text:
+        return None
+
+    if len(extracted_text) > MAX_LEDGER_INPUT_CHARS:
+        half = MAX_LEDGER_INPUT_CHARS // 2
+        extracted_text = extracted_text[:half] + "\n...\n" + extracted_text[-half:]
+
+    try:
+        response = generate_content(
+            'gemini-2.0-flash',
+            LEDGER_SYSTEM_PROMPT + extracted_text,
+            call_site="ledger",
+            generation_config={"response_mime_type": "application/json"}
+        )
+        return LedgerRecord.model_validate_json(response.text)
+    except ValidationError as e:
+        print(f"Ledger output did not validate: {e}")
+        return None
+    except Exception as e:
+        print(f"Error extracting ledger: {e}")
+        return None
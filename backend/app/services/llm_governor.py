@@ -0,0 +1,215 @@
+"""
+Admission control for Gemini calls
+
+Every generate_content call waits here for a free concurrency slot and for
+its model's requests-per-minute and tokens-per-minute budgets, so a burst of
+uploads or a backfill cannot use up the quota that interactive chat needs.
+
+Waiting calls are served by lane, then in arrival order:
+
+    interactive   chat and other requests a user is waiting on (the default)
+    ingest        extraction of new uploads and archive imports
+    backfill      maintenance scripts (re-extraction, ledger backfill)
+
+Buckets are per process; limits are set with LLM_RATE_LIMITS.
+"""
+import bisect
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from app.config import LLM_MAX_CONCURRENCY, LLM_QUEUE_TIMEOUT, LLM_RATE_LIMITS
+from app.utils.metrics import LLM_QUEUE_DEPTH, LLM_QUEUE_SECONDS, LLM_QUEUE_TIMEOUTS, LLM_TOKENS
+from app.utils.resilience import DeadlineExceeded, time_left
+
+LANES = ("interactive", "ingest", "backfill")
+
+_lane = contextvars.ContextVar("llm_lane", default=None)
+_default_lane = "interactive"
+
+
+class QueueTimeout(DeadlineExceeded):
+    """A call waited longer than LLM_QUEUE_TIMEOUT (or its deadline) for its turn"""
+
+
+def current_lane():
+    return _lane.get() or _default_lane
+
+
+def set_default_lane(lane):
+    """Lane for calls that set none, e.g. "backfill" for a script's worker threads"""
+    global _default_lane
+    if lane not in LANES:
+        raise ValueError(f"Unknown lane: {lane}")
+    _default_lane = lane
+
+
+@contextmanager
+def llm_lane(lane):
+    """
+    Run the Gemini calls made in this block in `lane`
+
+    A block never raises its priority: entering "ingest" from a backfill
+    script stays in "backfill".
+    """
+    if lane not in LANES:
+        raise ValueError(f"Unknown lane: {lane}")
+    token = _lane.set(max(lane, current_lane(), key=LANES.index))
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def parse_rate_limits(spec):
+    """
+    Parse "model=rpm:tpm,...,*=rpm:tpm" into {model: (rpm, tpm)}
+
+    "*" applies to models not listed; 0 means unlimited.
+    """
+    limits = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        model, _, values = item.partition("=")
+        rpm, _, tpm = values.partition(":")
+        limits[model.strip()] = (int(rpm or 0), int(tpm or 0))
+    return limits
+
+
+class TokenBucket:
+    """Refills continuously up to `per_minute`; 0 means unlimited"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount, now):
+        """Seconds until `amount` is available (requests larger than the bucket wait for a full one)"""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        """Remove `amount`; negative amounts give back an over-estimate. The level may go below zero."""
+        if self.capacity:
+            self.level = min(self.capacity, self.level - amount)
+
+
+class LLMGovernor:
+    """Concurrency slots and per-model token buckets, granted by lane priority"""
+
+    def __init__(self, max_concurrency, rate_limits, queue_timeout=0):
+        self.max_concurrency = max_concurrency
+        self.rate_limits = rate_limits
+        self.queue_timeout = queue_timeout
+        self.buckets = {}
+        self.in_flight = 0
+        self.waiting = []  # Sorted (lane index, arrival, model, tokens)
+        self.arrivals = itertools.count()
+        self.condition = threading.Condition()
+
+    def _buckets(self, model):
+        if model not in self.buckets:
+            rpm, tpm = self.rate_limits.get(model, self.rate_limits.get("*", (0, 0)))
+            self.buckets[model] = (TokenBucket(rpm), TokenBucket(tpm))
+        return self.buckets[model]
+
+    def _rate_delay(self, model, tokens, now):
+        requests, token_bucket = self._buckets(model)
+        return max(requests.delay(1, now), token_bucket.delay(tokens, now))
+
+    def _admission_delay(self, waiter, now):
+        """
+        0 if `waiter` may start now, seconds until its model's budget refills,
+        or None if it has to wait for a slot or for callers ahead of it
+        """
+        free = self.max_concurrency - self.in_flight
+        if free <= 0:
+            return None
+        models_ahead = set()
+        for other in self.waiting:
+            if other is waiter:
+                break
+            if other[2] == waiter[2]:
+                return None  # Earlier or higher-priority call for the same model goes first
+            if other[2] not in models_ahead:
+                models_ahead.add(other[2])
+                if self._rate_delay(other[2], other[3], now) == 0:
+                    free -= 1  # It can start now and will take a slot
+        if free <= 0:
+            return None
+        return self._rate_delay(waiter[2], waiter[3], now)
+
+    def acquire(self, model, tokens, lane=None):
+        """
+        Block until a call to `model` using about `tokens` tokens may start
+
+        Raises:
+            QueueTimeout: waited longer than queue_timeout (never for backfill)
+                or past the current request deadline
+        """
+        lane = lane or current_lane()
+        waiter = (LANES.index(lane), next(self.arrivals), model, tokens)
+        timeout = self.queue_timeout if lane != "backfill" else 0
+        left = time_left()
+        if left is not None:
+            timeout = min(timeout, max(left, 0.001)) if timeout else max(left, 0.001)
+        started = time.monotonic()
+
+        with self.condition:
+            bisect.insort(self.waiting, waiter)
+            LLM_QUEUE_DEPTH.inc((lane,))
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._admission_delay(waiter, now)
+                    if delay == 0:
+                        break
+                    if timeout:
+                        remaining = started + timeout - now
+                        if remaining <= 0:
+                            LLM_QUEUE_TIMEOUTS.inc((lane,))
+                            raise QueueTimeout(f"Gave up waiting for {model} after {timeout:g}s")
+                        delay = min(delay, remaining) if delay is not None else remaining
+                    self.condition.wait(delay)
+
+                requests, token_bucket = self._buckets(model)
+                requests.take(1)
+                token_bucket.take(tokens)
+                self.in_flight += 1
+            finally:
+                self.waiting.remove(waiter)
+                LLM_QUEUE_DEPTH.dec((lane,))
+                self.condition.notify_all()
+
+        LLM_QUEUE_SECONDS.observe(time.monotonic() - started, (lane, model))
+
+    def release(self, model, tokens, used_tokens=None):
+        """
+        Free the call's slot and correct the token bucket with the usage the API reported
+
+        Args:
+            model: Model passed to acquire
+            tokens: Estimate passed to acquire
+            used_tokens: Actual total tokens, if known
+        """
+        LLM_TOKENS.inc((model,), used_tokens or tokens)
+        with self.condition:
+            if used_tokens:
+                self._buckets(model)[1].take(used_tokens - tokens)
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+
+governor = LLMGovernor(LLM_MAX_CONCURRENCY, parse_rate_limits(LLM_RATE_LIMITS), LLM_QUEUE_TIMEOUT)
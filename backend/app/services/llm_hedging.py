@@ -0,0 +1,154 @@
+"""
+Hedged Gemini requests
+
+With LLM_HEDGING on, a call from one of HEDGE_CALL_SITES that has not
+returned by the HEDGE_PERCENTILE latency of recent calls from the same
+call-site and model is sent a second time, and whichever answer arrives
+first is used. HEDGE_BUDGET caps the extra calls as a fraction of all calls.
+
+Latency is measured from the moment a call has its governor slot, so time
+spent queued behind other calls never makes a call look slow. The caller
+waits for its own slot on its own thread, in its own lane; only calls that
+already hold a slot, and the duplicates, run in the hedge pool.
+
+A Python thread cannot be interrupted, so the slower call is abandoned
+rather than aborted: its result is dropped and its governor slot is freed
+when it returns. A duplicate still waiting for a slot when the first answer
+arrives is not sent.
+"""
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import perf_counter
+
+from app.config import HEDGE_BUDGET, HEDGE_CALL_SITES, HEDGE_PERCENTILE, LLM_HEDGING, LLM_MAX_CONCURRENCY
+from app.utils.metrics import LLM_HEDGES
+
+# Hedge credit that can be saved up during quiet periods, in calls
+MAX_HEDGE_CREDIT = 10.0
+
+
+class LatencyWindow:
+    """The most recent successful call latencies for one call-site and model"""
+
+    def __init__(self, size=200, min_samples=20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p):
+        """The p-th percentile in seconds, or None until there are min_samples"""
+        with self.lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class Hedger:
+    """Runs a call, and a duplicate if the first is slow, keeping the first answer"""
+
+    def __init__(self, enabled=LLM_HEDGING, call_sites=HEDGE_CALL_SITES, percentile=HEDGE_PERCENTILE,
+                 budget=HEDGE_BUDGET, max_workers=2 * LLM_MAX_CONCURRENCY):
+        self.enabled = enabled
+        self.call_sites = set(call_sites)
+        self.percentile = percentile
+        self.budget = budget
+        self.max_workers = max_workers
+        self.credit = 0.0
+        self.issued = 0
+        self.outstanding = 0  # Duplicates not yet finished
+        self.windows = {}
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def _window(self, key):
+        with self.lock:
+            if key not in self.windows:
+                self.windows[key] = LatencyWindow()
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="llm-hedge")
+            # Every call earns a fraction of a hedge
+            self.credit = min(MAX_HEDGE_CREDIT, self.credit + self.budget)
+            return self.windows[key]
+
+    def _take_credit(self):
+        with self.lock:
+            # Half the pool is kept for calls that already hold a governor slot
+            if self.credit < 1 or self.outstanding >= self.max_workers // 2:
+                return False
+            self.credit -= 1
+            self.issued += 1
+            self.outstanding += 1
+            return True
+
+    def _hedge_done(self, future):
+        with self.lock:
+            self.outstanding -= 1
+
+    @staticmethod
+    def _timed(fn, window):
+        started = perf_counter()
+        result = fn()
+        window.add(perf_counter() - started)
+        return result
+
+    def call(self, call_site, model_name, fn, duplicate):
+        """
+        Call fn(), hedged with duplicate() if enabled for this call-site
+
+        Args:
+            call_site: Call-site label; only HEDGE_CALL_SITES are hedged
+            model_name: Model, so each model's latency is tracked separately
+            fn: Sends the call; the caller already holds its governor slot
+            duplicate: duplicate(settled) sends the call again, waiting for a
+                governor slot of its own, and should not send it once the
+                `settled` Event is set (the first answer has arrived)
+
+        Returns:
+            The first successful result (errors are raised once every attempt failed)
+        """
+        if not self.enabled or call_site not in self.call_sites:
+            return fn()
+
+        window = self._window((call_site, model_name))
+        threshold = window.percentile(self.percentile)
+        if threshold is None:
+            # Nothing to compare against yet: no need to leave the caller's thread
+            return self._timed(fn, window)
+
+        # The caller's context (lane, deadline) goes along to the pool
+        primary = self.pool.submit(contextvars.copy_context().run, self._timed, fn, window)
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+        if not self._take_credit():
+            LLM_HEDGES.inc((call_site, "over_budget"))
+            return primary.result()
+
+        LLM_HEDGES.inc((call_site, "issued"))
+        settled = threading.Event()
+        hedge = self.pool.submit(contextvars.copy_context().run, duplicate, settled)
+        hedge.add_done_callback(self._hedge_done)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    settled.set()
+                    if future is hedge:
+                        LLM_HEDGES.inc((call_site, "won"))
+                    for other in pending:
+                        other.cancel()  # Only stops it if it has not started yet
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+
+hedger = Hedger()
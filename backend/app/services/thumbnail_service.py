@@ -0,0 +1,52 @@
+import base64
+from app.config import THUMBNAIL_SIZES, THUMBNAIL_QUALITY
+from app.models.document import documents_collection
+from app.models.thumbnail import Thumbnail
+from app.utils.thumbnail_utils import make_thumbnails
+
+
+def generate_document_thumbnails(document):
+    """
+    Generate and store the thumbnails of a document
+
+    Args:
+        document: MongoDB document with image_base64 and file_type
+
+    Returns:
+        List of sizes that were generated (empty if the document has no image
+        or rendering failed)
+    """
+    if not document or not document.get("image_base64"):
+        return []
+
+    try:
+        file_bytes = base64.b64decode(document["image_base64"])
+        thumbnails = make_thumbnails(
+            file_bytes,
+            document.get("file_type", "image"),
+            THUMBNAIL_SIZES,
+            quality=THUMBNAIL_QUALITY
+        )
+        Thumbnail.save_thumbnails(document["_id"], thumbnails)
+
+        # Record what exists so clients and the backfill know without a lookup
+        sizes = sorted(thumbnails)
+        documents_collection.update_one(
+            {"_id": document["_id"]},
+            {"$set": {"thumbnail_sizes": sizes}}
+        )
+        return sizes
+    except Exception as e:
+        print(f"Error generating thumbnails for {document.get('_id')}: {e}")
+        return []
+
+
+def pick_thumbnail_size(requested):
+    """Smallest configured size that covers the requested size (largest if none do)"""
+    sizes = sorted(THUMBNAIL_SIZES)
+    if requested is None:
+        return sizes[0]
+    for size in sizes:
+        if size >= requested:
+            return size
+    return sizes[-1]
@@ -0,0 +1,81 @@
+import hashlib
+import re
+from difflib import SequenceMatcher
+
+# Chunks close on a paragraph whose hash picks it as a boundary, once they are
+# at least MIN_CHUNK_CHARS long (about one in BOUNDARY_ODDS paragraphs), and are
+# cut at MAX_CHUNK_CHARS. Boundaries depend only on the paragraph itself, so an
+# edit changes the chunk it falls in and leaves the rest of the document alone.
+MIN_CHUNK_CHARS = 400
+MAX_CHUNK_CHARS = 2000
+BOUNDARY_ODDS = 3
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def split_chunks(text):
+    """
+    Split markdown into content-defined chunks of whole paragraphs
+
+    Returns:
+        List of chunk strings; joined with blank lines they give the text back
+        up to whitespace between paragraphs
+    """
+    chunks, current, size = [], [], 0
+    for paragraph in _PARAGRAPH_BREAK.split(text or ""):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > MAX_CHUNK_CHARS:
+            # One huge block (e.g. a long table): cut it on line breaks where possible
+            cut = paragraph.rfind("\n", 0, MAX_CHUNK_CHARS)
+            cut = cut if cut > MIN_CHUNK_CHARS else MAX_CHUNK_CHARS
+            if current:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            chunks.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if size and size + len(paragraph) > MAX_CHUNK_CHARS:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(paragraph)
+        size += len(paragraph)
+        if size >= MIN_CHUNK_CHARS and int(_digest(paragraph)[:8], 16) % BOUNDARY_ODDS == 0:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def chunk_hash(chunk):
+    return _digest(chunk)[:16]
+
+
+def diff_chunks(old_hashes, new_chunks):
+    """
+    Changes that turn a stored chunk list into the chunks of a new text
+
+    Args:
+        old_hashes: Hashes of the stored chunks, in order
+        new_chunks: split_chunks() of the new text
+
+    Returns:
+        Dict with "moved" [(old index, new index)] for unchanged chunks whose
+        position changed, "removed" [old index] and "added" [new index]
+    """
+    new_hashes = [chunk_hash(chunk) for chunk in new_chunks]
+    changes = {"moved": [], "removed": [], "added": []}
+    matcher = SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag == "equal":
+            changes["moved"].extend((old, new) for old, new in zip(range(old_start, old_end), range(new_start, new_end))
+                                    if old != new)
+        else:
+            changes["removed"].extend(range(old_start, old_end))
+            changes["added"].extend(range(new_start, new_end))
+    return changes
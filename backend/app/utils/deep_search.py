@@ -0,0 +1,257 @@
+"""
+Deep search: the passages of the top result pages that match the query
+
+Pages are fetched in parallel, at most DEEP_SEARCH_PER_HOST at a time per
+host and DEEP_SEARCH_MAX_BYTES each, and whatever has not arrived within
+DEEP_SEARCH_DEADLINE is left out, so the extra context adds a bounded delay
+to a chat answer. The text blocks of each page are cached by URL, and the
+blocks that best match the query are picked with lxml.
+
+Result links are untrusted: a page (or any redirect on the way to it) whose
+host resolves to a loopback, private, link-local or otherwise non-public
+address is never fetched, so a search result cannot pull internal services
+or cloud metadata into a prompt.
+"""
+import ipaddress
+import re
+import socket
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import parse_qs, urljoin, urlparse
+
+from cachetools import TTLCache
+
+from app.config import (
+    DEEP_SEARCH_CACHE_SIZE, DEEP_SEARCH_CACHE_TTL, DEEP_SEARCH_DEADLINE, DEEP_SEARCH_MAX_BYTES,
+    DEEP_SEARCH_PAGES, DEEP_SEARCH_PASSAGE_CHARS, DEEP_SEARCH_PER_HOST
+)
+from app.utils.metrics import span
+from app.utils.resilience import time_left
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/96.0.4664.110 Safari/537.36")
+
+# Elements whose text is never an answer, and the blocks passages are made of
+_SKIPPED = "//script|//style|//noscript|//nav|//header|//footer|//aside|//form|//svg|//iframe"
+_BLOCKS = "//p|//li|//td|//th|//dd|//dt|//h1|//h2|//h3|//h4|//pre|//blockquote"
+_MIN_BLOCK_CHARS = 20
+_MAX_BLOCK_CHARS = 1200
+
+MAX_REDIRECTS = 3
+# Only for benchmarks against a local page server
+ALLOW_PRIVATE_HOSTS = False
+
+_WORD = re.compile(r"\w{3,}")
+_STOPWORDS = {"the", "and", "for", "are", "what", "how", "with", "from", "this", "that", "which", "does",
+              "typical", "about", "per", "into", "your", "you", "can", "there"}
+
+# URL -> text blocks of the page; [] for pages without text and for failed
+# fetches, so a page that is down or slow does not cost the deadline again
+_page_cache = TTLCache(maxsize=DEEP_SEARCH_CACHE_SIZE, ttl=DEEP_SEARCH_CACHE_TTL)
+_cache_lock = threading.Lock()
+
+_host_slots = defaultdict(lambda: threading.BoundedSemaphore(DEEP_SEARCH_PER_HOST))
+_host_lock = threading.Lock()
+
+
+def _host_slot(host):
+    with _host_lock:
+        return _host_slots[host]
+
+
+def resolve_link(link):
+    """The target URL of a result link (DuckDuckGo wraps them in a redirect), or None"""
+    if not link:
+        return None
+    if link.startswith("//"):
+        link = "https:" + link
+    elif "://" not in link:
+        link = "https://" + link
+    parsed = urlparse(link)
+    if parsed.path.startswith("/l/") and "uddg" in parse_qs(parsed.query):
+        link = parse_qs(parsed.query)["uddg"][0]
+        parsed = urlparse(link)
+    return link if parsed.scheme in ("http", "https") and parsed.netloc else None
+
+
+def check_public_url(url):
+    """
+    Raises ValueError unless the URL is http(s) and every address its host
+    resolves to is public
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError(f"Not an http(s) URL: {url}")
+    if ALLOW_PRIVATE_HOSTS:
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, parsed.port or None)}
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"Cannot resolve {parsed.hostname}: {e}")
+    for address in addresses:
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise ValueError(f"Not a public address: {parsed.hostname} ({address})")
+
+
+def fetch_page(url, expires, max_bytes=DEEP_SEARCH_MAX_BYTES):
+    """
+    Download the start of an HTML page, waiting for a free slot on its host
+
+    Redirects are followed by hand (at most MAX_REDIRECTS), checking each
+    hop with check_public_url.
+
+    Args:
+        url: The page
+        expires: time.monotonic() by which the download must be done
+        max_bytes: Stop reading after this many bytes
+
+    Returns:
+        Tuple of (bytes, encoding)
+
+    Raises:
+        TimeoutError: no host slot or no complete download before `expires`
+        ValueError: a non-public host, too many redirects, or not HTML
+    """
+    import requests
+
+    slot = _host_slot(urlparse(url).netloc)
+    if not slot.acquire(timeout=max(0.0, expires - time.monotonic())):
+        raise TimeoutError(f"No free connection to {urlparse(url).netloc}")
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            check_public_url(url)
+            timeout = expires - time.monotonic()
+            if timeout <= 0:
+                raise TimeoutError("Deep search deadline exceeded")
+            with requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=timeout, stream=True,
+                              allow_redirects=False) as response:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers["Location"])
+                    continue
+                return _read_html(response, expires, max_bytes)
+        raise ValueError(f"Too many redirects fetching {url}")
+    finally:
+        slot.release()
+
+
+def _read_html(response, expires, max_bytes):
+    """Check a response and read the start of its HTML body"""
+    response.raise_for_status()
+    if "html" not in response.headers.get("Content-Type", "text/html"):
+        raise ValueError(f"Not an HTML page: {response.headers.get('Content-Type')}")
+    body = bytearray()
+    for data in response.iter_content(64 * 1024):
+        body += data
+        if len(body) >= max_bytes:
+            break
+        if time.monotonic() > expires:
+            raise TimeoutError("Deep search deadline exceeded")
+    return bytes(body[:max_bytes]), response.encoding
+
+
+def page_blocks(html, encoding=None, base_url=None):
+    """Visible text blocks of an HTML page (paragraphs, list items, cells, headings), in order"""
+    import lxml.html
+
+    parser = lxml.html.HTMLParser(encoding=encoding) if encoding else None
+    try:
+        tree = lxml.html.document_fromstring(html, parser=parser, base_url=base_url)
+    except Exception:
+        return []
+    for element in tree.xpath(_SKIPPED):
+        element.drop_tree()
+
+    blocks, seen = [], set()
+    for element in tree.xpath(_BLOCKS):
+        # A block containing other blocks (e.g. a list item with paragraphs) is left to them
+        if element.xpath(".//p|.//li|.//td"):
+            continue
+        text = " ".join(element.text_content().split())
+        if len(text) >= _MIN_BLOCK_CHARS and text not in seen:
+            seen.add(text)
+            blocks.append(text[:_MAX_BLOCK_CHARS])
+    return blocks
+
+
+def query_terms(query):
+    return {word for word in _WORD.findall(query.lower()) if word not in _STOPWORDS}
+
+
+def relevant_passages(blocks, query, max_chars=DEEP_SEARCH_PASSAGE_CHARS):
+    """
+    The blocks that best match the query, in page order, within max_chars
+
+    Blocks are ranked by how many query terms they contain, then by how often;
+    blocks matching no term are never picked.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return ""
+    scored = []
+    for index, block in enumerate(blocks):
+        words = _WORD.findall(block.lower())
+        matched = terms.intersection(words)
+        if matched:
+            scored.append((len(matched), sum(word in terms for word in words), index))
+    picked, used = [], 0
+    for _, _, index in sorted(scored, reverse=True):
+        if used + len(blocks[index]) > max_chars:
+            continue
+        picked.append(index)
+        used += len(blocks[index])
+    return "\n".join(blocks[index] for index in sorted(picked))
+
+
+def _load_blocks(url, expires):
+    with _cache_lock:
+        blocks = _page_cache.get(url)
+    if blocks is None:
+        try:
+            body, encoding = fetch_page(url, expires)
+            blocks = page_blocks(body, encoding, url)
+        finally:
+            with _cache_lock:
+                _page_cache[url] = blocks or []
+    return blocks
+
+
+def deep_search(query, results, max_pages=DEEP_SEARCH_PAGES, deadline_seconds=DEEP_SEARCH_DEADLINE):
+    """
+    Add the passages of the top result pages that match the query
+
+    Args:
+        query: The search query
+        results: search_duckduckgo() results
+        max_pages: Pages fetched, from the top of the results
+        deadline_seconds: Longest wait for the pages (shortened by the request's deadline)
+
+    Returns:
+        The results, with "passages" set on those whose page arrived in
+        time and had text matching the query
+    """
+    left = time_left()
+    budget = deadline_seconds if left is None else min(deadline_seconds, left)
+    targets = [(result, resolve_link(result.get("link"))) for result in results[:max_pages] if "error" not in result]
+    targets = [(result, url) for result, url in targets if url]
+    if not targets or budget <= 0:
+        return results
+
+    expires = time.monotonic() + budget
+    with span("deep_search"):
+        pool = ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="deep-search")
+        futures = {pool.submit(_load_blocks, url, expires): result for result, url in targets}
+        done, _ = wait(futures, timeout=budget)
+        # Stragglers finish (or time out) on their own; nobody waits for them
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    for future in done:
+        try:
+            passages = relevant_passages(future.result(), query)
+        except Exception as e:
+            print(f"Deep search skipped {resolve_link(futures[future].get('link'))}: {e}")
+            continue
+        if passages:
+            futures[future]["passages"] = passages
+    return results
@@ -0,0 +1,102 @@
+import threading
+from collections import defaultdict
+
+# NumPy is imported on first use so that importing the app does not load it
+
+
+class HammingIndex:
+    """
+    In-memory multi-index hashing table for fixed-length binary hashes
+
+    Hashes are given as lists of signed or unsigned 64-bit words. Each hash
+    is split into radius + 1 disjoint bit chunks, with one exact-match table
+    per chunk. Two hashes within `radius` bits of each other must agree
+    exactly on at least one chunk (pigeonhole), so a query only looks at the
+    rows sharing a chunk and verifies those with a vectorized popcount.
+    """
+
+    def __init__(self, radius=12, bits=256):
+        import numpy as np
+
+        self.radius = radius
+        self.words = bits // 64
+        chunks = radius + 1
+        widths = [bits // chunks + (1 if i < bits % chunks else 0) for i in range(chunks)]
+        shifts = [sum(widths[i + 1:]) for i in range(chunks)]
+        self._chunks = [(shift, (1 << width) - 1) for shift, width in zip(shifts, widths)]
+        self._tables = [defaultdict(list) for _ in self._chunks]
+        self._hashes = np.zeros((1024, self.words), dtype=np.uint64)
+        self._keys = []
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def _unpack(self, words):
+        """Words as a uint64 row and as one Python int (for chunking)"""
+        import numpy as np
+
+        if len(words) != self.words:
+            raise ValueError(f"Expected a {self.words * 64}-bit hash, got {len(words) * 64} bits")
+        unsigned = [word & 0xFFFFFFFFFFFFFFFF for word in words]
+        value = 0
+        for word in unsigned:
+            value = (value << 64) | word
+        return np.array(unsigned, dtype=np.uint64), value
+
+    def add(self, key, words):
+        """Index a hash under key (re-adding a key replaces its hash)"""
+        import numpy as np
+
+        row_words, value = self._unpack(words)
+        with self._lock:
+            if key in self._rows:
+                self._keys[self._rows.pop(key)] = None
+            row = len(self._keys)
+            if row == len(self._hashes):
+                self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+            self._hashes[row] = row_words
+            self._keys.append(key)
+            self._rows[key] = row
+            for table, (shift, mask) in zip(self._tables, self._chunks):
+                table[(value >> shift) & mask].append(row)
+
+    def remove(self, key):
+        """Forget a key (its rows are skipped from then on)"""
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is not None:
+                self._keys[row] = None
+
+    def query(self, words, radius=None):
+        """
+        Keys whose hash is within radius bits of the given hash
+
+        Args:
+            words: Hash as a list of 64-bit words
+            radius: Maximum Hamming distance, at most the index radius
+
+        Returns:
+            List of (key, distance) pairs, nearest first
+        """
+        import numpy as np
+
+        radius = self.radius if radius is None else min(radius, self.radius)
+        row_words, value = self._unpack(words)
+        with self._lock:
+            candidates = [
+                rows for table, (shift, mask) in zip(self._tables, self._chunks)
+                for rows in (table.get((value >> shift) & mask),) if rows
+            ]
+            if not candidates:
+                return []
+            rows = np.unique(np.concatenate([np.asarray(rows, dtype=np.int64) for rows in candidates]))
+            distances = np.bitwise_count(self._hashes[rows] ^ row_words).sum(axis=1)
+            keep = distances <= radius
+            matches = [(self._keys[row], int(distance))
+                       for row, distance in zip(rows[keep].tolist(), distances[keep].tolist())]
+        return sorted((match for match in matches if match[0] is not None), key=lambda match: match[1])
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, key):
+        return key in self._rows
@@ -1,8 +1,10 @@
-from PIL import Image
 import io
 import base64
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+
+# Pillow and NumPy are imported inside each function so that importing the app does not load them
+
+# Longest side of the downsampled copy used to analyse page layout
+ANALYSIS_SIZE = 800
 
 def convert_to_jpg(image_file):
     """
@@ -14,6 +16,7 @@ def convert_to_jpg(image_file):
     Returns:
         BytesIO object containing JPG image
     """
+    from PIL import Image
     img = Image.open(image_file)
     if img.mode != 'RGB':
         img = img.convert('RGB')
@@ -59,6 +62,7 @@ def resize_image_if_needed(img, max_size=1600):
             new_height = max_size
             new_width = int(width * (max_size / height))
         
+        from PIL import Image
         img = img.resize((new_width, new_height), Image.LANCZOS)
     
     return img
@@ -76,6 +80,8 @@ def combine_images_to_pdf(image_buffers):
     if not image_buffers or len(image_buffers) == 0:
         raise ValueError("No images provided to combine into PDF")
     
+    from PIL import Image
+
     # Create a new PDF in memory
     pdf_buffer = io.BytesIO()
     
@@ -109,4 +115,297 @@ def combine_images_to_pdf(image_buffers):
         
         return pdf_buffer
     except Exception as e:
-        raise ValueError(f"Failed to combine images into PDF: {str(e)}")
\ No newline at end of file
+        raise ValueError(f"Failed to combine images into PDF: {str(e)}")
+
+def _otsu_threshold(gray):
+    """Otsu's threshold for a uint8 grayscale array"""
+    import numpy as np
+
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    hist /= hist.sum()
+    levels = np.arange(256)
+    weight = np.cumsum(hist)
+    cumulative_mean = np.cumsum(hist * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (cumulative_mean[-1] * weight - cumulative_mean) ** 2 / (weight * (1 - weight))
+    return int(np.nanargmax(between))
+
+def find_document_bounds(gray, min_area=0.04, margin=0.02):
+    """
+    Locate a bright page on a darker background
+    
+    Rows and columns count as page when they hold at least half as much page
+    as the fullest row/column, so narrow receipts are found as well as full
+    sheets.
+    
+    Args:
+        gray: uint8 grayscale array
+        min_area: Smallest plausible page, as a fraction of the image
+        margin: Padding kept around the page, as a fraction of each side
+        
+    Returns:
+        (left, top, right, bottom) in array coordinates, or None when there is
+        no distinct page (flat scans, or the page fills the frame)
+    """
+    import numpy as np
+
+    page = gray > _otsu_threshold(gray)
+    border = np.concatenate([page[0], page[-1], page[:, 0], page[:, -1]])
+    if border.mean() > 0.5:
+        return None
+
+    row_coverage, col_coverage = page.mean(axis=1), page.mean(axis=0)
+    rows = np.flatnonzero(row_coverage > max(0.5 * row_coverage.max(), 0.05))
+    cols = np.flatnonzero(col_coverage > max(0.5 * col_coverage.max(), 0.05))
+    if rows.size == 0 or cols.size == 0:
+        return None
+
+    height, width = gray.shape
+    pad_y, pad_x = int(height * margin), int(width * margin)
+    top, bottom = max(rows[0] - pad_y, 0), min(rows[-1] + 1 + pad_y, height)
+    left, right = max(cols[0] - pad_x, 0), min(cols[-1] + 1 + pad_x, width)
+
+    # Implausibly small pages are detection failures, not documents
+    if (bottom - top) * (right - left) < min_area * height * width:
+        return None
+    return left, top, right, bottom
+
+def page_mask(gray, inset=2):
+    """
+    Pixels inside the page: between the first and last bright pixel of both
+    their row and their column
+    
+    Keeps the background around a photographed page (and the corners a
+    rotation exposes) out of the ink statistics.
+    
+    Args:
+        gray: uint8 grayscale array
+        inset: Pixels trimmed off each span to drop the page edge itself
+        
+    Returns:
+        Boolean array shaped like gray
+    """
+    import numpy as np
+
+    paper = gray > _otsu_threshold(gray)
+
+    def spans(bright):
+        found = bright.any(axis=1)
+        first = np.where(found, bright.argmax(axis=1), bright.shape[1])
+        last = np.where(found, bright.shape[1] - 1 - bright[:, ::-1].argmax(axis=1), -1)
+        return first + inset, last - inset
+
+    row_first, row_last = spans(paper)
+    col_first, col_last = spans(paper.T)
+    xs = np.arange(gray.shape[1])[None, :]
+    ys = np.arange(gray.shape[0])[:, None]
+    return ((xs >= row_first[:, None]) & (xs <= row_last[:, None])
+            & (ys >= col_first[None, :]) & (ys <= col_last[None, :]))
+
+def _ink(gray, mask=None):
+    """Dark (text) pixels, thresholded on the page pixels only"""
+    if mask is None:
+        return gray < _otsu_threshold(gray)
+    if not mask.any():
+        return mask
+    return (gray < _otsu_threshold(gray[mask])) & mask
+
+def estimate_skew(gray, mask=None, max_angle=10.0, step=0.5, max_points=20000):
+    """
+    Estimate text skew with a projection profile
+    
+    Ink pixels are projected onto the vertical axis at each candidate angle;
+    the angle whose histogram is sharpest (text lines fall into the fewest
+    rows) wins. A coarse search is refined at a tenth of the step.
+    
+    Args:
+        gray: uint8 grayscale array of the page
+        mask: Optional page_mask restricting which pixels count as ink
+        max_angle: Largest skew considered, in degrees
+        step: Coarse search step, in degrees
+        max_points: Ink pixels sampled for the search
+        
+    Returns:
+        Skew in degrees, counter-clockwise positive as in PIL's rotate
+        (rotate by the negative to straighten), 0.0 if there is too little
+        text to tell
+    """
+    import numpy as np
+
+    ys, xs = np.nonzero(_ink(gray, mask))
+    if ys.size < 200:
+        return 0.0
+    if ys.size > max_points:
+        stride = ys.size // max_points + 1
+        ys, xs = ys[::stride], xs[::stride]
+    ys, xs = ys.astype(np.float64), xs.astype(np.float64)
+
+    def best_angle(candidates):
+        radians = np.deg2rad(candidates)[:, None]
+        projected = ys * np.cos(radians) + xs * np.sin(radians)
+        bins = np.rint(projected - projected.min(axis=1, keepdims=True)).astype(np.int64)
+        bin_count = int(bins.max()) + 1
+        offsets = np.arange(len(candidates))[:, None] * bin_count
+        counts = np.bincount((bins + offsets).ravel(), minlength=len(candidates) * bin_count)
+        sharpness = (counts.reshape(len(candidates), bin_count).astype(np.float64) ** 2).sum(axis=1)
+        return float(candidates[int(np.argmax(sharpness))])
+
+    coarse = best_angle(np.arange(-max_angle, max_angle + step / 2, step))
+    return best_angle(np.arange(coarse - step, coarse + step + step / 20, step / 10))
+
+def is_low_chroma(rgb, chroma_threshold=40, max_colored_fraction=0.005):
+    """
+    Whether an image carries no meaningful colour
+    
+    Chroma is measured after removing the median colour, so a warm or cool
+    cast from the lighting does not count as colour.
+    
+    Args:
+        rgb: uint8 array of RGB pixels, shaped (..., 3)
+        chroma_threshold: Per-pixel chroma above which a pixel counts as coloured
+        max_colored_fraction: Fraction of coloured pixels tolerated
+        
+    Returns:
+        True if the image can go to grayscale without losing information
+    """
+    import numpy as np
+
+    pixels = rgb.reshape(-1, 3).astype(np.int16)
+    balanced = pixels - np.median(pixels, axis=0).astype(np.int16)
+    chroma = balanced.max(axis=1) - balanced.min(axis=1)
+    return (chroma > chroma_threshold).mean() < max_colored_fraction
+
+def estimate_line_height(gray, mask=None, min_lines=3):
+    """
+    Median height of text lines, from runs of inked rows
+    
+    Args:
+        gray: uint8 grayscale array of a deskewed page
+        mask: Optional page_mask restricting which pixels count as ink
+        min_lines: Fewest lines needed for a trustworthy estimate
+        
+    Returns:
+        Line height in array pixels, or None
+    """
+    import numpy as np
+
+    ink_rows = _ink(gray, mask).mean(axis=1) > 0.005
+    edges = np.diff(np.concatenate([[0], ink_rows.astype(np.int8), [0]]))
+    heights = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+    heights = heights[heights > 1]  # single rows are noise or rules
+    if heights.size < min_lines:
+        return None
+    return float(np.median(heights))
+
+def preprocess_document_image(img, text_line_height=24, min_size=768, max_size=1600,
+                              grayscale=True):
+    """
+    Shrink a document photo to what the model needs to read it
+    
+    Applies EXIF orientation, crops to the page, deskews, drops colour from
+    low-chroma pages and downscales so a text line is about
+    text_line_height pixels tall. Layout analysis runs on a small copy with
+    NumPy; only the final crop/rotate/resize touch the full image.
+    
+    Args:
+        img: PIL Image
+        text_line_height: Target text line height in pixels
+        min_size: Smallest longest side to scale down to
+        max_size: Largest longest side to keep
+        grayscale: Convert low-chroma pages to grayscale
+        
+    Returns:
+        Processed PIL Image (RGB or L)
+    """
+    import numpy as np
+    from PIL import Image, ImageOps
+
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    analysis = img.copy()
+    analysis.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+    scale = img.width / analysis.width
+    gray = np.asarray(analysis.convert("L"))
+
+    bounds = find_document_bounds(gray)
+    if bounds:
+        img = img.crop(tuple(int(round(edge * scale)) for edge in bounds))
+        analysis = analysis.crop(bounds)
+        gray = np.asarray(analysis.convert("L"))
+    mask = page_mask(gray)
+
+    fill = 255 if img.mode == "L" else (255, 255, 255)
+    skew = estimate_skew(gray, mask)
+    if abs(skew) < 0.3:
+        skew = 0.0
+    else:
+        analysis = analysis.rotate(-skew, resample=Image.BILINEAR, expand=True, fillcolor=fill)
+        gray = np.asarray(analysis.convert("L"))
+        mask_img = Image.fromarray(mask.astype(np.uint8) * 255).rotate(-skew, expand=True, fillcolor=0)
+        mask = np.asarray(mask_img) > 127
+
+    if grayscale and img.mode == "RGB" and is_low_chroma(np.asarray(analysis.convert("RGB"))[mask]):
+        img = img.convert("L")
+        fill = 255
+
+    # Downscale before rotating so the expensive resample runs on fewer pixels
+    longest = max(analysis.size) * scale
+    target = max_size
+    line_height = estimate_line_height(gray, mask)
+    if line_height:
+        target = min(max(longest * text_line_height / (line_height * scale), min_size), max_size)
+    if longest > target:
+        ratio = target / longest
+        img = img.resize((max(int(img.width * ratio), 1), max(int(img.height * ratio), 1)), Image.LANCZOS)
+
+    if skew:
+        img = img.rotate(-skew, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+
+    if bounds:
+        # Now the page is upright, trim the background left around it
+        rows = np.flatnonzero(mask.sum(axis=1) > 0.5 * mask.sum(axis=1).max())
+        cols = np.flatnonzero(mask.sum(axis=0) > 0.5 * mask.sum(axis=0).max())
+        ratio = img.width / analysis.width
+        img = img.crop((int(cols[0] * ratio), int(rows[0] * ratio),
+                        int((cols[-1] + 1) * ratio), int((rows[-1] + 1) * ratio)))
+    return img
+
+def dhash(img, hash_size=16):
+    """
+    Difference hash of an image
+    
+    The image is reduced to (hash_size + 1) x hash_size grayscale and each
+    bit records whether a cell is brighter than its left neighbour, so
+    re-encoding, rescaling and lighting changes leave most bits unchanged.
+    16x16 (256 bits) is needed to tell apart receipts that share a layout;
+    8x8 hashes of text pages collide.
+    
+    Args:
+        img: PIL Image (ideally already cropped and deskewed)
+        hash_size: Cells per side; hash_size ** 2 must be a multiple of 64
+        
+    Returns:
+        The hash as a list of signed 64-bit integers (MongoDB's int64 range)
+    """
+    import numpy as np
+    from PIL import Image
+
+    pixels = np.asarray(img.convert("L").resize((hash_size + 1, hash_size), Image.BOX), dtype=np.int16)
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return bits.view(">i8").astype(np.int64).tolist()
+
+def image_to_jpg(img, quality=85):
+    """
+    Encode a PIL Image as JPEG (grayscale images stay single-channel)
+    
+    Returns:
+        BytesIO object containing JPG image
+    """
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    jpg_buffer = io.BytesIO()
+    img.save(jpg_buffer, format="JPEG", quality=quality, optimize=True)
+    jpg_buffer.seek(0)
+    return jpg_buffer
\ No newline at end of file
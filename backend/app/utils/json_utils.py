@@ -1,22 +1,65 @@
 # filepath: d:\SIDE GIG\KathaGPTv2\backend\app\utils\json_utils.py
+from functools import lru_cache
+from typing import Type
+
+import orjson
 from bson import ObjectId
-from datetime import datetime
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def _mongo_default(value):
+    """orjson fallback for the BSON types it does not know natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps_mongo(obj) -> bytes:
+    """
+    Serialize a MongoDB document (or list of them) straight to JSON bytes
+
+    ObjectId values become strings and datetimes become ISO-8601 strings in
+    the same pass orjson makes over the data, so callers never need to walk
+    a document by hand before returning it.
+    """
+    return orjson.dumps(obj, default=_mongo_default, option=orjson.OPT_NON_STR_KEYS)
+
 
 def serialize_mongo_doc(doc):
     """Convert MongoDB document to a JSON-serializable format"""
     if doc is None:
         return None
-        
-    result = {}
-    for key, value in doc.items():
-        if isinstance(value, ObjectId):
-            result[key] = str(value)
-        elif isinstance(value, datetime):
-            result[key] = value.isoformat()
-        elif isinstance(value, dict):
-            result[key] = serialize_mongo_doc(value)
-        elif isinstance(value, list):
-            result[key] = [serialize_mongo_doc(item) if isinstance(item, dict) else item for item in value]
+    return orjson.loads(dumps_mongo(doc))
+
+
+@lru_cache(maxsize=None)
+def _response_template(model: type) -> tuple:
+    """(key, default) pairs for every field a response model exposes"""
+    template = []
+    for name, field in model.model_fields.items():
+        key = field.alias or name
+        if field.is_required() or field.default_factory is not None:
+            default = None
         else:
-            result[key] = value
-    return result
\ No newline at end of file
+            default = field.default
+        template.append((key, default))
+    return tuple(template)
+
+
+def shape_for_response(doc: dict, model: Type[BaseModel]) -> dict:
+    """
+    Pick the fields of `model` out of a raw MongoDB document
+
+    This gives the same keys a `response_model` would produce, but without
+    running Pydantic validation over large fields like `image_base64`.
+    Nested values are passed through untouched.
+    """
+    return {key: doc.get(key, default) for key, default in _response_template(model)}
+
+
+class MongoJSONResponse(JSONResponse):
+    """JSON response rendered with orjson that understands ObjectId and datetime"""
+
+    def render(self, content) -> bytes:
+        return dumps_mongo(content)
@@ -0,0 +1,253 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition
+
+Metrics are plain dicts keyed by label-value tuples behind a lock, so
+recording a span costs a couple of microseconds and needs no extra
+dependency. `render_metrics()` produces the text format served on /metrics.
+"""
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+from pymongo import monitoring
+
+# Latency buckets in seconds, from sub-millisecond Mongo reads up to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0,
+)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _render_header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set"""
+
+    kind = "counter"
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = self._render_header()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Value that can go up and down (e.g. requests in flight)"""
+
+    kind = "gauge"
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    def set(self, labels=(), value=0):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket counts (not cumulative) + the +Inf bucket, then sum
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def render(self):
+        lines = self._render_header()
+        with self._lock:
+            items = [(labels, list(state)) for labels, state in self._values.items()]
+        bounds = self.buckets + (float("inf"),)
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(bounds, state):
+                cumulative += count
+                le = 'le="' + _format_number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_number(state[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "khatagpt_stage_duration_seconds",
+    "Time spent in a processing stage",
+    ["stage"],
+)
+GEMINI_SECONDS = Histogram(
+    "khatagpt_gemini_request_duration_seconds",
+    "Latency of Gemini generate_content calls",
+    ["call_site", "model"],
+)
+GEMINI_FIRST_CHUNK_SECONDS = Histogram(
+    "khatagpt_gemini_first_chunk_seconds",
+    "Time to the first chunk of streamed Gemini calls",
+    ["call_site", "model"],
+)
+MONGO_SECONDS = Histogram(
+    "khatagpt_mongo_command_duration_seconds",
+    "Latency of MongoDB commands",
+    ["command"],
+)
+STAGE_IN_FLIGHT = Gauge(
+    "khatagpt_stage_in_flight",
+    "Operations currently running per stage",
+    ["stage"],
+)
+STAGE_ERRORS = Counter(
+    "khatagpt_stage_errors_total",
+    "Operations that raised an error per stage",
+    ["stage"],
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "khatagpt_llm_queue_depth",
+    "Gemini calls waiting for the governor per lane",
+    ["lane"],
+)
+LLM_QUEUE_SECONDS = Histogram(
+    "khatagpt_llm_queue_wait_seconds",
+    "Time Gemini calls waited for a slot and rate budget",
+    ["lane", "model"],
+)
+LLM_QUEUE_TIMEOUTS = Counter(
+    "khatagpt_llm_queue_timeouts_total",
+    "Gemini calls that gave up waiting for the governor",
+    ["lane"],
+)
+LLM_TOKENS = Counter(
+    "khatagpt_llm_tokens_total",
+    "Gemini tokens used (reported by the API, else estimated)",
+    ["model"],
+)
+LLM_HEDGES = Counter(
+    "khatagpt_llm_hedges_total",
+    "Hedged Gemini calls: duplicates issued, won by the duplicate, or skipped over budget",
+    ["call_site", "outcome"],
+)
+DOCUMENT_LABELS = Counter(
+    "khatagpt_document_labels_total",
+    "Document types and titles by source (local classifier or template, or Gemini)",
+    ["field", "source"],
+)
+CIRCUIT_STATE = Gauge(
+    "khatagpt_circuit_state",
+    "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)",
+    ["upstream"],
+)
+UPSTREAM_RETRIES_TOTAL = Counter(
+    "khatagpt_upstream_retries_total",
+    "Retried calls to an upstream after a retryable error",
+    ["upstream"],
+)
+
+
+class span:
+    """
+    Time a block of code as one stage
+
+    Records the duration in `histogram` (STAGE_SECONDS by default, labelled
+    with the stage name), tracks it in the in-flight gauge and counts it as
+    an error if the block raises.
+
+    Example:
+        with span("base64_decode"):
+            data = base64.b64decode(payload)
+
+        with span("gemini", GEMINI_SECONDS, ("chat_answer", model_name)):
+            response = model.generate_content(prompt)
+    """
+
+    __slots__ = ("stage", "histogram", "labels", "start")
+
+    def __init__(self, stage, histogram=None, labels=None):
+        self.stage = (stage,)
+        self.histogram = histogram or STAGE_SECONDS
+        self.labels = labels if labels is not None else self.stage
+
+    def __enter__(self):
+        STAGE_IN_FLIGHT.inc(self.stage)
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(perf_counter() - self.start, self.labels)
+        STAGE_IN_FLIGHT.dec(self.stage)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(self.stage)
+        return False
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener that feeds every command into MONGO_SECONDS"""
+
+    _stage = ("mongo",)
+
+    def started(self, event):
+        STAGE_IN_FLIGHT.inc(self._stage)
+
+    def succeeded(self, event):
+        STAGE_IN_FLIGHT.dec(self._stage)
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, (event.command_name,))
+
+    def failed(self, event):
+        STAGE_IN_FLIGHT.dec(self._stage)
+        STAGE_ERRORS.inc(self._stage)
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, (event.command_name,))
+
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,193 @@
+"""
+Deadlines, retries and circuit breakers for outbound calls
+
+An entry point (a chat answer, a document ingest) sets a time budget with
+`deadline()`; every upstream call made inside it gets a timeout of whatever
+is left, capped per upstream. `CircuitBreaker.call()` retries retryable
+errors with jittered exponential backoff within that budget, and after
+repeated failures stops calling the upstream for a cool-down period so
+callers can degrade (skip web search, defer extraction) instead of waiting.
+"""
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from app.config import BREAKER_FAILURES, BREAKER_RESET, UPSTREAM_RETRIES
+from app.utils.metrics import CIRCUIT_STATE, UPSTREAM_RETRIES_TOTAL
+
+# HTTP statuses worth retrying: rate limited, server errors, gateway timeouts
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {
+    "ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout", "ChunkedEncodingError",
+    "ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "ResourceExhausted",
+    "TooManyRequests", "GatewayTimeout", "BadGateway",
+}
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The time budget for the current request ran out"""
+
+
+class CircuitOpen(RuntimeError):
+    """An upstream is failing and is not being called for now"""
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Give the calls made in this block at most `seconds` in total
+
+    Nested deadlines can only shorten the budget, never extend it.
+    """
+    expires = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(min(expires, current) if current else expires)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left():
+    """Seconds left in the current deadline, or None if there is none"""
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+def call_timeout(cap):
+    """
+    Timeout for the next upstream call: the time left, at most `cap`
+
+    Raises:
+        DeadlineExceeded: no time left
+    """
+    left = time_left()
+    if left is None:
+        return cap
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(cap, left)
+
+
+def is_retryable(error):
+    """Timeouts, connection errors, rate limiting and 5xx responses"""
+    if isinstance(error, (CircuitOpen, DeadlineExceeded)):
+        return False
+    status = getattr(error, "code", None)
+    if not isinstance(status, int):
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in RETRYABLE_ERRORS
+
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker
+
+    closed     calls go through; `failure_threshold` consecutive retryable
+               failures open the circuit
+    open       calls fail fast with CircuitOpen for `reset_timeout` seconds
+    half-open  one trial call; success closes the circuit, failure reopens it
+    """
+
+    _STATES = {"closed": 0, "half-open": 1, "open": 2}
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+        CIRCUIT_STATE.set((name,), 0)
+
+    def _set_state(self, state):
+        self.state = state
+        CIRCUIT_STATE.set((self.name,), self._STATES[state])
+
+    @property
+    def is_open(self):
+        """True while calls would be refused (a half-open trial may still go through)"""
+        with self.lock:
+            return self.state == "open" and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self):
+        """Whether a call may go out now; moves an expired open circuit to half-open"""
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state("half-open")
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            if self.state != "closed":
+                self._set_state("closed")
+
+    def release_trial(self):
+        """A half-open trial ended without telling us anything about the upstream; allow another"""
+        with self.lock:
+            if self.state == "half-open":
+                self._set_state("open")
+                self.opened_at = time.monotonic() - self.reset_timeout
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"Circuit for {self.name} opened after {self.failures} failures")
+                self._set_state("open")
+                self.opened_at = time.monotonic()
+
+    def call(self, fn, timeout_cap, retries=UPSTREAM_RETRIES, base_delay=0.5, max_delay=8.0):
+        """
+        Call fn(timeout) with retries, inside the current deadline
+
+        Args:
+            fn: Makes the upstream call; receives the timeout in seconds
+            timeout_cap: Longest timeout for a single attempt
+            retries: Extra attempts after a retryable failure
+            base_delay: Backoff before the first retry (doubles each time, full jitter)
+            max_delay: Longest backoff
+
+        Raises:
+            CircuitOpen: the upstream is failing and was not called
+            DeadlineExceeded: the request's time budget ran out
+            The last upstream error, once retries are used up or it is not retryable
+        """
+        attempt = 0
+        while True:
+            if not self.allow():
+                raise CircuitOpen(f"{self.name} is unavailable, try again shortly")
+            try:
+                result = fn(call_timeout(timeout_cap))
+            except Exception as e:
+                if not is_retryable(e):
+                    self.release_trial()
+                    raise
+                self.record_failure()
+                backoff = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+                left = time_left()
+                if attempt >= retries or (left is not None and left <= backoff):
+                    raise
+                attempt += 1
+                UPSTREAM_RETRIES_TOTAL.inc((self.name,))
+                print(f"Retrying {self.name} in {backoff:.1f}s after: {e}")
+                time.sleep(backoff)
+                continue
+            self.record_success()
+            return result
+
+
+gemini_breaker = CircuitBreaker("gemini")
+search_breaker = CircuitBreaker("search")
@@ -1,6 +1,7 @@
-import requests
-from bs4 import BeautifulSoup
 import json
+from app.config import SEARCH_URL, SEARCH_TIMEOUT
+from app.utils.metrics import span
+from app.utils.resilience import search_breaker
 
 def search_duckduckgo(query, max_results=3):
     """
@@ -13,6 +14,10 @@ def search_duckduckgo(query, max_results=3):
     Returns:
         A list of search results (title, link, snippet)
     """
+    # Imported on first search; BeautifulSoup alone adds ~100ms to app startup
+    import requests
+    from bs4 import BeautifulSoup
+
     try:
         # Format the query for URL
         formatted_query = query.replace(' ', '+')
@@ -22,14 +27,21 @@ def search_duckduckgo(query, max_results=3):
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36'
         }
         
-        # Make the request to DuckDuckGo
-        response = requests.get(
-            f"https://html.duckduckgo.com/html/?q={formatted_query}",
-            headers=headers
-        )
+        def fetch(timeout):
+            response = requests.get(
+                f"{SEARCH_URL}?q={formatted_query}",
+                headers=headers,
+                timeout=timeout
+            )
+            response.raise_for_status()
+            return response.text
         
-        # Parse the HTML response
-        soup = BeautifulSoup(response.text, 'html.parser')
+        with span("web_search"):
+            # Make the request to DuckDuckGo (one retry; search is optional)
+            html = search_breaker.call(fetch, SEARCH_TIMEOUT, retries=1)
+            
+            # Parse the HTML response
+            soup = BeautifulSoup(html, 'html.parser')
         
         # Extract search results
         results = []
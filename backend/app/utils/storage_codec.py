@@ -0,0 +1,86 @@
+import bson
+from bson.binary import Binary
+
+from app.config import STORAGE_COMPRESSION_MIN_SIZE, ZSTD_LEVEL
+
+try:
+    import zstandard
+except ImportError:  # without zstandard new records are stored uncompressed
+    zstandard = None
+
+# Compressed fields are stored as Binary with a user-defined subtype saying
+# what the zstd frame holds: UTF-8 text, or any other value BSON-encoded
+TEXT_SUBTYPE = 0x80
+BSON_SUBTYPE = 0x81
+
+
+def is_compressed(value):
+    return isinstance(value, Binary) and value.subtype in (TEXT_SUBTYPE, BSON_SUBTYPE)
+
+
+def compress_value(value, min_size=None):
+    """
+    A field value as stored: zstd-compressed if it is large, else unchanged
+
+    Args:
+        value: A string, or a list/dict of BSON types (e.g. chat tool results)
+        min_size: Smallest encoded size in bytes worth compressing
+            (default STORAGE_COMPRESSION_MIN_SIZE, 0 disables)
+
+    Returns:
+        Binary holding the compressed value, or the value itself if it is
+        small, empty, already compressed, or does not shrink
+    """
+    min_size = STORAGE_COMPRESSION_MIN_SIZE if min_size is None else min_size
+    if zstandard is None or not min_size or not value or is_compressed(value):
+        return value
+    if isinstance(value, str):
+        # Characters are at least one byte each: short text never qualifies
+        if len(value) < min_size:
+            return value
+        raw, subtype = value.encode(), TEXT_SUBTYPE
+    elif isinstance(value, (list, dict)):
+        raw, subtype = bson.encode({"v": value}), BSON_SUBTYPE
+    else:
+        return value
+    if len(raw) < min_size:
+        return value
+    compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return Binary(compressed, subtype) if len(compressed) < len(raw) else value
+
+
+def decompress_value(value):
+    """The original value of a stored field; values that are not compressed pass through"""
+    if not is_compressed(value):
+        return value
+    if zstandard is None:
+        raise RuntimeError("The zstandard package is needed to read compressed fields")
+    raw = zstandard.ZstdDecompressor().decompress(bytes(value))
+    return raw.decode() if value.subtype == TEXT_SUBTYPE else bson.decode(raw)["v"]
+
+
+def compress_fields(doc, fields):
+    """Compress the given top-level fields of a dict in place; returns the dict"""
+    for field in fields:
+        if doc.get(field):
+            doc[field] = compress_value(doc[field])
+    return doc
+
+
+def decompress_fields(doc, fields=None):
+    """
+    Decompress top-level fields of a dict read from MongoDB in place
+
+    Args:
+        doc: The record, or None
+        fields: Field names to check (default: every field)
+
+    Returns:
+        The same dict (or None)
+    """
+    if doc is None:
+        return None
+    for field in (doc if fields is None else fields):
+        if is_compressed(doc.get(field)):
+            doc[field] = decompress_value(doc[field])
+    return doc
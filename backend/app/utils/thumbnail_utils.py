@@ -0,0 +1,65 @@
+import io
+
+# Pillow and PyMuPDF are imported on first use to keep app startup fast
+
+
+def render_pdf_first_page(pdf_bytes, max_size):
+    """
+    Rasterize the first page of a PDF
+
+    Args:
+        pdf_bytes: Raw PDF bytes
+        max_size: Target size of the longest side in pixels
+
+    Returns:
+        PIL Image of page one in RGB mode
+    """
+    import fitz  # PyMuPDF
+    from PIL import Image
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf:
+        if pdf.page_count == 0:
+            raise ValueError("PDF has no pages")
+        page = pdf[0]
+
+        # Render straight at thumbnail scale instead of rasterizing at 72dpi and resizing
+        zoom = max_size / max(page.rect.width, page.rect.height)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def make_thumbnails(file_bytes, file_type, sizes, quality=70):
+    """
+    Produce WebP thumbnails of a document at several sizes
+
+    Args:
+        file_bytes: Raw image or PDF bytes
+        file_type: "pdf" or "image"
+        sizes: Longest-side sizes in pixels
+        quality: WebP quality (0-100)
+
+    Returns:
+        Dict mapping each size to its WebP bytes
+    """
+    from PIL import Image
+
+    sizes = sorted(sizes, reverse=True)
+
+    if file_type == "pdf":
+        img = render_pdf_first_page(file_bytes, sizes[0])
+    else:
+        img = Image.open(io.BytesIO(file_bytes))
+        # Decode at reduced scale when the format supports it (JPEG draft mode)
+        img.draft("RGB", (sizes[0], sizes[0]))
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+
+    thumbnails = {}
+    # Shrink from the largest size down so each step resizes a small image
+    for size in sizes:
+        img.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format="WEBP", quality=quality, method=4)
+        thumbnails[size] = buffer.getvalue()
+
+    return thumbnails
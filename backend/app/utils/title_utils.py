@@ -0,0 +1,118 @@
+import re
+from datetime import datetime
+
+MAX_TITLE_LENGTH = 60
+
+# Headings and labels that name the document rather than who issued it
+_GENERIC_NAMES = re.compile(
+    r"^(tax\s+)?(receipt|invoice|bill|statement|form|menu|contract|report|letter|document|"
+    r"cash\s+memo|estimate|quotation|order|summary|details|items?|date|total|dear|to|subject)s?\b",
+    re.I
+)
+_MARKDOWN = re.compile(r"[*_`#>|]+")
+_VENDOR_LABEL = re.compile(r"^\W*(vendor|merchant|store|shop|restaurant|company|business|from|seller|"
+                           r"billed\s+by|issued\s+by)\s*(name)?\s*[:\-]\s*(?P<name>.+)$", re.I)
+_REFERENCE = re.compile(r"\b(?:invoice|bill|receipt)\s*(?:no\.?|number|#)\s*[:\-]?\s*(?P<ref>[A-Z0-9][A-Z0-9/\-]{2,20})",
+                        re.I)
+
+_MONTHS = {name: number for number, names in enumerate(
+    (("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"), ("may",),
+     ("jun", "june"), ("jul", "july"), ("aug", "august"), ("sep", "sept", "september"),
+     ("oct", "october"), ("nov", "november"), ("dec", "december")), start=1) for name in names}
+_MONTH = r"(?P<month_name>" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\.?"
+_DATES = [
+    re.compile(r"\b(?P<year>(?:19|20)\d\d)[-/.](?P<month>\d{1,2})[-/.](?P<day>\d{1,2})\b"),
+    # Day first, as printed on Indian and most non-US receipts
+    re.compile(r"\b(?P<day>\d{1,2})[-/.](?P<month>\d{1,2})[-/.](?P<year>(?:19|20)?\d\d)\b"),
+    re.compile(r"\b" + _MONTH + r"\s+(?P<day>\d{1,2})(?:st|nd|rd|th)?,?\s+(?P<year>(?:19|20)\d\d)\b", re.I),
+    re.compile(r"\b(?P<day>\d{1,2})(?:st|nd|rd|th)?\s+" + _MONTH + r",?\s+(?P<year>(?:19|20)\d\d)\b", re.I),
+]
+
+
+def _clean(line):
+    return re.sub(r"\s+", " ", _MARKDOWN.sub(" ", line)).strip(" :-")
+
+
+def find_vendor(text):
+    """
+    Best guess at who issued a document: a "Vendor:"-style label, else the
+    first heading or line that is not a generic name like "Tax Invoice"
+    """
+    lines = [line for line in text.splitlines()[:25] if line.strip()]
+    for line in lines:
+        match = _VENDOR_LABEL.match(_clean(line))
+        if match:
+            return match.group("name").strip()
+    headings = [line for line in lines if line.lstrip().startswith(("#", "**"))]
+    for line in headings + lines[:3]:
+        name = _clean(line)
+        if (2 < len(name) <= 50 and not _GENERIC_NAMES.match(name) and ":" not in name
+                and sum(ch.isdigit() for ch in name) < len(name) / 3 and _looks_like_name(name)):
+            return name
+    return None
+
+
+def _looks_like_name(text):
+    """Mostly capitalized words, as business names are printed; not a sentence"""
+    words = [word for word in text.split() if word[0].isalpha()]
+    if not words or len(words) > 8 or text.endswith((".", ",")):
+        return False
+    return sum(word[0].isupper() for word in words) >= len(words) / 2
+
+
+def find_date(text):
+    """The first plausible calendar date in a document, or None"""
+    # Earliest in the text first, whichever format it is written in
+    matches = sorted((match for pattern in _DATES for match in pattern.finditer(text[:3000])),
+                     key=lambda match: match.start())
+    for match in matches:
+        parts = match.groupdict()
+        try:
+            month = _MONTHS[parts["month_name"].lower()] if parts.get("month_name") else int(parts["month"])
+            year = int(parts["year"])
+            if year < 100:
+                year += 2000
+            return datetime(year, month, int(parts["day"]))
+        except (ValueError, KeyError):
+            continue
+    return None
+
+
+def find_reference(text):
+    """An invoice/bill/receipt number, or None"""
+    match = _REFERENCE.search(text[:3000])
+    return match.group("ref") if match else None
+
+
+def build_title(text, doc_type, vendor=None, date=None):
+    """
+    Title in the style of "Receipt: Walmart Groceries - March 24, 2025"
+
+    Args:
+        text: The document's extracted markdown
+        doc_type: Detected document type
+        vendor: Vendor if already known (e.g. from the ledger), else found in the text
+        date: Date if already known, else found in the text
+
+    Returns:
+        A title of at most MAX_TITLE_LENGTH characters, or None if the text
+        names neither a vendor nor a date
+    """
+    vendor = vendor or find_vendor(text)
+    date = date or find_date(text)
+    reference = find_reference(text) if doc_type in ("invoice", "bill") else None
+    if not vendor and not date and not reference:
+        return None
+
+    kind = doc_type.capitalize() if doc_type and doc_type not in ("unknown", "other") else "Document"
+    prefix = f"{kind} #{reference}" if reference else kind
+    suffix = f" - {date:%B} {date.day}, {date.year}" if date else ""
+    if not vendor:
+        return f"{prefix}{suffix}"[:MAX_TITLE_LENGTH]
+
+    room = MAX_TITLE_LENGTH - len(prefix) - len(suffix) - 2
+    if room < 8:
+        suffix, room = "", MAX_TITLE_LENGTH - len(prefix) - 2
+    if len(vendor) > room:
+        vendor = vendor[:room - 3].rstrip() + "..."
+    return f"{prefix}: {vendor}{suffix}"
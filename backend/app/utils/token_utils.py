@@ -0,0 +1,70 @@
+"""
+Cheap token estimates for Gemini requests
+
+Used to charge the rate limiter before a call is made; the actual usage
+reported by the API replaces the estimate afterwards. Estimates err on the
+high side so the tokens-per-minute budget is not overrun.
+"""
+import base64
+import math
+import re
+
+CHARS_PER_TOKEN = 4
+TOKENS_PER_TILE = 258  # Gemini 2.0: per 768px image tile, and per PDF page
+DEFAULT_IMAGE_TOKENS = 4 * TOKENS_PER_TILE  # Image whose size cannot be read
+DEFAULT_OUTPUT_TOKENS = 512  # Reserved for the response unless max_output_tokens says otherwise
+
+_PDF_PAGE = re.compile(rb"/Type\s*/Page(?!s)")
+
+
+def estimate_text_tokens(text):
+    """About one token per four characters"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def image_tokens(width, height):
+    """Gemini 2.0 image cost: one tile if both sides <= 384px, else one per 768px tile"""
+    if width <= 384 and height <= 384:
+        return TOKENS_PER_TILE
+    return math.ceil(width / 768) * math.ceil(height / 768) * TOKENS_PER_TILE
+
+
+def _part_bytes(data):
+    return base64.b64decode(data) if isinstance(data, str) else data
+
+
+def estimate_part_tokens(part):
+    """Tokens for one inline {"mime_type", "data"} part"""
+    mime_type = part.get("mime_type", "")
+    try:
+        if mime_type == "application/pdf":
+            return max(1, len(_PDF_PAGE.findall(_part_bytes(part["data"])))) * TOKENS_PER_TILE
+        if mime_type.startswith("image/"):
+            from io import BytesIO
+            from PIL import Image
+
+            # Only the header is parsed, the pixels are never decoded
+            with Image.open(BytesIO(_part_bytes(part["data"]))) as img:
+                return image_tokens(*img.size)
+    except Exception:
+        pass
+    return DEFAULT_IMAGE_TOKENS
+
+
+def estimate_tokens(contents, generation_config=None):
+    """
+    Tokens a generate_content call is expected to use, prompt plus response
+
+    Args:
+        contents: Prompt string or list of strings and inline data parts
+        generation_config: The call's generation config, for max_output_tokens
+    """
+    parts = [contents] if isinstance(contents, (str, dict)) else contents
+    tokens = 0
+    for part in parts:
+        if isinstance(part, str):
+            tokens += estimate_text_tokens(part)
+        elif isinstance(part, dict):
+            tokens += estimate_part_tokens(part)
+    config = generation_config if isinstance(generation_config, dict) else {}
+    return tokens + (config.get("max_output_tokens") or DEFAULT_OUTPUT_TOKENS)
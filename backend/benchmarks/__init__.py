@@ -0,0 +1 @@
+# Benchmarks for the KhataGPT backend
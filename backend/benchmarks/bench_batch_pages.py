@@ -0,0 +1,58 @@
+"""
+Benchmark for multi-image uploads: one Gemini call on the combined PDF vs
+each photo extracted on its own, in parallel
+
+Processes a --pages photo batch both ways with the fake backend (whose PDF
+latency grows with the page count, like a real extraction) and reports the
+median time to the extracted document. Near-duplicate lookup and the local
+doc-type classifier are turned off so no database is needed.
+
+Usage (from backend/):
+    python -m benchmarks.bench_batch_pages [--pages 2,4,8] [--latency fixed:1000]
+"""
+import argparse
+import base64
+import os
+import statistics
+import time
+from io import BytesIO
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="2,4,8", help="Comma-separated batch sizes")
+    parser.add_argument("--runs", type=int, default=3, help="Batches per mode and size")
+    parser.add_argument("--latency", default="fixed:1000", help="Fake latency per page (FAKE_LLM_LATENCY format)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Pages extracted at once")
+    args = parser.parse_args()
+
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["NEAR_DUPLICATE_DISTANCE"] = "0"
+    os.environ["DOC_TYPE_CONFIDENCE"] = "2"
+    from app.services import fake_llm
+    from app.services.document_processor import DocumentProcessor
+    from app.utils.image_utils import combine_images_to_pdf
+    from benchmarks.fixtures import make_receipt_image
+
+    fake_llm.latency_model = fake_llm.LatencyModel(args.latency, 0)
+    processor = DocumentProcessor()
+
+    def extract(pages, per_page):
+        pdf = combine_images_to_pdf([BytesIO(page) for page in pages]).getvalue()
+        started = time.perf_counter()
+        if per_page:
+            processor.extract_pages(pages, concurrency=args.concurrency)
+        else:
+            processor.extract_text_from_pdf(base64.b64encode(pdf).decode())
+        return time.perf_counter() - started
+
+    print(f"{'pages':>5} {'combined PDF ms':>16} {'per page ms':>12}")
+    for count in (int(value) for value in args.pages.split(",")):
+        pages = [make_receipt_image(seed) for seed in range(count)]
+        combined, per_page = (statistics.median(extract(pages, mode) for _ in range(args.runs)) * 1000
+                              for mode in (False, True))
+        print(f"{count:>5} {combined:>16.0f} {per_page:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark for content edits: chunks rewritten (and re-indexed) after a small
+edit to a large document, diffed against the stored chunks vs rebuilt
+
+Builds a --paragraphs markdown document, edits one paragraph in the middle,
+and reports the chunks each approach writes and the time to work them out.
+No database is needed; the writes are what Chunk.sync would send.
+
+Usage (from backend/):
+    python -m benchmarks.bench_chunks [--paragraphs 200,2000] [--edits 1]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.utils.chunk_utils import chunk_hash, diff_chunks, split_chunks
+
+
+def make_document(paragraphs, rng):
+    words = ["invoice", "total", "item", "quantity", "rate", "amount", "tax", "paid", "balance", "date"]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(20, 80))) + f" {i}" for i in range(paragraphs)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", default="200,2000", help="Comma-separated document sizes")
+    parser.add_argument("--edits", type=int, default=1, help="Paragraphs changed per edit")
+    parser.add_argument("--runs", type=int, default=5, help="Edits per size")
+    args = parser.parse_args()
+
+    print(f"{'paragraphs':>10} {'chunks':>7} {'diff writes':>12} {'diff ms':>8} {'rebuild writes':>15}")
+    for count in (int(value) for value in args.paragraphs.split(",")):
+        rng = random.Random(count)
+        paragraphs = make_document(count, rng)
+        stored = [chunk_hash(chunk) for chunk in split_chunks("\n\n".join(paragraphs))]
+        writes, timings = [], []
+        for _ in range(args.runs):
+            edited = list(paragraphs)
+            for index in rng.sample(range(count), args.edits):
+                edited[index] += " corrected"
+            started = time.perf_counter()
+            new_chunks = split_chunks("\n\n".join(edited))
+            changes = diff_chunks(stored, new_chunks)
+            timings.append((time.perf_counter() - started) * 1000)
+            writes.append(len(changes["added"]) + len(changes["removed"]) + len(changes["moved"]))
+        # A rebuild deletes every stored chunk and inserts every new one
+        rebuild = len(stored) + len(new_chunks)
+        print(f"{count:>10} {len(stored):>7} {statistics.median(writes):>12.0f} "
+              f"{statistics.median(timings):>8.1f} {rebuild:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark for near-duplicate detection
+
+1. Hamming distances between perceptual hashes of re-photographed receipts
+   (same receipt, different framing) and of different receipts, to check
+   NEAR_DUPLICATE_DISTANCE separates them.
+2. HammingIndex query latency with --documents random hashes loaded.
+
+Usage (from backend/):
+    python -m benchmarks.bench_dedup [--receipts 6] [--shots 3] [--documents 100000]
+"""
+import argparse
+import itertools
+import random
+import statistics
+import time
+
+import numpy as np
+
+from app.config import NEAR_DUPLICATE_DISTANCE
+from app.services.dedup_service import compute_document_phash
+from app.utils.hamming_index import HammingIndex
+from benchmarks.fixtures import make_receipt_photo
+
+
+def distance(a, b):
+    return sum(bin((x ^ y) & 0xFFFFFFFFFFFFFFFF).count("1") for x, y in zip(a, b))
+
+
+def random_hash(rng, words=4):
+    return [rng.getrandbits(64) for _ in range(words)]
+
+
+def flip_bits(words, bits, rng):
+    """A copy of a hash with `bits` random bits flipped"""
+    words = list(words)
+    for bit in rng.sample(range(64 * len(words)), bits):
+        words[bit // 64] ^= 1 << (bit % 64)
+    return words
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--receipts", type=int, default=6, help="Distinct synthetic receipts")
+    parser.add_argument("--shots", type=int, default=3, help="Photos of each receipt")
+    parser.add_argument("--documents", type=int, default=100000, help="Hashes loaded into the index")
+    parser.add_argument("--queries", type=int, default=2000, help="Index lookups to time")
+    args = parser.parse_args()
+
+    hashes = {
+        (seed, shot): compute_document_phash(make_receipt_photo(seed, shot=shot), "image")
+        for seed in range(args.receipts) for shot in range(args.shots)
+    }
+    same, different = [], []
+    for (key_a, hash_a), (key_b, hash_b) in itertools.combinations(hashes.items(), 2):
+        (same if key_a[0] == key_b[0] else different).append(distance(hash_a, hash_b))
+    print(f"re-photographed pairs: min {min(same)}, median {statistics.median(same)}, max {max(same)} bits")
+    print(f"different receipts:    min {min(different)}, median {statistics.median(different)}, max {max(different)} bits")
+    print(f"threshold (NEAR_DUPLICATE_DISTANCE): {NEAR_DUPLICATE_DISTANCE}; "
+          f"caught {sum(d <= NEAR_DUPLICATE_DISTANCE for d in same)}/{len(same)} duplicates, "
+          f"{sum(d <= NEAR_DUPLICATE_DISTANCE for d in different)}/{len(different)} false matches")
+
+    rng = random.Random(0)
+    index = HammingIndex(radius=max(NEAR_DUPLICATE_DISTANCE, 1))
+    started = time.perf_counter()
+    for key in range(args.documents):
+        index.add(key, random_hash(rng))
+    print(f"\nindexed {args.documents} hashes in {time.perf_counter() - started:.2f}s")
+
+    # Half the queries have a planted near-duplicate at the edge of the radius
+    timings, found = [], 0
+    for query in range(args.queries):
+        value = random_hash(rng)
+        if query % 2:
+            index.add(("planted", query), flip_bits(value, index.radius, rng))
+        started = time.perf_counter()
+        matches = index.query(value)
+        timings.append((time.perf_counter() - started) * 1e6)
+        found += any(key == ("planted", query) for key, _ in matches)
+    p50, p99 = np.percentile(timings, [50, 99])
+    print(f"query latency: p50 {p50:.0f}us, p99 {p99:.0f}us over {args.queries} lookups; "
+          f"found {found}/{args.queries // 2} planted duplicates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark for deep search: time to the passages of the top result pages,
+fetched one after another vs in parallel under DEEP_SEARCH_DEADLINE
+
+Serves --pages local result pages, one of which (--slow-ms) stalls far past
+the deadline, and reports the median time each way plus a cached re-run.
+Pages are served from 127.0.0.1, so per-host limits apply to all of them;
+raise --per-host to fetch them all at once.
+
+Usage (from backend/):
+    python -m benchmarks.bench_deep_search [--pages 3] [--delay-ms 400] [--slow-ms 6000]
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE_TEMPLATE = """<html><head><title>Page {n}</title><script>var tracking = 1;</script></head><body>
+<nav><a href="/">Home</a> <a href="/about">About</a></nav>
+<h1>Guide {n} to basmati rice prices</h1>
+<p>Basmati rice typically costs between {low} and {high} rupees per kg in Indian supermarkets.</p>
+<p>Our editors visited twelve stores over the summer to compare shelf labels.</p>
+<ul><li>Premium aged basmati rice: {high} rupees per kg at most chains.</li>
+<li>Broken basmati rice sells for about {low} rupees per kg.</li></ul>
+{filler}
+<footer>Copyright 2025. Subscribe to our newsletter for more price guides.</footer>
+</body></html>"""
+
+
+def start_page_server(delay_ms, slow_ms):
+    """Page n sleeps delay_ms before answering; page 0 sleeps slow_ms"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            n = int(self.path.rsplit("/", 1)[-1] or 0)
+            time.sleep((slow_ms if n == 0 else delay_ms) / 1000)
+            filler = "".join(f"<p>Unrelated paragraph {i} about store opening hours and parking.</p>"
+                             for i in range(200))
+            payload = PAGE_TEMPLATE.format(n=n, low=60 + n, high=140 + n, filler=filler).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            try:
+                self.wfile.write(payload)
+            except BrokenPipeError:
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/page/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=3, help="Result pages fetched")
+    parser.add_argument("--delay-ms", type=int, default=400, help="Response delay of the normal pages")
+    parser.add_argument("--slow-ms", type=int, default=6000, help="Response delay of the one slow page")
+    parser.add_argument("--deadline", type=float, default=1.5, help="Deep search deadline in seconds")
+    parser.add_argument("--per-host", type=int, default=8, help="Connections per host")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per mode")
+    args = parser.parse_args()
+
+    os.environ["DEEP_SEARCH_PER_HOST"] = str(args.per_host)
+    os.environ["DEEP_SEARCH_CACHE_TTL"] = "600"
+    from app.utils import deep_search as ds
+    ds.ALLOW_PRIVATE_HOSTS = True  # The pages are served from 127.0.0.1
+
+    server, base_url = start_page_server(args.delay_ms, args.slow_ms)
+    query = "basmati rice price per kg"
+    results = [{"title": f"Result {n}", "link": f"{base_url}{n}", "snippet": "..."} for n in range(args.pages)]
+
+    def sequential():
+        started = time.perf_counter()
+        found = 0
+        for result in results:
+            try:
+                body, encoding = ds.fetch_page(result["link"], time.monotonic() + args.slow_ms / 1000 + 5)
+                found += bool(ds.relevant_passages(ds.page_blocks(body, encoding), query))
+            except Exception:
+                pass
+        return time.perf_counter() - started, found
+
+    def parallel(cached):
+        if not cached:
+            ds._page_cache.clear()
+        copies = [dict(result) for result in results]
+        started = time.perf_counter()
+        ds.deep_search(query, copies, max_pages=args.pages, deadline_seconds=args.deadline)
+        return time.perf_counter() - started, sum("passages" in result for result in copies)
+
+    print(f"{'mode':<28} {'median ms':>10} {'pages with passages':>20}")
+    for label, run in (("sequential, no deadline", sequential),
+                       (f"parallel, {args.deadline:g}s deadline", lambda: parallel(False)),
+                       ("parallel, cached", lambda: parallel(True))):
+        timings = [run() for _ in range(args.runs)]
+        print(f"{label:<28} {statistics.median(t for t, _ in timings) * 1000:>10.0f} {timings[-1][1]:>20}")
+
+    example = [dict(results[1])]
+    ds.deep_search(query, example, deadline_seconds=args.deadline)
+    print(f"\nPassages from page 1:\n{example[0].get('passages')}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark for hedged Gemini calls
+
+Sends --calls chat_answer calls through generate_content against the fake
+backend, --concurrency at a time, with hedging off and on. Latency follows
+a FAKE_LLM_LATENCY distribution (default: a long-tailed Pareto scaled down
+so the run takes seconds). Reports p50/p95/p99 per mode and the share of
+extra calls hedging made.
+
+Usage (from backend/):
+    python -m benchmarks.bench_hedging [--calls 400] [--latency pareto:50,2.5]
+        [--percentile 95] [--budget 0.05]
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=400, help="Measured calls per mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="Calls in flight at once")
+    parser.add_argument("--latency", default="pareto:50,2.5", help="Fake latency distribution (FAKE_LLM_LATENCY format)")
+    parser.add_argument("--percentile", type=float, default=95, help="Hedge after this percentile of recent latency")
+    parser.add_argument("--budget", type=float, default=0.05, help="Extra calls allowed per call")
+    parser.add_argument("--seed", type=int, default=0, help="Latency sampler seed")
+    args = parser.parse_args()
+
+    os.environ["LLM_BACKEND"] = "fake"
+    from app.services import fake_llm
+    from app.services.gemini_service import generate_content
+    from app.services.llm_governor import governor
+    from app.services.llm_hedging import Hedger
+    import app.services.gemini_service as gemini_service
+
+    # Measure hedging alone: no rate limits and a slot for every call
+    governor.rate_limits = {}
+    governor.buckets = {}
+    governor.max_concurrency = 4 * args.concurrency
+
+    def run(hedger, calls):
+        gemini_service.hedger = hedger
+
+        def timed_call(index):
+            started = time.perf_counter()
+            generate_content("gemini-2.0-pro-exp-02-05", f"question {index}", call_site="chat_answer")
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            return sorted(pool.map(timed_call, range(calls)))
+
+    print(f"{'mode':<8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'mean ms':>8} {'extra calls':>12}")
+    results = {}
+    for mode in ("off", "hedged"):
+        fake_llm.latency_model = fake_llm.LatencyModel(args.latency, args.seed)
+        hedger = Hedger(enabled=mode == "hedged", call_sites=["chat_answer"], percentile=args.percentile,
+                        budget=args.budget, max_workers=4 * args.concurrency)
+        run(hedger, 50)  # Warm up the latency window
+        warmup_hedges = hedger.issued
+        latencies = [seconds * 1000 for seconds in run(hedger, args.calls)]
+        extra = hedger.issued - warmup_hedges
+        results[mode] = latencies
+        print(f"{mode:<8} {percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f}"
+              f" {percentile(latencies, 99):>8.1f} {latencies[-1]:>8.1f} {statistics.mean(latencies):>8.1f}"
+              f" {extra / args.calls:>11.1%}")
+
+    before, after = percentile(results["off"], 99), percentile(results["hedged"], 99)
+    print(f"\np99 {before:.1f} ms -> {after:.1f} ms ({(after - before) / before * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
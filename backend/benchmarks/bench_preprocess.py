@@ -0,0 +1,80 @@
+"""
+Benchmark for image preprocessing before extraction
+
+Compares what the extraction call receives with and without
+IMAGE_PREPROCESSING on synthetic phone photos of receipts (plus a flat
+scan-like receipt): JPEG bytes, pixel size, approximate Gemini image tokens
+and preprocessing time. With --gemini it also times real extraction calls
+(needs GEMINI_API_KEY).
+
+Usage (from backend/):
+    python -m benchmarks.bench_preprocess [--photos 5] [--gemini]
+"""
+import argparse
+import io
+import statistics
+import time
+
+from PIL import Image
+
+from app.config import IMAGE_TEXT_LINE_HEIGHT
+from app.utils.image_utils import convert_to_jpg, get_image_base64, image_to_jpg, preprocess_document_image
+from app.utils.token_utils import image_tokens
+from benchmarks.fixtures import make_receipt_image, make_receipt_photo
+
+
+def baseline(raw):
+    """What the processor sent before preprocessing: the upload re-encoded as JPEG"""
+    started = time.perf_counter()
+    jpg = convert_to_jpg(io.BytesIO(raw)).getvalue()
+    seconds = time.perf_counter() - started
+    return jpg, Image.open(io.BytesIO(jpg)).size, seconds
+
+
+def preprocessed(raw):
+    started = time.perf_counter()
+    img = preprocess_document_image(Image.open(io.BytesIO(raw)), text_line_height=IMAGE_TEXT_LINE_HEIGHT)
+    jpg = image_to_jpg(img).getvalue()
+    return jpg, img.size, time.perf_counter() - started
+
+
+def time_extraction(jpg):
+    from app.services.document_processor import DocumentProcessor
+
+    started = time.perf_counter()
+    DocumentProcessor().extract_text_with_gemini(get_image_base64(io.BytesIO(jpg)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--photos", type=int, default=5, help="Number of synthetic receipt photos")
+    parser.add_argument("--gemini", action="store_true", help="Also time real Gemini extraction calls")
+    args = parser.parse_args()
+
+    fixtures = [(f"photo-{seed}", make_receipt_photo(seed)) for seed in range(args.photos)]
+    fixtures.append(("flat-receipt", make_receipt_image(0)))
+
+    totals = {"baseline": [], "preprocessed": []}
+    print(f"{'fixture':<14} {'variant':<13} {'size':>11} {'bytes':>9} {'tokens':>7} {'prep ms':>8}"
+          + (f" {'llm ms':>8}" if args.gemini else ""))
+    for name, raw in fixtures:
+        for variant, run in (("baseline", baseline), ("preprocessed", preprocessed)):
+            jpg, (width, height), seconds = run(raw)
+            row = {"bytes": len(jpg), "tokens": image_tokens(width, height), "prep_ms": seconds * 1000}
+            if args.gemini:
+                row["llm_ms"] = time_extraction(jpg) * 1000
+            totals[variant].append(row)
+            print(f"{name:<14} {variant:<13} {f'{width}x{height}':>11} {row['bytes']:>9} {row['tokens']:>7}"
+                  f" {row['prep_ms']:>8.1f}" + (f" {row['llm_ms']:>8.0f}" if args.gemini else ""))
+
+    print()
+    for metric in ["bytes", "tokens", "prep_ms"] + (["llm_ms"] if args.gemini else []):
+        before = statistics.mean(row[metric] for row in totals["baseline"])
+        after = statistics.mean(row[metric] for row in totals["preprocessed"])
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"mean {metric:<8} {before:>12.1f} -> {after:>12.1f}  ({change})")
+
+
+if __name__ == "__main__":
+    main()
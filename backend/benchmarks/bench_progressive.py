@@ -0,0 +1,59 @@
+"""
+Benchmark for progressive (streamed) document extraction
+
+Processes --runs receipt images with the fake backend, once the classic way
+and once streaming the extraction as a progressive upload does, and reports
+when the first markdown, the title and the finished document were available.
+Near-duplicate lookup and the local doc-type classifier are turned off so no
+database is needed.
+
+Usage (from backend/):
+    python -m benchmarks.bench_progressive [--runs 5] [--latency fixed:2000]
+"""
+import argparse
+import base64
+import os
+import statistics
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Documents per mode")
+    parser.add_argument("--latency", default="fixed:2000", help="Fake latency per call (FAKE_LLM_LATENCY format)")
+    args = parser.parse_args()
+
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["NEAR_DUPLICATE_DISTANCE"] = "0"
+    os.environ["DOC_TYPE_CONFIDENCE"] = "2"
+    from app.models.document import DocumentCreate
+    from app.services import fake_llm
+    from app.services.document_processor import DocumentProcessor
+    from benchmarks.fixtures import make_receipt_image
+
+    fake_llm.latency_model = fake_llm.LatencyModel(args.latency, 0)
+    processor = DocumentProcessor()
+
+    def run(streamed, seed):
+        document = DocumentCreate(title="Document being processed...", doc_type="unknown",
+                                  image_base64=base64.b64encode(make_receipt_image(seed)).decode())
+        marks = {}
+        started = time.perf_counter()
+
+        def on_progress(event, data):
+            marks.setdefault(event, time.perf_counter() - started)
+
+        processor.process_document(document, on_progress if streamed else None)
+        total = time.perf_counter() - started
+        # Without streaming nothing is visible until the document is stored
+        return marks.get("text", total), marks.get("title", total), total
+
+    print(f"{'mode':<10} {'first text ms':>14} {'title ms':>10} {'done ms':>10}")
+    for mode, streamed in (("classic", False), ("streamed", True)):
+        results = [run(streamed, seed) for seed in range(args.runs)]
+        first_text, title, done = (statistics.median(column) * 1000 for column in zip(*results))
+        print(f"{mode:<10} {first_text:>14.0f} {title:>10.0f} {done:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Micro-benchmark for document response serialization
+
+Compares the old path (Pydantic validation + jsonable_encoder + json.dumps)
+with the orjson codec used by MongoJSONResponse, for the list and get
+endpoints at realistic document sizes.
+
+Usage (from backend/):
+    python -m benchmarks.bench_serialization [--docs 50] [--image-kb 1500] [--text-kb 20]
+"""
+import argparse
+import json
+import os
+import timeit
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.models.document import DocumentResponse
+from app.utils.json_utils import dumps_mongo, shape_for_response
+
+
+def make_document(image_kb, text_kb):
+    """Build a raw MongoDB document shaped like an ingested receipt"""
+    now = datetime.now()
+    line = "| Paneer Butter Masala | 1 | 320.00 |\n"
+    return {
+        "_id": ObjectId(),
+        "title": "Receipt: Spice Route Restaurant - March 24, 2025",
+        "doc_type": "receipt",
+        "extracted_text": (line * (text_kb * 1024 // len(line) + 1))[: text_kb * 1024],
+        "file_type": "image",
+        "image_base64": os.urandom(image_kb * 1024 * 3 // 4).hex()[: image_kb * 1024],
+        "created_at": now,
+        "updated_at": now,
+        "last_chat_at": None,
+        "chat_count": 3,
+    }
+
+
+def old_get(doc, adapter):
+    validated = adapter.validate_python(doc)
+    return json.dumps(adapter.dump_python(validated, mode="json", by_alias=True)).encode()
+
+
+def new_get(doc):
+    return dumps_mongo(shape_for_response(doc, DocumentResponse))
+
+
+def old_list(docs):
+    stringified = [{**doc, "_id": str(doc["_id"])} for doc in docs]
+    return json.dumps(jsonable_encoder(stringified)).encode()
+
+
+def new_list(docs):
+    return dumps_mongo(docs)
+
+
+def report(name, seconds, number):
+    print(f"{name:<28} {seconds / number * 1000:10.3f} ms/op")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=50, help="documents in the list response")
+    parser.add_argument("--image-kb", type=int, default=1500, help="size of image_base64 per document")
+    parser.add_argument("--text-kb", type=int, default=20, help="size of extracted_text per document")
+    parser.add_argument("--number", type=int, default=20, help="iterations per measurement")
+    args = parser.parse_args()
+
+    docs = [make_document(args.image_kb, args.text_kb) for _ in range(args.docs)]
+    adapter = TypeAdapter(DocumentResponse)
+
+    # Both paths must agree on the payload before we time them
+    assert json.loads(old_get(docs[0], adapter)) == json.loads(new_get(docs[0]))
+
+    print(f"GET /documents/{{id}}  image={args.image_kb}KB text={args.text_kb}KB")
+    report("pydantic + json", timeit.timeit(lambda: old_get(docs[0], adapter), number=args.number), args.number)
+    report("orjson codec", timeit.timeit(lambda: new_get(docs[0]), number=args.number), args.number)
+
+    print(f"GET /documents  docs={args.docs}")
+    list_number = max(1, args.number // 5)
+    report("jsonable_encoder + json", timeit.timeit(lambda: old_list(docs), number=list_number), list_number)
+    report("orjson codec", timeit.timeit(lambda: new_list(docs), number=list_number), list_number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark for stored field compression: BSON bytes of extracted text and
+chat tool results before and after zstd, and the time to (de)compress them
+
+Generates markdown like a multi-page statement (tables of transactions)
+and a web search `used_tools` list, and runs them through the storage codec
+with the current ZSTD_LEVEL. No database is needed; for collection sizes
+run python -m app.scripts.compress_storage --dry-run against the real data.
+
+Usage (from backend/):
+    python -m benchmarks.bench_storage [--pages 1,10,50] [--results 10]
+"""
+import argparse
+import random
+import statistics
+import time
+
+import bson
+
+from app.utils.storage_codec import compress_value, decompress_value
+
+
+def make_markdown(pages, rng):
+    vendors = ["Fresh Mart", "City Fuel", "Cafe Mocha", "Metro Rail", "Book Nook", "Pharma Plus", "Quick Cabs"]
+    lines = []
+    for page in range(1, pages + 1):
+        lines += [f"## Statement page {page}", "", "| Date | Description | Ref | Amount |", "|---|---|---|---|"]
+        for _ in range(40):
+            lines.append(f"| 2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} | {rng.choice(vendors)} "
+                         f"| {rng.randint(100000, 999999)} | {rng.uniform(10, 5000):.2f} |")
+        lines += ["", f"**Page total:** {rng.uniform(1000, 90000):.2f}", ""]
+    return "\n".join(lines)
+
+
+def make_tools(results, rng):
+    return [{"tool_name": "search", "query": "typical restaurant service charge in india", "results": [
+        {"title": f"Service charge rules explained part {i}", "url": f"https://example.com/articles/{rng.randint(1, 10**6)}",
+         "snippet": " ".join(rng.choice(["restaurant", "service", "charge", "tax", "bill", "customers", "optional",
+                                         "guidelines", "consumer", "pay"]) for _ in range(40))}
+        for i in range(results)]}]
+
+
+def measure(value, runs):
+    stored = compress_value(value)
+    compress_ms = statistics.median(_timed(compress_value, value) for _ in range(runs))
+    decompress_ms = statistics.median(_timed(decompress_value, stored) for _ in range(runs))
+    size = len(bson.encode({"v": value}))
+    stored_size = len(bson.encode({"v": stored}))
+    return size, stored_size, compress_ms, decompress_ms
+
+
+def _timed(function, value):
+    started = time.perf_counter()
+    function(value)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="1,10,50", help="Comma-separated statement lengths in pages")
+    parser.add_argument("--results", type=int, default=10, help="Search results in the used_tools sample")
+    parser.add_argument("--runs", type=int, default=20, help="Timed runs per value")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    samples = [(f"extracted_text {pages}p", make_markdown(int(pages), rng)) for pages in args.pages.split(",")]
+    samples.append((f"used_tools {args.results} results", make_tools(args.results, rng)))
+
+    print(f"{'field':<26} {'bytes':>9} {'stored':>9} {'ratio':>6} {'compress ms':>12} {'decompress ms':>14}")
+    for label, value in samples:
+        size, stored_size, compress_ms, decompress_ms = measure(value, args.runs)
+        print(f"{label:<26} {size:>9,} {stored_size:>9,} {size / stored_size:>6.1f} "
+              f"{compress_ms:>12.2f} {decompress_ms:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
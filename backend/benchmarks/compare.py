@@ -0,0 +1,65 @@
+"""
+Compare two load-test reports produced by benchmarks.loadtest
+
+Usage (from backend/):
+    python -m benchmarks.compare base.json head.json [--threshold 10]
+
+Prints per-scenario deltas and exits non-zero if any p95 latency or
+throughput regressed by more than the threshold percentage.
+"""
+import argparse
+import json
+import sys
+
+METRICS = [
+    # (key, higher_is_better)
+    ("p50_ms", False),
+    ("p95_ms", False),
+    ("p99_ms", False),
+    ("throughput_rps", True),
+    ("peak_rss_mb", False),
+]
+GATED = {"p95_ms", "throughput_rps"}
+
+
+def change_percent(base, head):
+    if not base:
+        return 0.0
+    return (head - base) / base * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two load-test reports")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    args = parser.parse_args()
+
+    with open(args.base) as base_file, open(args.head) as head_file:
+        base, head = json.load(base_file), json.load(head_file)
+
+    print(f"base {base['meta'].get('git_revision')}  ->  head {head['meta'].get('git_revision')}")
+    regressions = []
+    for name, head_result in head["scenarios"].items():
+        base_result = base["scenarios"].get(name)
+        if base_result is None:
+            print(f"{name}: new scenario")
+            continue
+        cells = []
+        for key, higher_is_better in METRICS:
+            delta = change_percent(base_result[key], head_result[key])
+            worse = -delta if higher_is_better else delta
+            marker = ""
+            if key in GATED and worse > args.threshold:
+                marker = " !"
+                regressions.append(f"{name}.{key} {delta:+.1f}%")
+            cells.append(f"{key}={head_result[key]} ({delta:+.1f}%){marker}")
+        print(f"{name:<22} " + "  ".join(cells))
+
+    if regressions:
+        print("Regressions: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Synthetic inputs for the benchmark suite
+
+Everything is generated from a seed, so runs on different commits see the
+same receipts, PDFs and seeded documents.
+"""
+import io
+import random
+from datetime import datetime, timedelta
+
+from PIL import Image, ImageDraw, ImageFont
+
+VENDORS = ["Fake Mart", "Spice Route", "Metro Fuel", "City Pharmacy", "Chai Point", "Book Nook"]
+DOC_TYPES = ["receipt", "invoice", "bill", "menu", "statement"]
+ITEMS = ["Basmati Rice", "Toor Dal", "Amul Butter", "Masala Dosa", "Filter Coffee",
+         "Petrol", "Paracetamol", "Notebook", "Paneer Tikka", "Mango Lassi"]
+
+
+def make_receipt_image(seed=0, width=1200, height=1800, quality=90):
+    """A receipt-like JPEG: dark text lines on a white page"""
+    rng = random.Random(seed)
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    y = 60
+    draw.text((60, y), rng.choice(VENDORS).upper(), fill="black")
+    y += 80
+    while y < height - 120:
+        item = rng.choice(ITEMS)
+        price = rng.randint(20, 900)
+        draw.text((60, y), item, fill="black")
+        draw.text((width - 220, y), f"{price}.00", fill="black")
+        y += rng.randint(36, 60)
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def make_receipt_photo(seed=0, width=3024, height=4032, skew=4.0, quality=90, shot=0):
+    """
+    A phone photo of a receipt: a narrow page, slightly rotated, on a dark
+    wooden table under warm light, at full camera resolution
+
+    The receipt's content follows seed; shot varies only the framing, so
+    different shots of one seed are re-photographs of the same receipt.
+    """
+    rng = random.Random(seed)
+    font = ImageFont.load_default(size=34)
+    page_height = 400 + rng.randint(10, 36) * 62
+    page = Image.new("RGB", (1100, page_height), (250, 248, 240))
+    draw = ImageDraw.Draw(page)
+    y = 80
+    draw.text((80, y), rng.choice(VENDORS).upper(), fill="black", font=font)
+    y += 110
+    while y < page.height - 160:
+        draw.text((80, y), rng.choice(ITEMS), fill=(30, 30, 30), font=font)
+        draw.text((page.width - 260, y), f"{rng.randint(20, 900)}.00", fill=(30, 30, 30), font=font)
+        y += rng.randint(52, 70)
+    draw.text((80, y + 40), f"TOTAL {rng.randint(500, 9000)}.00", fill="black", font=font)
+
+    if shot:
+        rng = random.Random(f"{seed}:{shot}")
+    angle = rng.uniform(-skew, skew)
+    page = page.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=(0, 0, 0))
+    mask = Image.new("L", (1100, page_height), 255).rotate(angle, expand=True)
+
+    img = Image.new("RGB", (width, height), (92, 64, 44))
+    draw = ImageDraw.Draw(img)
+    for x in range(0, width, 24):  # wood grain
+        shade = rng.randint(-12, 12)
+        draw.line([(x, 0), (x + rng.randint(-40, 40), height)], fill=(92 + shade, 64 + shade, 44 + shade), width=10)
+    img.paste(page, ((width - page.width) // 2 + rng.randint(-150, 150),
+                     (height - page.height) // 2 + rng.randint(-150, 150)), mask)
+    img = Image.blend(img, Image.new("RGB", img.size, (255, 200, 140)), 0.08)
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def make_receipt_pdf(pages=3, seed=0):
+    """A multi-page PDF made of receipt images"""
+    from app.utils.image_utils import combine_images_to_pdf
+
+    buffers = [io.BytesIO(make_receipt_image(seed + page)) for page in range(pages)]
+    return combine_images_to_pdf(buffers).getvalue()
+
+
+def make_seed_documents(count, start=0, text_words=150):
+    """Small but realistic documents for list/search scenarios"""
+    rng = random.Random(start)
+    now = datetime.now()
+    documents = []
+    for index in range(start, start + count):
+        vendor = rng.choice(VENDORS)
+        words = [rng.choice(ITEMS) for _ in range(text_words // 2)]
+        created = now - timedelta(minutes=index)
+        documents.append({
+            "title": f"Receipt: {vendor} #{index}",
+            "doc_type": rng.choice(DOC_TYPES),
+            # Roughly 1% of documents mention the search needle
+            "extracted_text": f"# {vendor}\n\n" + " ".join(words) + (" saffron" if index % 100 == 0 else ""),
+            "file_type": "image",
+            "image_base64": "",
+            "created_at": created,
+            "updated_at": created,
+            "last_chat_at": None,
+            "chat_count": 0,
+            "content_version": 1,
+        })
+    return documents
@@ -0,0 +1,85 @@
+"""
+Import-time budget for the API
+
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter a
+few times and fails if the best cumulative import time of app.main is over
+budget, or if any of the lazily loaded libraries were imported eagerly.
+
+Usage (from backend/):
+    python -m benchmarks.import_budget [--budget-ms 1000] [--runs 3] [--top 15]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# Libraries the app only imports on first use; importing app.main must not load them
+LAZY_MODULES = ["google.generativeai", "PIL", "fitz", "bs4", "requests", "reportlab"]
+
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def measure():
+    """
+    Import app.main in a fresh interpreter
+
+    Returns:
+        Dict mapping each module imported by app.main to (self_us, cumulative_us, depth)
+    """
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=backend_dir, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing app.main failed:\n{result.stderr}")
+
+    # Children are printed before their parent, so app.main's subtree is
+    # everything since the previous top-level (interpreter startup) import
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        depth = len(indent) // 2
+        if depth == 0 and name != "app.main":
+            modules = {}
+            continue
+        modules[name] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=1000, help="Maximum import time of app.main")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to try; the fastest counts")
+    parser.add_argument("--top", type=int, default=15, help="Slowest top-level imports to list")
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    best = min(runs, key=lambda modules: modules["app.main"][1])
+    total_ms = best["app.main"][1] / 1000
+
+    print(f"{'cumulative ms':>14}  module")
+    direct = [(cumulative, name) for name, (_, cumulative, depth) in best.items() if depth == 1]
+    for cumulative, name in sorted(direct, reverse=True)[: args.top]:
+        print(f"{cumulative / 1000:14.1f}  {name}")
+    print(f"\napp.main: {total_ms:.1f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+
+    failures = []
+    eager = [name for name in LAZY_MODULES if any(run.get(name) for run in runs)]
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"{total_ms:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Offline benchmark and load-test suite
+
+Runs the real FastAPI app under uvicorn with the fake LLM backend, a local
+MongoDB (or an in-memory substitute) and a stub search server, drives each
+scenario with concurrent HTTP clients and writes p50/p95/p99 latency,
+throughput and peak RSS as JSON. Compare two runs with
+`python -m benchmarks.compare base.json head.json`.
+
+Usage (from backend/):
+    python -m benchmarks.loadtest --output bench.json
+    python -m benchmarks.loadtest --mongo memory --sizes 1000,10000 --quick
+
+The target database is dropped before the run, so its name must contain
+"bench".
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from benchmarks.fixtures import make_receipt_image, make_receipt_pdf, make_seed_documents
+from benchmarks.stub_search import start_stub_search_server
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (server and clients share it)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Scenario:
+    """One named workload: a request factory run `requests` times at `concurrency`"""
+
+    def __init__(self, name, make_request, requests_count, concurrency, warmup=1):
+        self.name = name
+        self.make_request = make_request
+        self.requests_count = requests_count
+        self.concurrency = concurrency
+        self.warmup = warmup
+
+    def run(self):
+        local = threading.local()
+
+        def one(index):
+            session = getattr(local, "session", None)
+            if session is None:
+                session = local.session = requests.Session()
+            start = time.perf_counter()
+            try:
+                response = self.make_request(session, index)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            return time.perf_counter() - start, ok
+
+        for index in range(self.warmup):
+            one(-1 - index)
+
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            outcomes = list(pool.map(one, range(self.requests_count)))
+        wall = time.perf_counter() - wall_start
+
+        latencies = [latency * 1000 for latency, _ in outcomes]
+        errors = sum(1 for _, ok in outcomes if not ok)
+        return {
+            "requests": self.requests_count,
+            "concurrency": self.concurrency,
+            "errors": errors,
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "mean_ms": round(statistics.fmean(latencies), 2),
+            "throughput_rps": round(self.requests_count / wall, 2),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+def start_server(port):
+    import uvicorn
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def seed_documents(collection, target):
+    """Top the documents collection up to `target` synthetic documents"""
+    existing = collection.count_documents({})
+    batch = 5000
+    while existing < target:
+        count = min(batch, target - existing)
+        collection.insert_many(make_seed_documents(count, start=existing))
+        existing += count
+
+
+def build_scenarios(base, args):
+    image = make_receipt_image(seed=1)
+    batch_images = [make_receipt_image(seed=seed) for seed in range(2, 6)]
+    pdf = make_receipt_pdf(pages=3, seed=10)
+    quick = 0.2 if args.quick else 1.0
+
+    def count(value):
+        return max(2, int(value * quick))
+
+    def upload_single(session, index):
+        files = [("files", ("receipt.jpg", image, "image/jpeg"))]
+        return session.post(f"{base}/documents/upload", files=files)
+
+    def upload_batch(session, index):
+        files = [("files", (f"page{n}.jpg", data, "image/jpeg")) for n, data in enumerate(batch_images)]
+        return session.post(f"{base}/documents/upload", files=files)
+
+    def upload_pdf(session, index):
+        files = [("files", ("statement.pdf", pdf, "application/pdf"))]
+        return session.post(f"{base}/documents/upload", files=files)
+
+    return [
+        Scenario("upload_single", upload_single, count(args.upload_requests), args.concurrency),
+        Scenario("upload_batch", upload_batch, count(args.upload_requests // 2), args.concurrency),
+        Scenario("upload_pdf", upload_pdf, count(args.upload_requests // 2), args.concurrency),
+    ]
+
+
+def chat_scenarios(base, document_id, args):
+    quick = 0.2 if args.quick else 1.0
+
+    def chat(message):
+        def send(session, index):
+            return session.post(f"{base}/chat/", json={
+                "document_id": document_id,
+                "user_message": message,
+                "ai_response": "",
+            })
+        return send
+
+    requests_count = max(2, int(args.chat_requests * quick))
+    return [
+        Scenario("chat_no_search", chat("What is the total amount?"), requests_count, args.concurrency),
+        Scenario("chat_with_search", chat("Is the rice price fair compared to market?"), requests_count, args.concurrency),
+    ]
+
+
+def read_scenarios(base, size, args):
+    quick = 0.2 if args.quick else 1.0
+    requests_count = max(2, int(args.read_requests * quick))
+
+    def list_documents(session, index):
+        return session.get(f"{base}/documents/", params={"summary": "true"})
+
+    def search_documents(session, index):
+        return session.get(f"{base}/documents/", params={"search": "saffron", "summary": "true"})
+
+    return [
+        Scenario(f"list_{size}", list_documents, requests_count, args.concurrency),
+        Scenario(f"search_{size}", search_documents, requests_count, args.concurrency),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KhataGPT offline load test")
+    parser.add_argument("--output", default="bench_output.json", help="where to write the JSON report")
+    parser.add_argument("--mongo", default=os.getenv("BENCH_MONGODB_URI", "mongodb://localhost:27017/"),
+                        help='MongoDB URI of a local mongod, or "memory" for mongomock')
+    parser.add_argument("--db-name", default="khatagpt_bench", help="database to use (dropped first)")
+    parser.add_argument("--latency", default="lognormal:800,0.5", help="fake LLM latency distribution")
+    parser.add_argument("--search-delay-ms", type=int, default=150, help="stub search server delay")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="document counts for list/search")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--upload-requests", type=int, default=40)
+    parser.add_argument("--chat-requests", type=int, default=40)
+    parser.add_argument("--read-requests", type=int, default=40)
+    parser.add_argument("--quick", action="store_true", help="run a fifth of the requests")
+    args = parser.parse_args()
+
+    if "bench" not in args.db_name:
+        parser.error('--db-name must contain "bench"; the database is dropped before the run')
+
+    search_server, search_url = start_stub_search_server(args.search_delay_ms)
+
+    # The app reads its configuration at import time, so set it up first
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": args.latency,
+        "SEARCH_URL": search_url,
+        "MONGODB_DB_NAME": args.db_name,
+    })
+    if args.mongo == "memory":
+        # In-memory substitute; note mongomock has no $text support, so the
+        # search scenarios exercise the regex fallback
+        try:
+            import mongomock
+        except ImportError:
+            parser.error('--mongo memory needs mongomock (pip install mongomock), or pass a mongod URI')
+        import pymongo
+        memory_client = mongomock.MongoClient()
+        pymongo.MongoClient = lambda *client_args, **client_kwargs: memory_client
+    else:
+        os.environ["MONGODB_URI"] = args.mongo
+
+    from app.database import get_client, get_db
+
+    get_client().drop_database(args.db_name)
+
+    port = free_port()
+    server = start_server(port)
+    base = f"http://127.0.0.1:{port}/api/v1"
+
+    results = {}
+    try:
+        for scenario in build_scenarios(base, args):
+            print(f"Running {scenario.name}...")
+            results[scenario.name] = scenario.run()
+
+        document = requests.get(f"{base}/documents/", params={"summary": "true"}).json()[0]
+        for scenario in chat_scenarios(base, document["_id"], args):
+            print(f"Running {scenario.name}...")
+            results[scenario.name] = scenario.run()
+
+        for size in sorted(int(value) for value in args.sizes.split(",") if value):
+            print(f"Seeding {size} documents...")
+            seed_documents(get_db().documents, size)
+            for scenario in read_scenarios(base, size, args):
+                print(f"Running {scenario.name}...")
+                results[scenario.name] = scenario.run()
+    finally:
+        server.should_exit = True
+        search_server.shutdown()
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "mongo": "memory" if args.mongo == "memory" else "mongod",
+            "llm_latency": args.latency,
+            "search_delay_ms": args.search_delay_ms,
+            "concurrency": args.concurrency,
+        },
+        "scenarios": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+
+    for name, result in results.items():
+        print(f"{name:<22} p50={result['p50_ms']:>9}ms p95={result['p95_ms']:>9}ms "
+              f"p99={result['p99_ms']:>9}ms {result['throughput_rps']:>8} req/s errors={result['errors']}")
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
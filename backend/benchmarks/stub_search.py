@@ -0,0 +1,47 @@
+"""
+Local stand-in for the DuckDuckGo HTML results page
+
+Serves the same `.result` markup search_utils parses, after an optional
+fixed delay, so web-search cost is measured without leaving the machine.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESULT_TEMPLATE = """
+<div class="result">
+  <h2 class="result__title"><a href="https://example.com/{n}">Result {n} for {query}</a></h2>
+  <a class="result__url" href="https://example.com/{n}">example.com/{n}</a>
+  <a class="result__snippet">Typical market price for {query} is around {price} rupees per kg.</a>
+</div>
+"""
+
+
+def start_stub_search_server(delay_ms=150, results=5):
+    """
+    Start the stub search server on a free local port
+
+    Returns:
+        Tuple of (server, base_url); call server.shutdown() when done
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = self.path.partition("q=")[2].replace("+", " ") or "query"
+            time.sleep(delay_ms / 1000)
+            body = "<html><body>" + "".join(
+                RESULT_TEMPLATE.format(n=n, query=query, price=100 + n * 15) for n in range(results)
+            ) + "</body></html>"
+            payload = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/html/"